@@ -3,14 +3,21 @@
 负责课程提醒和位置获取
 """
 
-import datetime
-import time
-import threading
 import webbrowser
 import json
+import queue
+import threading
+import time
+import urllib.error
 import urllib.request
 import urllib.parse
 
+from database import Database
+from location_filter import GPS_MIN_DISTANCE_M, GPS_MIN_TIME_MS, LocationPipeline
+from metrics import registry as metrics
+from reminder_engine import AlarmSink, CourseTrigger, ReminderEngine
+from trace_recorder import TRACE_FILE, TraceRecorder, WalkingSpeedModel
+
 try:
     from plyer import notification
     from plyer import gps
@@ -20,6 +27,128 @@ except ImportError:
     PLYER_AVAILABLE = False
     print("警告: plyer库未安装，部分功能不可用")
 
+# 默认位置（榆林学院）
+DEFAULT_LOCATION = {
+    'lat': 38.2850,
+    'lon': 109.7340,
+    'altitude': 0,
+    'accuracy': 0,
+    'note': '默认位置（榆林学院）'
+}
+
+# IP定位结果的缓存键、有效期（秒）和请求超时（秒）
+IP_LOCATION_KEY = 'ip_location_cache'
+IP_LOCATION_TTL = 6 * 60 * 60
+IP_LOCATION_TIMEOUT = 10
+
+# 步行速度模型的保存键
+WALKING_MODEL_KEY = 'walking_speed_model'
+
+# 记录轨迹期间每隔多久保存一次（秒），应用被系统结束时最多丢失这段时间的轨迹
+TRACE_SAVE_INTERVAL = 10 * 60
+
+
+# ==================== 通知发送队列 ====================
+class NotificationQueue:
+    """通知发送队列
+
+    调用方只负责入队，由专用线程调用系统通知接口，避免阻塞界面线程。
+    同一类别短时间内的多条通知合并为一条汇总，并按类别限制发送频率。
+    """
+
+    # 收到第一条通知后等待多久再发送，以便合并同一批次（秒）
+    COALESCE_WINDOW = 1.0
+    # 同一类别超过该数量时合并为汇总
+    SUMMARY_THRESHOLD = 3
+    # 汇总中列出的条数
+    SUMMARY_ITEMS = 3
+    # 各类别两次发送之间的最短间隔（秒）
+    RATE_LIMITS = {'notice': 60, 'contest': 60}
+    CATEGORY_NAMES = {'course': '课程提醒', 'notice': '新通知', 'contest': '竞赛截止提醒'}
+
+    def __init__(self, deliver):
+        self._deliver = deliver
+        self._queue = queue.Queue()
+        self._pending = {}    # 类别 -> 待发送列表
+        self._last_sent = {}  # 类别 -> 上次发送时刻
+        self._outstanding = 0   # 已入队未发送的条数
+        self._lock = threading.Lock()
+        self._idle = threading.Event()
+        self._idle.set()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def put(self, title, message, category='general'):
+        """通知入队，立即返回"""
+        with self._lock:
+            self._outstanding += 1
+            self._idle.clear()
+        self._queue.put({
+            'title': title,
+            'message': message,
+            'category': category,
+            'queued_at': time.monotonic(),
+        })
+
+    def flush(self, timeout=None):
+        """等待队列中的通知全部发送完毕"""
+        return self._idle.wait(timeout)
+
+    def _ready_at(self, category):
+        """该类别的待发送通知最早何时可以发送"""
+        first = self._pending[category][0]['queued_at']
+        ready = first + self.COALESCE_WINDOW
+        limit = self.RATE_LIMITS.get(category, 0)
+        if limit and category in self._last_sent:
+            ready = max(ready, self._last_sent[category] + limit)
+        return ready
+
+    def _run(self):
+        while True:
+            timeout = None
+            if self._pending:
+                timeout = max(0.0, min(self._ready_at(c) for c in self._pending) - time.monotonic())
+            try:
+                item = self._queue.get(timeout=timeout)
+                self._pending.setdefault(item['category'], []).append(item)
+            except queue.Empty:
+                pass
+
+            now = time.monotonic()
+            for category in [c for c in self._pending if self._ready_at(c) <= now]:
+                items = self._pending.pop(category)
+                self._send(category, items)
+                with self._lock:
+                    self._outstanding -= len(items)
+                    if self._outstanding == 0:
+                        self._idle.set()
+
+    def _send(self, category, items):
+        """发送一个类别的积压通知，数量较多时合并"""
+        if len(items) > self.SUMMARY_THRESHOLD:
+            name = self.CATEGORY_NAMES.get(category, '通知')
+            lines = [f"· {item['title']}：{item['message'].splitlines()[0]}"
+                     for item in items[:self.SUMMARY_ITEMS]]
+            lines.append(f"等共 {len(items)} 条")
+            batches = [(f"{name}（{len(items)}条）", "\n".join(lines))]
+            metrics.incr('notify.coalesced', len(items) - 1)
+        else:
+            batches = [(item['title'], item['message']) for item in items]
+
+        for title, message in batches:
+            start = time.monotonic()
+            try:
+                self._deliver(title, message)
+            except Exception as e:
+                print(f"通知发送失败: {e}")
+                metrics.incr('notify.failed')
+            metrics.observe('notify.deliver_ms', (time.monotonic() - start) * 1000)
+
+        self._last_sent[category] = time.monotonic()
+        metrics.incr('notify.sent', len(batches))
+        for item in items:
+            metrics.observe('notify.latency_ms', (self._last_sent[category] - item['queued_at']) * 1000)
+
 
 class AlarmManager:
     """闹钟管理器"""
@@ -38,6 +167,35 @@ class AlarmManager:
         AlarmManager._initialized = True
         self.gps_enabled = False
         self.current_location = None
+        self.precise_location = False
+        self._ip_thread = None
+        self.notifications = NotificationQueue(self._deliver_notification)
+        self.location_pipeline = LocationPipeline(start_gps=self._gps_on, stop_gps=self._gps_off)
+        self.trace = TraceRecorder()
+        self._location_started = False
+        self._location_lock = threading.Lock()
+        self._trace_loaded = False
+        self._trace_lock = threading.Lock()
+        self.trace_path = TRACE_FILE   # 应用启动时改为用户数据目录下的路径
+        self._trace_saved_at = time.time()
+        self._trace_save_lock = threading.Lock()
+
+    def _ensure_location(self):
+        """首次使用位置功能时才初始化GPS和IP定位"""
+        if self._location_started:
+            return
+        with self._location_lock:
+            if self._location_started:
+                return
+            self._location_started = True
+            self._init_location()
+
+    def _init_location(self):
+        # 先用缓存或默认位置启动，IP定位在后台进行，不阻塞界面
+        cached, fresh = self._load_cached_location()
+        if self.current_location is None:
+            self.current_location = cached or dict(DEFAULT_LOCATION)
+        self._load_trace()
 
         # 尝试初始化GPS
         if PLYER_AVAILABLE:
@@ -49,104 +207,202 @@ class AlarmManager:
             except Exception as e:
                 print(f"GPS初始化失败: {e}")
                 print("尝试使用IP地理位置...")
-                self._get_location_by_ip()
         else:
             print("plyer库不可用，尝试使用IP地理位置...")
-            self._get_location_by_ip()
 
-    def _get_location_by_ip(self):
-        """通过IP获取地理位置"""
+        if not self.gps_enabled and not fresh:
+            self.locate_by_ip_async()
+
+    # ---------- IP定位 ----------
+    def _load_cached_location(self):
+        """读取上次IP定位结果，返回 (位置, 是否在有效期内)"""
         try:
-            print("正在通过IP获取位置...")
-            # 使用免费的IP地理位置API
-            url = "http://ip-api.com/json/"
+            db = Database()
+            try:
+                raw = db.get_setting(IP_LOCATION_KEY)
+            finally:
+                db.close()
+            if not raw:
+                return None, False
+            cached = json.loads(raw)
+            age = time.time() - cached.pop('fetched_at', 0)
+            cached['note'] = f"{cached.get('note', 'IP定位')}（缓存）"
+            return cached, 0 <= age < IP_LOCATION_TTL
+        except Exception as e:
+            print(f"读取位置缓存失败: {e}")
+            return None, False
 
-            # 添加更详细的错误处理
+    def _save_cached_location(self, location):
+        try:
+            db = Database()
             try:
-                req = urllib.request.Request(url)
-                req.add_header('User-Agent', 'Mozilla/5.0')
-
-                with urllib.request.urlopen(req, timeout=10) as response:
-                    if response.status != 200:
-                        raise Exception(f"HTTP错误: {response.status}")
-
-                    data = json.loads(response.read().decode('utf-8'))
-
-                    if data['status'] == 'success':
-                        self.current_location = {
-                            'lat': data['lat'],
-                            'lon': data['lon'],
-                            'altitude': 0,
-                            'accuracy': 1000,  # IP定位精度较低
-                            'note': f"IP定位: {data.get('city', '未知城市')}, {data.get('regionName', '未知省份')}"
-                        }
-                        print(f"✅ IP定位成功: {data.get('city', '未知城市')}")
-                    else:
-                        raise Exception(f"IP定位失败: {data.get('message', '未知错误')}")
-
-            except urllib.error.URLError as e:
-                raise Exception(f"网络连接错误: {e}")
-            except json.JSONDecodeError as e:
-                raise Exception(f"数据解析错误: {e}")
-            except Exception as e:
-                raise Exception(f"请求失败: {e}")
+                db.save_setting(IP_LOCATION_KEY, json.dumps(
+                    dict(location, fetched_at=time.time()), ensure_ascii=False))
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"保存位置缓存失败: {e}")
+
+    def locate_by_ip_async(self):
+        """在后台线程中进行IP定位，已有定位任务时不重复发起"""
+        if self._ip_thread is not None and self._ip_thread.is_alive():
+            return self._ip_thread
+        self._ip_thread = threading.Thread(target=self._get_location_by_ip, daemon=True)
+        self._ip_thread.start()
+        return self._ip_thread
+
+    def _fetch_ip_location(self):
+        """请求IP地理位置接口，失败时抛出异常"""
+        # 使用免费的IP地理位置API
+        url = "http://ip-api.com/json/"
+        try:
+            req = urllib.request.Request(url)
+            req.add_header('User-Agent', 'Mozilla/5.0')
+
+            with urllib.request.urlopen(req, timeout=IP_LOCATION_TIMEOUT) as response:
+                if response.status != 200:
+                    raise Exception(f"HTTP错误: {response.status}")
+                data = json.loads(response.read().decode('utf-8'))
+        except urllib.error.URLError as e:
+            raise Exception(f"网络连接错误: {e}")
+        except json.JSONDecodeError as e:
+            raise Exception(f"数据解析错误: {e}")
+
+        if data.get('status') != 'success':
+            raise Exception(f"IP定位失败: {data.get('message', '未知错误')}")
+        return {
+            'lat': data['lat'],
+            'lon': data['lon'],
+            'altitude': 0,
+            'accuracy': 1000,  # IP定位精度较低
+            'note': f"IP定位: {data.get('city', '未知城市')}, {data.get('regionName', '未知省份')}"
+        }
 
+    def _get_location_by_ip(self):
+        """通过IP获取地理位置（在后台线程中运行），成功后写入缓存"""
+        print("正在通过IP获取位置...")
+        start = time.monotonic()
+        try:
+            location = self._fetch_ip_location()
         except Exception as e:
+            metrics.incr('location.ip_failed')
             print(f"IP定位失败: {e}")
-            print("将使用默认位置（榆林学院）")
-            # 最后使用默认位置
-            self.current_location = {
-                'lat': 38.2850,
-                'lon': 109.7340,
-                'altitude': 0,
-                'accuracy': 0,
-                'note': '默认位置（榆林学院）'
-            }
+            print("继续使用缓存或默认位置（榆林学院）")
+            return None
+        finally:
+            metrics.observe('location.ip_ms', (time.monotonic() - start) * 1000)
+
+        self._save_cached_location(location)
+        # 已有GPS或手动设置的位置时不用精度更低的IP结果覆盖
+        if not self.precise_location:
+            self.current_location = location
+        print(f"✅ IP定位成功: {location['note']}")
+        return location
+
+    # ---------- 轨迹 ----------
+    def _load_trace(self):
+        """恢复上次保存的轨迹和步行速度模型（只读取一次）"""
+        with self._trace_lock:
+            if self._trace_loaded:
+                return
+            self._trace_loaded = True
+            self._read_trace()
+
+    def _read_trace(self):
+        try:
+            self.trace.buffer.load(self.trace_path)
+            db = Database()
+            try:
+                self.trace.model = WalkingSpeedModel.from_json(db.get_setting(WALKING_MODEL_KEY))
+            finally:
+                db.close()
+        except Exception as e:
+            print(f"读取轨迹失败: {e}")
+
+    def save_trace(self):
+        """保存轨迹和步行速度模型（应用暂停、退出时以及记录期间定期调用）"""
+        # 尚未读取过保存的轨迹时不写，以免空缓冲区覆盖旧文件
+        if not self._trace_loaded:
+            return
+        with self._trace_save_lock:
+            self._trace_saved_at = time.time()
+            try:
+                self.trace.buffer.save(self.trace_path)
+                db = Database()
+                try:
+                    db.save_setting(WALKING_MODEL_KEY, self.trace.model.to_json())
+                finally:
+                    db.close()
+            except Exception as e:
+                print(f"保存轨迹失败: {e}")
+
+    def walking_model(self, campus=None):
+        """用新记录的轨迹更新并返回步行速度模型（只读取保存的轨迹，不启动定位）"""
+        self._load_trace()
+        self.trace.train(campus)
+        return self.trace.model
 
+    # ---------- GPS定位 ----------
     def on_location(self, **kwargs):
-        """GPS位置回调"""
-        self.current_location = {
-            'lat': kwargs.get('lat', 0),
-            'lon': kwargs.get('lon', 0),
-            'altitude': kwargs.get('alt', 0),
-            'accuracy': kwargs.get('accuracy', 0)
-        }
+        """GPS位置回调：经平滑和限流后，只有明显移动时才更新当前位置"""
+        if 'lat' not in kwargs or 'lon' not in kwargs:
+            return
+        location = self.location_pipeline.on_fix(
+            kwargs['lat'],
+            kwargs['lon'],
+            accuracy=kwargs.get('accuracy'),
+            speed=kwargs.get('speed'),
+            altitude=kwargs.get('altitude', kwargs.get('alt', 0))
+        )
+        if location:
+            self.precise_location = True
+            self.current_location = location
+            self.trace.record(location)
+            if time.time() - self._trace_saved_at >= TRACE_SAVE_INTERVAL:
+                self._trace_saved_at = time.time()
+                threading.Thread(target=self.save_trace, daemon=True).start()
+
+    def subscribe_location(self, callback):
+        """订阅位置变化（仅在明显移动时回调）"""
+        self._ensure_location()
+        self.location_pipeline.subscribe(callback)
+
+    def unsubscribe_location(self, callback):
+        """取消订阅位置变化"""
+        self.location_pipeline.unsubscribe(callback)
+
+    def _gps_on(self):
+        try:
+            gps.start(minTime=GPS_MIN_TIME_MS, minDistance=GPS_MIN_DISTANCE_M)
+        except Exception as e:
+            print(f"GPS启动失败: {e}")
+
+    def _gps_off(self):
+        try:
+            gps.stop()
+        except Exception as e:
+            print(f"GPS停止失败: {e}")
 
     def start_gps(self):
-        """启动GPS定位"""
+        """启动GPS定位（静止时自动间歇关闭）"""
+        self._ensure_location()
         if self.gps_enabled:
-            try:
-                gps.start(mindistance=1, minstatus=1)
-            except:
-                pass
+            self.location_pipeline.activate()
 
     def stop_gps(self):
         """停止GPS定位"""
         if self.gps_enabled:
-            try:
-                gps.stop()
-            except:
-                pass
+            self.location_pipeline.deactivate()
 
     def get_current_location(self):
-        """获取当前位置"""
-        if self.current_location:
-            return self.current_location
-        else:
-            # 如果GPS未获取到位置，返回榆林学院默认位置
-            default_location = {
-                'lat': 38.2850,
-                'lon': 109.7340,
-                'altitude': 0,
-                'accuracy': 0,
-                'note': '默认位置（榆林学院）'
-            }
-            print("GPS未获取到位置，使用默认位置")
-            return default_location
+        """获取当前位置（未定位时为缓存或默认位置，立即返回）"""
+        self._ensure_location()
+        return self.current_location or dict(DEFAULT_LOCATION)
 
     def test_gps_functionality(self):
         """测试GPS功能并提供解决方案"""
         print("\n=== 位置功能测试 ===")
+        self._ensure_location()
 
         # 检查当前位置信息
         if self.current_location:
@@ -173,6 +429,7 @@ class AlarmManager:
 
     def set_manual_location(self, lat, lon, location_name="手动设置位置"):
         """手动设置位置"""
+        self.precise_location = True
         self.current_location = {
             'lat': lat,
             'lon': lon,
@@ -187,8 +444,12 @@ class AlarmManager:
         """设置为榆林学院位置"""
         self.set_manual_location(38.2850, 109.7340, "榆林学院（手动设置）")
 
-    def send_notification(self, title, message, course_name=None):
-        """发送系统通知"""
+    def send_notification(self, title, message, course_name=None, category='general'):
+        """发送系统通知（入队后立即返回，由发送线程调用系统接口）"""
+        self.notifications.put(title, message, category)
+
+    def _deliver_notification(self, title, message):
+        """调用系统通知接口（仅在发送线程中调用）"""
         if PLYER_AVAILABLE:
             try:
                 notification.notify(
@@ -213,62 +474,19 @@ class AlarmManager:
 
 # ==================== 课程提醒器 ====================
 class CourseReminder:
-    """课程提醒器"""
+    """课程提醒器（保留旧接口，内部由统一提醒引擎驱动）"""
 
     def __init__(self, database, alarm_manager):
-        self.db = database
-        self.alarm = alarm_manager
-        self.running = False
-        self.thread = None
+        self.engine = ReminderEngine(database, AlarmSink(alarm_manager, database),
+                                     triggers=[CourseTrigger(database)])
 
     def start(self):
         """启动提醒服务"""
-        if not self.running:
-            self.running = True
-            self.thread = threading.Thread(target=self._check_loop, daemon=True)
-            self.thread.start()
+        self.engine.start()
 
     def stop(self):
         """停止提醒服务"""
-        self.running = False
-
-    def _check_loop(self):
-        """检查循环"""
-        while self.running:
-            self._check_courses()
-            time.sleep(60)  # 每分钟检查一次
-
-    def _check_courses(self):
-        """检查是否有课程需要提醒"""
-        now = datetime.datetime.now()
-        current_time = now.strftime("%H:%M")
-        current_day = now.weekday() + 1  # 1-7 表示周一到周日
-
-        courses = self.db.get_all_courses()
-
-        for course in courses:
-            course_name = course[1]
-            course_time = course[4]
-            course_day = course[5]
-
-            # 检查是否是同一天
-            if str(course_day) != str(current_day):
-                continue
-
-            # 解析课程时间，计算提醒时间
-            try:
-                course_dt = datetime.datetime.strptime(course_time, "%H:%M")
-                reminder_dt = course_dt - datetime.timedelta(minutes=10)
-                reminder_time = reminder_dt.strftime("%H:%M")
-
-                if current_time == reminder_time:
-                    location = course[3] or "未知地点"
-                    self.alarm.send_notification(
-                        title="课程提醒 ⏰",
-                        message=f"【{course_name}】将在10分钟后开始！\n地点: {location}"
-                    )
-            except Exception as e:
-                print(f"时间解析错误: {e}")
+        self.engine.stop()
 
 
 # 测试代码
@@ -277,6 +495,7 @@ if __name__ == '__main__':
 
     # 测试发送通知
     alarm.send_notification("测试通知", "这是一条测试消息")
+    alarm.notifications.flush(timeout=5)
 
     # 测试位置功能
     alarm.test_gps_functionality()
@@ -7,8 +7,8 @@ author = Matrix Agent
 email = support@yulincampus.com
 license = MIT
 source.dir = .
-source.include_exts = py,png,jpg,kv,atlas
-requirements = python3,kivy==2.3.0,requests,beautifulsoup4,plyer,networkx,pillow,python-dateutil,cython
+source.include_exts = py,png,jpg,kv,atlas,pack
+requirements = python3,kivy==2.3.0,requests,beautifulsoup4,plyer,networkx,numpy,pypinyin,pillow,python-dateutil,cython
 orientation = portrait
 
 [android]
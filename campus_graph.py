@@ -0,0 +1,302 @@
+"""
+校园路网模块
+以道路路口和建筑出入口为节点、步行道为边构建路网，用A*算法规划步行路线
+"""
+
+import math
+import time
+
+import networkx as nx
+
+from geo import haversine_m, pairwise_distances, polyline_length
+from spatial_index import SpatialIndex
+
+# 步行速度（米/分钟）
+WALKING_SPEED_MPM = 80
+
+# 转向判断阈值（度）：小于该角度视为直行
+STRAIGHT_ANGLE = 30
+
+# 道路路口：编号 -> (纬度, 经度)
+# 东西向道路自南向北：南环路、学府路、明德路、北环路
+# 南北向道路自西向东：西环路、文化路、中轴路、东环路
+_ROW_ROADS = [('南环路', 38.2843), ('学府路', 38.2850), ('明德路', 38.2857), ('北环路', 38.2864)]
+_COL_ROADS = [('西环路', 109.7325), ('文化路', 109.7337), ('中轴路', 109.7344), ('东环路', 109.7351)]
+
+JUNCTIONS = {
+    f'j{r + 1}{c + 1}': (lat, lon)
+    for r, (_, lat) in enumerate(_ROW_ROADS)
+    for c, (_, lon) in enumerate(_COL_ROADS)
+}
+
+# 建筑出入口：名称 -> (纬度, 经度, 连接的路口)
+ENTRANCES = {
+    "东门": (38.2860, 109.7350, ['j34', 'j44']),
+    "南门": (38.2840, 109.7340, ['j12', 'j13']),
+    "西门": (38.2855, 109.7320, ['j21', 'j31']),
+    "北门": (38.2870, 109.7335, ['j42']),
+    "教学楼A": (38.2855, 109.7345, ['j23', 'j33']),
+    "教学楼B": (38.2858, 109.7348, ['j33', 'j34']),
+    "图书馆": (38.2862, 109.7342, ['j33', 'j43']),
+    "体育馆": (38.2845, 109.7335, ['j12', 'j22']),
+    "食堂": (38.2852, 109.7338, ['j22', 'j32']),
+    "宿舍楼1": (38.2848, 109.7352, ['j14', 'j24']),
+    "宿舍楼2": (38.2846, 109.7355, ['j14', 'j24']),
+    "行政楼": (38.2865, 109.7338, ['j42']),
+    "实验楼": (38.2850, 109.7355, ['j24']),
+}
+
+# 道路以外的步行小路：(起点, 终点, 名称)
+FOOTPATHS = [
+    ('j22', 'j33', '林荫小道'),
+]
+
+
+def _road_edges():
+    """按道路网格生成相邻路口之间的路段"""
+    edges = []
+    for r, (name, _) in enumerate(_ROW_ROADS):
+        for c in range(len(_COL_ROADS) - 1):
+            edges.append((f'j{r + 1}{c + 1}', f'j{r + 1}{c + 2}', name))
+    for c, (name, _) in enumerate(_COL_ROADS):
+        for r in range(len(_ROW_ROADS) - 1):
+            edges.append((f'j{r + 1}{c + 1}', f'j{r + 2}{c + 1}', name))
+    return edges
+
+
+def bearing(lat1, lon1, lat2, lon2):
+    """从点1到点2的方位角（度，正北为0，顺时针）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dlmb = math.radians(lon2 - lon1)
+    x = math.sin(dlmb) * math.cos(phi2)
+    y = math.cos(phi1) * math.sin(phi2) - math.sin(phi1) * math.cos(phi2) * math.cos(dlmb)
+    return (math.degrees(math.atan2(x, y)) + 360) % 360
+
+
+def compass(angle):
+    """方位角转为中文方向"""
+    return ['北', '东北', '东', '东南', '南', '西南', '西', '西北'][int((angle + 22.5) % 360 // 45)]
+
+
+def _instruction(segment):
+    """生成一段导航文字；建筑出入口通道不写道路名"""
+    direction = f"向{compass(segment['bearing'])}步行 {segment['distance_m']:.0f} 米"
+    if segment['kind'] == 'road':
+        return f"{segment['turn']}，沿{segment['name']}{direction}"
+    if segment['turn'] == '出发':
+        return f"从{segment['name']}出发，{direction}"
+    return f"{segment['turn']}，{direction}到达{segment['name']}"
+
+
+def turn_direction(previous, current):
+    """根据前后两段的方位角判断转向"""
+    delta = (current - previous + 540) % 360 - 180
+    if abs(delta) < STRAIGHT_ANGLE:
+        return '直行'
+    if abs(delta) > 150:
+        return '掉头'
+    return '右转' if delta > 0 else '左转'
+
+
+class CampusGraph:
+    """校园步行路网"""
+
+    def __init__(self, junctions=None, entrances=None, roads=None):
+        self.graph = nx.Graph()
+        junctions = JUNCTIONS if junctions is None else junctions
+        entrances = ENTRANCES if entrances is None else entrances
+        roads = _road_edges() + FOOTPATHS if roads is None else roads
+        self.table = None
+        self._index = None
+
+        for node, (lat, lon) in junctions.items():
+            self.graph.add_node(node, lat=lat, lon=lon, kind='junction', name=node)
+        edges = []
+        for name, (lat, lon, links) in entrances.items():
+            self.graph.add_node(name, lat=lat, lon=lon, kind='entrance', name=name)
+            edges.extend((name, junction, name, 'access') for junction in links)
+        edges.extend((u, v, name, 'road') for u, v, name in roads)
+        self.add_edges(edges)
+
+    def add_edge(self, u, v, name, kind='road'):
+        """添加路段；kind 为 road（道路）或 access（建筑出入口通道）"""
+        a, b = self.graph.nodes[u], self.graph.nodes[v]
+        self.graph.add_edge(u, v, length=haversine_m(a['lat'], a['lon'], b['lat'], b['lon']),
+                            name=name, kind=kind)
+
+    def add_edges(self, edges):
+        """批量添加路段 [(u, v, 名称, 类型)]，长度一次性向量化计算"""
+        if not edges:
+            return
+        ends = [(self.position(u), self.position(v)) for u, v, _, _ in edges]
+        lengths = pairwise_distances([a[0] for a, _ in ends], [a[1] for a, _ in ends],
+                                     [b[0] for _, b in ends], [b[1] for _, b in ends])
+        for (u, v, name, kind), length in zip(edges, lengths):
+            self.graph.add_edge(u, v, length=float(length), name=name, kind=kind)
+
+    def position(self, node):
+        data = self.graph.nodes[node]
+        return data['lat'], data['lon']
+
+    def entrances(self):
+        """所有建筑出入口节点"""
+        return [n for n, data in self.graph.nodes(data=True) if data['kind'] == 'entrance']
+
+    def spatial_index(self):
+        """节点空间索引（按 entrance / junction 分类），首次使用时构建"""
+        if self._index is None:
+            self._index = SpatialIndex()
+            for node, data in self.graph.nodes(data=True):
+                self._index.add({'node': node, 'name': data['name'], 'lat': data['lat'], 'lon': data['lon']},
+                                data['kind'])
+        return self._index
+
+    def nearest_node(self, lat, lon, kinds=None):
+        """离给定坐标最近的节点，返回 (节点, 距离米)"""
+        dist, item = self.spatial_index().nearest(lat, lon, kinds)
+        if item is None:
+            return None, float('inf')
+        data = self.graph.nodes[item['node']]
+        return item['node'], haversine_m(lat, lon, data['lat'], data['lon'])
+
+    def snap(self, lat, lon):
+        """把定位吸附到最近的建筑出入口和最近的路网节点"""
+        entrance, entrance_dist = self.nearest_node(lat, lon, 'entrance')
+        node, node_dist = self.nearest_node(lat, lon)
+        return {'entrance': (entrance, entrance_dist), 'node': (node, node_dist)}
+
+    def use_route_table(self, cache_dir=None):
+        """载入（或计算）全源最短路表，之后的路线查询改为查表"""
+        from route_table import ROUTE_CACHE_DIR, RouteTable
+        self.table = RouteTable.load_or_build(self.graph, cache_dir or ROUTE_CACHE_DIR)
+        return self.table
+
+    def shortest_path(self, source, target):
+        """最短路径：有路线表时查表，否则用A*（启发函数为到终点的球面距离）"""
+        if self.table is not None and source in self.table and target in self.table:
+            path = self.table.path(source, target)
+            if path is None:
+                raise nx.NetworkXNoPath(f"{source} 与 {target} 之间没有路径")
+            return path
+
+        goal_lat, goal_lon = self.position(target)
+
+        def heuristic(node, _target):
+            lat, lon = self.position(node)
+            return haversine_m(lat, lon, goal_lat, goal_lon)
+
+        return nx.astar_path(self.graph, source, target, heuristic=heuristic, weight='length')
+
+    def node_for(self, poi):
+        """地点对应的路网节点：所在建筑的出入口，不在路网中时取最近节点"""
+        if poi.get('building') in self.graph:
+            return poi['building']
+        if poi.get('name') in self.graph:
+            return poi['name']
+        return self.nearest_node(poi['lat'], poi['lon'])[0]
+
+    def distance(self, source, target):
+        """两节点间最短步行距离（米）"""
+        if self.table is not None and source in self.table and target in self.table:
+            return self.table.distance(source, target)
+        return self.path_length(self.shortest_path(source, target))
+
+    def path_length(self, path):
+        """路径总长度（米），按节点坐标折线计算"""
+        points = [self.position(node) for node in path]
+        return polyline_length([p[0] for p in points], [p[1] for p in points])
+
+    def segments(self, path):
+        """把节点路径合并为逐段导航：同一条路上的连续路段合并为一段"""
+        segments = []
+        for u, v in zip(path, path[1:]):
+            edge = self.graph.edges[u, v]
+            heading = bearing(*self.position(u), *self.position(v))
+            if segments and segments[-1]['name'] == edge['name'] and segments[-1]['kind'] == edge['kind']:
+                segments[-1]['distance_m'] += edge['length']
+                segments[-1]['to'] = v
+                continue
+            turn = turn_direction(segments[-1]['bearing'], heading) if segments else '出发'
+            segments.append({
+                'name': edge['name'],
+                'kind': edge['kind'],
+                'from': u,
+                'to': v,
+                'bearing': heading,
+                'turn': turn,
+                'distance_m': edge['length'],
+            })
+        for segment in segments:
+            segment['instruction'] = _instruction(segment)
+        return segments
+
+    def walk_minutes(self, path, extra_m=0.0, speed_model=None):
+        """沿路径步行所需分钟数：有步行速度模型时按学到的路段速度估算，否则按固定步速"""
+        if speed_model is not None:
+            return speed_model.estimate_seconds(self, path, extra_m) / 60
+        return (self.path_length(path) + extra_m) / WALKING_SPEED_MPM
+
+    def route(self, source, target, speed_model=None):
+        """规划两节点间的步行路线"""
+        start = time.perf_counter()
+        path = self.shortest_path(source, target)
+        distance = self.path_length(path)
+        return {
+            'path': path,
+            'segments': self.segments(path),
+            'distance_m': distance,
+            'minutes': self.walk_minutes(path, speed_model=speed_model),
+            'elapsed_ms': (time.perf_counter() - start) * 1000,
+        }
+
+    def route_from(self, lat, lon, target, speed_model=None):
+        """从任意坐标出发：先步行到最近的节点，再沿路网前往目的地"""
+        start = time.perf_counter()
+        source, offset = self.nearest_node(lat, lon)
+        result = self.route(source, target, speed_model)
+        if offset >= 1:
+            result['segments'].insert(0, {
+                'name': self.graph.nodes[source]['name'],
+                'kind': 'walk',
+                'from': None,
+                'to': source,
+                'bearing': bearing(lat, lon, *self.position(source)),
+                'turn': '出发',
+                'distance_m': offset,
+                'instruction': f"出发，步行 {offset:.0f} 米至最近道路",
+            })
+            if len(result['segments']) > 1 and result['segments'][1]['turn'] == '出发':
+                result['segments'][1]['turn'] = turn_direction(result['segments'][0]['bearing'],
+                                                               result['segments'][1]['bearing'])
+                result['segments'][1]['instruction'] = _instruction(result['segments'][1])
+            result['distance_m'] += offset
+            result['minutes'] = self.walk_minutes(result['path'], offset, speed_model)
+        result['elapsed_ms'] = (time.perf_counter() - start) * 1000
+        return result
+
+
+_default_graph = None
+
+
+def get_campus_graph():
+    """默认校园路网（首次调用时构建）"""
+    global _default_graph
+    if _default_graph is None:
+        _default_graph = CampusGraph()
+        try:
+            _default_graph.use_route_table()
+        except OSError as e:
+            print(f"路线表不可用，改用实时计算: {e}")
+    return _default_graph
+
+
+# 测试代码
+if __name__ == '__main__':
+    campus = get_campus_graph()
+    print(f"节点 {campus.graph.number_of_nodes()} 个，路段 {campus.graph.number_of_edges()} 条")
+    for source, target in [("南门", "图书馆"), ("宿舍楼2", "教学楼A"), ("西门", "实验楼")]:
+        result = campus.route(source, target)
+        print(f"\n{source} -> {target}: {result['distance_m']:.0f} 米，"
+              f"约 {result['minutes']:.1f} 分钟（{result['elapsed_ms']:.2f} ms）")
+        for segment in result['segments']:
+            print(f"  {segment['instruction']}")
@@ -8,6 +8,54 @@ import os
 
 DATABASE_NAME = 'yulin_campus.db'
 
+# 数据变更监听器（所有Database实例共享）
+_course_listeners = []
+_contest_listeners = []
+
+
+def add_course_listener(callback):
+    """注册课程变更回调
+
+    回调参数为 (action, payload)：新增时为 ('add', 新课程行列表)，
+    删除时为 ('delete', 被删课程id列表)，学期设置变化时为 ('reload', None)。
+    """
+    if callback not in _course_listeners:
+        _course_listeners.append(callback)
+
+
+def remove_course_listener(callback):
+    """注销课程变更回调"""
+    if callback in _course_listeners:
+        _course_listeners.remove(callback)
+
+
+def add_contest_listener(callback):
+    """注册竞赛变更回调，参数同课程变更回调"""
+    if callback not in _contest_listeners:
+        _contest_listeners.append(callback)
+
+
+def remove_contest_listener(callback):
+    """注销竞赛变更回调"""
+    if callback in _contest_listeners:
+        _contest_listeners.remove(callback)
+
+
+def _notify_listeners(listeners, action, payload):
+    for callback in list(listeners):
+        try:
+            callback(action, payload)
+        except Exception as e:
+            print(f"数据变更回调失败: {e}")
+
+
+def _notify_course_change(action, payload):
+    _notify_listeners(_course_listeners, action, payload)
+
+
+def _notify_contest_change(action, payload):
+    _notify_listeners(_contest_listeners, action, payload)
+
 
 class Database:
     """数据库操作类"""
@@ -44,6 +92,13 @@ class Database:
             )
         ''')
 
+        # 课程重复规则字段（旧数据库升级）
+        cursor.execute('PRAGMA table_info(courses)')
+        course_columns = {row[1] for row in cursor.fetchall()}
+        for column in ('weeks', 'skip_dates', 'lead_minutes'):
+            if column not in course_columns:
+                cursor.execute(f'ALTER TABLE courses ADD COLUMN {column} TEXT')
+
         # 竞赛表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS contests (
@@ -56,6 +111,9 @@ class Database:
             )
         ''')
 
+        # 按截止日期查询即将截止的竞赛
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_contests_deadline ON contests (deadline)')
+
         # 设置表
         cursor.execute('''
             CREATE TABLE IF NOT EXISTS settings (
@@ -64,6 +122,45 @@ class Database:
             )
         ''')
 
+        # 已触发提醒表（防止重复提醒）
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS reminder_log (
+                reminder_key TEXT PRIMARY KEY,
+                fired_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+
+        # 校园地点表（建筑、教室、出入口、设施），area 为所在分区，用于按区域加载
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS pois (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT UNIQUE NOT NULL,
+                kind TEXT,
+                building TEXT,
+                lat REAL NOT NULL,
+                lon REAL NOT NULL,
+                area TEXT NOT NULL,
+                aliases TEXT,
+                properties TEXT,
+                version INTEGER DEFAULT 0
+            )
+        ''')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pois_area ON pois (area)')
+        cursor.execute('CREATE INDEX IF NOT EXISTS idx_pois_kind ON pois (kind)')
+
+        # 已读通知表（新通知推送去重），last_seen 为最近一次仍在列表中出现的时间
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS seen_notices (
+                fingerprint TEXT PRIMARY KEY,
+                title TEXT,
+                first_seen TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                last_seen TIMESTAMP
+            )
+        ''')
+        cursor.execute('PRAGMA table_info(seen_notices)')
+        if 'last_seen' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute('ALTER TABLE seen_notices ADD COLUMN last_seen TIMESTAMP')
+
         self.conn.commit()
 
         # 创建默认用户（如果不存在）
@@ -94,14 +191,25 @@ class Database:
             return False
 
     # ==================== 课程操作 ====================
-    def add_course(self, course_name, teacher, location, time_slot, day_of_week):
-        """添加课程"""
+    def add_course(self, course_name, teacher, location, time_slot, day_of_week,
+                   weeks=None, skip_dates=None, lead_minutes=None):
+        """添加课程
+
+        weeks: 上课周次，如 "1-16周"、"1-16周(单)"、"双周"，为空表示每周
+        skip_dates: 停课日期，逗号分隔的 YYYY-MM-DD
+        lead_minutes: 提前提醒分钟数，可多个，如 "30,10"
+        """
         cursor = self.conn.cursor()
         cursor.execute('''
-            INSERT INTO courses (course_name, teacher, location, time_slot, day_of_week)
-            VALUES (?, ?, ?, ?, ?)
-        ''', (course_name, teacher, location, time_slot, day_of_week))
+            INSERT INTO courses (course_name, teacher, location, time_slot, day_of_week,
+                                 weeks, skip_dates, lead_minutes)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', (course_name, teacher, location, time_slot, day_of_week,
+              weeks, skip_dates, lead_minutes))
         self.conn.commit()
+        if _course_listeners:
+            cursor.execute('SELECT * FROM courses WHERE id = ?', (cursor.lastrowid,))
+            _notify_course_change('add', cursor.fetchall())
 
     def get_all_courses(self):
         """获取所有课程"""
@@ -119,8 +227,11 @@ class Database:
     def delete_course(self, course_name):
         """删除课程"""
         cursor = self.conn.cursor()
+        cursor.execute('SELECT id FROM courses WHERE course_name = ?', (course_name,))
+        course_ids = [row[0] for row in cursor.fetchall()]
         cursor.execute('DELETE FROM courses WHERE course_name = ?', (course_name,))
         self.conn.commit()
+        _notify_course_change('delete', course_ids)
 
     # ==================== 竞赛操作 ====================
     def add_contest(self, name, description, url, deadline):
@@ -131,6 +242,9 @@ class Database:
             VALUES (?, ?, ?, ?)
         ''', (name, description, url, deadline))
         self.conn.commit()
+        if _contest_listeners:
+            cursor.execute('SELECT * FROM contests WHERE id = ?', (cursor.lastrowid,))
+            _notify_contest_change('add', cursor.fetchall())
 
     def get_all_contests(self):
         """获取所有竞赛"""
@@ -138,11 +252,111 @@ class Database:
         cursor.execute('SELECT * FROM contests ORDER BY deadline')
         return cursor.fetchall()
 
+    def get_upcoming_contests(self, since):
+        """获取截止日期不早于 since（YYYY-MM-DD）的竞赛，按截止日期排序"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT * FROM contests WHERE deadline >= ? ORDER BY deadline', (since,))
+        return cursor.fetchall()
+
     def delete_contest(self, contest_id):
         """删除竞赛"""
         cursor = self.conn.cursor()
         cursor.execute('DELETE FROM contests WHERE id = ?', (contest_id,))
         self.conn.commit()
+        _notify_contest_change('delete', [contest_id])
+
+    # ==================== 提醒记录操作 ====================
+    def claim_reminders(self, keys):
+        """登记提醒，返回本次成功登记（此前未触发）的键集合"""
+        cursor = self.conn.cursor()
+        claimed = set()
+        for key in keys:
+            cursor.execute('INSERT OR IGNORE INTO reminder_log (reminder_key) VALUES (?)', (key,))
+            if cursor.rowcount == 1:
+                claimed.add(key)
+        self.conn.commit()
+        return claimed
+
+    def prune_reminder_log(self, keep_days=30):
+        """清理过期的提醒记录"""
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM reminder_log WHERE fired_at < datetime('now', ?)",
+                       (f'-{int(keep_days)} days',))
+        self.conn.commit()
+
+    # ==================== 已读通知操作 ====================
+    def get_seen_notices(self):
+        """获取所有已读通知的键"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT fingerprint FROM seen_notices')
+        return [row[0] for row in cursor.fetchall()]
+
+    def add_seen_notices(self, notices):
+        """批量记录已读通知，notices 为 (键, 标题) 列表；已有记录只刷新 last_seen"""
+        cursor = self.conn.cursor()
+        cursor.executemany('''
+            INSERT INTO seen_notices (fingerprint, title, last_seen) VALUES (?, ?, CURRENT_TIMESTAMP)
+            ON CONFLICT(fingerprint) DO UPDATE SET last_seen = CURRENT_TIMESTAMP
+        ''', notices)
+        self.conn.commit()
+
+    def prune_seen_notices(self, keep_days=180):
+        """清理 keep_days 天内没有再出现过的已读通知记录"""
+        cursor = self.conn.cursor()
+        cursor.execute("DELETE FROM seen_notices WHERE COALESCE(last_seen, first_seen) < datetime('now', ?)",
+                       (f'-{int(keep_days)} days',))
+        self.conn.commit()
+
+    # ==================== 校园地点操作 ====================
+    def import_pois(self, pois, version):
+        """批量导入地点（同名覆盖），并记录数据版本
+
+        pois 为 (name, kind, building, lat, lon, area, aliases, properties) 元组列表。
+        """
+        cursor = self.conn.cursor()
+        cursor.executemany('''
+            INSERT INTO pois (name, kind, building, lat, lon, area, aliases, properties, version)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT(name) DO UPDATE SET
+                kind = excluded.kind, building = excluded.building, lat = excluded.lat,
+                lon = excluded.lon, area = excluded.area, aliases = excluded.aliases,
+                properties = excluded.properties, version = excluded.version
+        ''', [(*poi, version) for poi in pois])
+        cursor.execute('INSERT OR REPLACE INTO settings (key, value) VALUES (?, ?)',
+                      ('poi_version', str(version)))
+        self.conn.commit()
+
+    def get_pois_by_area(self, areas):
+        """获取若干分区内的地点"""
+        cursor = self.conn.cursor()
+        areas = list(areas)
+        if not areas:
+            return []
+        placeholders = ', '.join('?' * len(areas))
+        cursor.execute(f'SELECT * FROM pois WHERE area IN ({placeholders})', areas)
+        return cursor.fetchall()
+
+    def get_poi(self, name):
+        """按名称获取地点"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT * FROM pois WHERE name = ?', (name,))
+        return cursor.fetchone()
+
+    def get_poi_names(self):
+        """获取所有地点的名称、别名和类型（用于搜索，不含坐标等详情）"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT name, aliases, kind FROM pois ORDER BY id')
+        return cursor.fetchall()
+
+    def get_poi_areas(self):
+        """获取所有非空分区"""
+        cursor = self.conn.cursor()
+        cursor.execute('SELECT DISTINCT area FROM pois')
+        return [row[0] for row in cursor.fetchall()]
+
+    def get_poi_version(self):
+        """当前地点数据版本，未导入时为 0"""
+        return int(self.get_setting('poi_version', 0) or 0)
 
     # ==================== 设置操作 ====================
     def save_setting(self, key, value):
@@ -165,6 +379,12 @@ class Database:
         cursor.execute('DELETE FROM settings WHERE key = ?', (key,))
         self.conn.commit()
 
+    def set_semester(self, start_date, skip_dates=''):
+        """设置学期开学日期（YYYY-MM-DD）和全校停课日期，课程提醒随之重建"""
+        self.save_setting('semester_start', start_date)
+        self.save_setting('semester_skip_dates', skip_dates)
+        _notify_course_change('reload', None)
+
     def close(self):
         """关闭数据库"""
         self.conn.close()
@@ -0,0 +1,176 @@
+"""
+竞赛截止提醒模块
+按截止时间排序的提醒堆，在截止前 7 天、1 天、2 小时等时刻提醒
+"""
+
+import datetime
+import heapq
+import itertools
+import re
+from collections import deque
+
+from database import add_contest_listener, remove_contest_listener
+from reminder_engine import ReminderTrigger
+
+# 默认提醒时间点：截止前 7 天、1 天、2 小时
+DEFAULT_OFFSETS = '7d,1d,2h'
+
+# 提醒晚于提醒点不超过该时长时视为按时，文案使用提醒点本身（如“还有7天”）
+ON_TIME_GRACE = datetime.timedelta(minutes=5)
+
+_OFFSET_RE = re.compile(r'(\d+)\s*([dhm])')
+_OFFSET_UNITS = {'d': 'days', 'h': 'hours', 'm': 'minutes'}
+
+
+def parse_offsets(text):
+    """解析提醒时间点，如 "7d,1d,2h"，按从早到晚排序"""
+    offsets = {datetime.timedelta(**{_OFFSET_UNITS[unit]: int(value)})
+               for value, unit in _OFFSET_RE.findall(str(text or '').lower())}
+    return sorted(offsets or parse_offsets(DEFAULT_OFFSETS), reverse=True)
+
+
+def parse_deadline(text):
+    """解析截止时间；只有日期时按当天 23:59 截止"""
+    text = str(text or '').strip()
+    for fmt in ('%Y-%m-%d %H:%M', '%Y-%m-%d'):
+        try:
+            deadline = datetime.datetime.strptime(text, fmt)
+        except ValueError:
+            continue
+        if fmt == '%Y-%m-%d':
+            deadline = deadline.replace(hour=23, minute=59)
+        return deadline
+    return None
+
+
+def describe_offset(delta):
+    """把时间差描述为“7天”“2小时”"""
+    if delta >= datetime.timedelta(days=1):
+        return f"{delta.days}天"
+    if delta >= datetime.timedelta(hours=1):
+        return f"{int(delta.total_seconds() // 3600)}小时"
+    return f"{max(1, int(delta.total_seconds() // 60))}分钟"
+
+
+class ContestDeadlineTrigger(ReminderTrigger):
+    """竞赛截止提醒触发器
+
+    小顶堆按提醒时刻排序保存每个竞赛的每个提醒点；新增竞赛 O(log n) 入堆，
+    删除竞赛只做标记，出堆时跳过（惰性删除）。启动时只查询尚未截止的竞赛。
+    """
+
+    category = 'contest'
+    LAST_CHECK_KEY = 'contest_last_check'
+    OFFSETS_KEY = 'contest_alert_offsets'
+
+    def __init__(self, database, offsets=None):
+        self.db = database
+        self.offsets = parse_offsets(offsets or database.get_setting(self.OFFSETS_KEY, DEFAULT_OFFSETS))
+        self.engine = None
+        self.last_check = None
+        self._heap = []            # (提醒时刻, 序号, 竞赛id, 提前量)
+        self._contests = {}        # 竞赛id -> {'name', 'deadline'}
+        self._seq = itertools.count()
+        self._stale = 0            # 堆中已删除竞赛的条目数
+        self._loaded = False
+        self._changes = deque()
+
+    def attach(self, engine):
+        super().attach(engine)
+        self.last_check = engine.log.load_last_check(self.LAST_CHECK_KEY)
+        self._loaded = False
+        add_contest_listener(self.on_contest_change)
+
+    def detach(self):
+        remove_contest_listener(self.on_contest_change)
+        super().detach()
+
+    def on_contest_change(self, action, payload):
+        """竞赛变化：记录变更并唤醒引擎，由引擎线程更新堆"""
+        self._changes.append((action, payload))
+        if self.engine:
+            self.engine.wake()
+
+    def _load(self, now):
+        """从数据库载入尚未截止的竞赛"""
+        self._heap = []
+        self._contests = {}
+        self._stale = 0
+        self._changes.clear()
+        for row in self.db.get_upcoming_contests(now.strftime('%Y-%m-%d')):
+            self._add(row, now)
+        self._loaded = True
+
+    def _add(self, row, now):
+        """加入一个竞赛的全部提醒点，只保留上次检查之后的"""
+        deadline = parse_deadline(row[4])
+        if deadline is None or deadline <= now:
+            return
+        self._contests[row[0]] = {'name': row[1], 'deadline': deadline}
+        since = self.last_check or now
+        for offset in self.offsets:
+            fire_at = deadline - offset
+            if fire_at > since:
+                heapq.heappush(self._heap, (fire_at, next(self._seq), row[0], offset))
+
+    def _remove(self, contest_id):
+        """删除竞赛（堆中条目在出堆时丢弃），失效条目过多时重建堆"""
+        if self._contests.pop(contest_id, None) is None:
+            return
+        self._stale += len(self.offsets)
+        if self._stale > len(self._heap) // 2:
+            self._heap = [e for e in self._heap if e[2] in self._contests]
+            heapq.heapify(self._heap)
+            self._stale = 0
+
+    def _sync(self, now):
+        if not self._loaded:
+            self._load(now)
+        while self._changes:
+            action, payload = self._changes.popleft()
+            if action == 'add':
+                for row in payload:
+                    self._add(row, now)
+            elif action == 'delete':
+                for contest_id in payload:
+                    self._remove(contest_id)
+
+    def _drop_stale_head(self):
+        while self._heap and self._heap[0][2] not in self._contests:
+            heapq.heappop(self._heap)
+            self._stale = max(0, self._stale - 1)
+
+    def next_fire_time(self, now):
+        self._sync(now)
+        self._drop_stale_head()
+        return self._heap[0][0] if self._heap else None
+
+    def collect(self, now):
+        self._sync(now)
+        due = {}
+        while self._heap and self._heap[0][0] <= now:
+            fire_at, _, contest_id, offset = heapq.heappop(self._heap)
+            contest = self._contests.get(contest_id)
+            if contest is None:
+                self._stale = max(0, self._stale - 1)
+                continue
+            # 错过多个提醒点时只发最近的一个
+            due[contest_id] = (fire_at, offset, contest)
+        self.last_check = now
+        self.engine.log.save_last_check(self.LAST_CHECK_KEY, now)
+
+        reminders = []
+        for contest_id, (fire_at, offset, contest) in due.items():
+            deadline = contest['deadline']
+            if deadline <= now:
+                continue
+            # 按时提醒描述提醒点；补发时按实际剩余时间描述
+            remaining = offset if now - fire_at <= ON_TIME_GRACE else deadline - now
+            reminders.append({
+                'key': f"contest:{contest_id}:{describe_offset(offset)}",
+                'category': self.category,
+                'title': "竞赛截止提醒 🏆",
+                'message': (f"【{contest['name']}】还有{describe_offset(remaining)}截止\n"
+                            f"截止时间: {deadline.strftime('%Y-%m-%d %H:%M')}"),
+            })
+        return reminders
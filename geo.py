@@ -0,0 +1,149 @@
+"""
+地理计算模块
+球面距离（haversine）的标量与向量化实现：一对多、多对多、逐对和折线长度，
+以及最近点排序和圆形地理围栏判断；未安装NumPy时退回逐点计算
+"""
+
+import importlib.util
+import math
+
+# 只检查是否安装，首次向量化计算时才导入NumPy（导入约需50毫秒，定位模块在启动时就会载入本模块）
+NUMPY_AVAILABLE = importlib.util.find_spec('numpy') is not None
+np = None
+
+EARTH_RADIUS_M = 6371000.0
+
+
+def load_numpy():
+    """NumPy 模块（首次调用时导入），仅在 NUMPY_AVAILABLE 时调用"""
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+
+def haversine_m(lat1, lon1, lat2, lon2):
+    """两点间球面距离（米）"""
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = math.radians(lon2 - lon1)
+    a = math.sin(dphi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _haversine_arrays(lat1, lon1, lat2, lon2):
+    """NumPy数组（可广播）之间的球面距离"""
+    np = load_numpy()
+    phi1, phi2 = np.radians(lat1), np.radians(lat2)
+    dphi = phi2 - phi1
+    dlmb = np.radians(lon2 - lon1)
+    a = np.sin(dphi / 2) ** 2 + np.cos(phi1) * np.cos(phi2) * np.sin(dlmb / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def distances_from(lat, lon, lats, lons):
+    """一对多：点 (lat, lon) 到每个点的距离"""
+    if NUMPY_AVAILABLE:
+        np = load_numpy()
+        return _haversine_arrays(lat, lon, np.asarray(lats, dtype=float), np.asarray(lons, dtype=float))
+    return [haversine_m(lat, lon, la, lo) for la, lo in zip(lats, lons)]
+
+
+def pairwise_distances(lats1, lons1, lats2, lons2):
+    """逐对：第 i 个起点到第 i 个终点的距离"""
+    if NUMPY_AVAILABLE:
+        np = load_numpy()
+        return _haversine_arrays(np.asarray(lats1, dtype=float), np.asarray(lons1, dtype=float),
+                                 np.asarray(lats2, dtype=float), np.asarray(lons2, dtype=float))
+    return [haversine_m(a, b, c, d) for a, b, c, d in zip(lats1, lons1, lats2, lons2)]
+
+
+def distance_matrix(lats1, lons1, lats2=None, lons2=None):
+    """多对多：返回 len(lats1) x len(lats2) 的距离矩阵，省略第二组时计算组内两两距离"""
+    if lats2 is None:
+        lats2, lons2 = lats1, lons1
+    if NUMPY_AVAILABLE:
+        np = load_numpy()
+        lat1 = np.asarray(lats1, dtype=float)[:, None]
+        lon1 = np.asarray(lons1, dtype=float)[:, None]
+        return _haversine_arrays(lat1, lon1, np.asarray(lats2, dtype=float)[None, :],
+                                 np.asarray(lons2, dtype=float)[None, :])
+    return [[haversine_m(a, b, c, d) for c, d in zip(lats2, lons2)] for a, b in zip(lats1, lons1)]
+
+
+def polyline_lengths(lats, lons):
+    """折线各段长度"""
+    if len(lats) < 2:
+        return load_numpy().zeros(0) if NUMPY_AVAILABLE else []
+    return pairwise_distances(lats[:-1], lons[:-1], lats[1:], lons[1:])
+
+
+def polyline_length(lats, lons):
+    """折线总长度（米）"""
+    lengths = polyline_lengths(lats, lons)
+    return float(lengths.sum() if NUMPY_AVAILABLE else sum(lengths))
+
+
+def nearest(lat, lon, lats, lons, k=1):
+    """离 (lat, lon) 最近的 k 个点，返回 [(下标, 距离米)]，按距离升序"""
+    count = len(lats)
+    if count == 0:
+        return []
+    k = min(k, count)
+    dists = distances_from(lat, lon, lats, lons)
+    if NUMPY_AVAILABLE:
+        np = load_numpy()
+        if k < count:
+            candidates = np.argpartition(dists, k - 1)[:k]
+        else:
+            candidates = np.arange(count)
+        order = candidates[np.argsort(dists[candidates])]
+        return [(int(i), float(dists[i])) for i in order]
+    return sorted(enumerate(dists), key=lambda pair: pair[1])[:k]
+
+
+def within_radius(lat, lon, lats, lons, radii):
+    """圆形地理围栏：点 (lat, lon) 是否在各围栏内（radii 可为单个半径或逐个半径）"""
+    dists = distances_from(lat, lon, lats, lons)
+    if NUMPY_AVAILABLE:
+        return dists <= load_numpy().asarray(radii, dtype=float)
+    if not isinstance(radii, (list, tuple)):
+        radii = [radii] * len(dists)
+    return [d <= r for d, r in zip(dists, radii)]
+
+
+# 测试代码：向量化与逐点计算的速度对比
+if __name__ == '__main__':
+    import random
+    import time
+
+    random.seed(7)
+    count = 10000
+    lats = [38.28 + random.random() * 0.02 for _ in range(count)]
+    lons = [109.72 + random.random() * 0.03 for _ in range(count)]
+
+    def bench(label, func, repeat=10):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            result = func()
+        ms = (time.perf_counter() - start) * 1000 / repeat
+        print(f"{label:<28}{ms:>10.3f} ms")
+        return ms, result
+
+    print(f"=== {count} 个点，NumPy: {NUMPY_AVAILABLE} ===")
+    scalar_ms, scalar = bench("一对多（逐点）", lambda: [haversine_m(38.285, 109.734, a, b)
+                                                        for a, b in zip(lats, lons)])
+    if NUMPY_AVAILABLE:
+        np = load_numpy()
+        lat_arr, lon_arr = np.array(lats), np.array(lons)
+        vector_ms, vector = bench("一对多（向量化）", lambda: distances_from(38.285, 109.734, lat_arr, lon_arr))
+        print(f"加速 {scalar_ms / vector_ms:.1f} 倍，最大误差 {max(abs(a - b) for a, b in zip(scalar, vector)):.2e} 米")
+
+        scalar_ms, _ = bench("折线长度（逐点）", lambda: sum(
+            haversine_m(lats[i], lons[i], lats[i + 1], lons[i + 1]) for i in range(count - 1)))
+        vector_ms, _ = bench("折线长度（向量化）", lambda: polyline_length(lat_arr, lon_arr))
+        print(f"加速 {scalar_ms / vector_ms:.1f} 倍")
+
+        bench("最近10个点（向量化）", lambda: nearest(38.285, 109.734, lat_arr, lon_arr, k=10))
+        bench("1000x1000 距离矩阵", lambda: distance_matrix(lat_arr[:1000], lon_arr[:1000]), repeat=3)
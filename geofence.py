@@ -0,0 +1,241 @@
+"""
+课程地理围栏模块
+按课程地点建立围栏（地点的多边形或按类型的半径），随定位更新判断是否已在教室所在建筑内，
+并估算从当前位置步行到上课地点的时间，供课程提醒决定免打扰或提前提醒
+"""
+
+import time
+
+from geo import NUMPY_AVAILABLE, haversine_m, load_numpy, within_radius
+
+# 各类地点的围栏半径（米），地点属性中的 radius 优先
+KIND_RADII = {
+    '教学楼': 40,
+    '实验楼': 40,
+    '图书馆': 50,
+    '体育馆': 60,
+    '行政楼': 40,
+}
+DEFAULT_RADIUS_M = 40
+
+# 超过该时间没有新定位时不再据此判断（秒）；静止时定位管线不推送，所以取一节课左右
+LOCATION_MAX_AGE = 60 * 60
+
+
+def point_in_polygon(lat, lon, polygon):
+    """射线法判断点是否在多边形内，polygon 为 GeoJSON 顺序的 [[经度, 纬度], ...]"""
+    inside = False
+    j = len(polygon) - 1
+    for i in range(len(polygon)):
+        xi, yi = polygon[i][0], polygon[i][1]
+        xj, yj = polygon[j][0], polygon[j][1]
+        if (yi > lat) != (yj > lat) and lon < (xj - xi) * (lat - yi) / (yj - yi) + xi:
+            inside = not inside
+        j = i
+    return inside
+
+
+def fence_for_poi(poi):
+    """地点 -> 围栏字典：中心、外接半径，以及可选的多边形
+
+    地点属性可带 polygon（GeoJSON 顺序的顶点列表）或 radius（米）。
+    """
+    props = poi.get('properties') or {}
+    polygon = props.get('polygon')
+    if polygon:
+        radius = max(haversine_m(poi['lat'], poi['lon'], lat, lon) for lon, lat in polygon)
+    else:
+        radius = float(props.get('radius') or KIND_RADII.get(poi.get('kind'), DEFAULT_RADIUS_M))
+    return {
+        'name': poi['name'],
+        'lat': poi['lat'],
+        'lon': poi['lon'],
+        'radius': radius,
+        'polygon': polygon or None,
+    }
+
+
+class GeofenceIndex:
+    """围栏索引：中心坐标和半径预先排成数组，一次定位只做一次向量化距离计算"""
+
+    def __init__(self, fences=()):
+        self.fences = list(fences)
+        lats = [f['lat'] for f in self.fences]
+        lons = [f['lon'] for f in self.fences]
+        radii = [f['radius'] for f in self.fences]
+        if NUMPY_AVAILABLE:
+            np = load_numpy()
+            self._lats, self._lons, self._radii = np.array(lats), np.array(lons), np.array(radii)
+        else:
+            self._lats, self._lons, self._radii = lats, lons, radii
+
+    def __len__(self):
+        return len(self.fences)
+
+    def containing(self, lat, lon):
+        """包含该点的围栏名称集合"""
+        if not self.fences:
+            return set()
+        names = set()
+        for fence, hit in zip(self.fences, within_radius(lat, lon, self._lats, self._lons, self._radii)):
+            # 圆形外接范围内再做多边形精确判断
+            if hit and (fence['polygon'] is None or point_in_polygon(lat, lon, fence['polygon'])):
+                names.add(fence['name'])
+        return names
+
+
+class CourseGeofences:
+    """课程围栏
+
+    课程地点按课间行程规划同样的方式解析为校园地点；课表变化时 rebuild()，
+    定位更新时 update_location() 只查询预先建好的索引。
+    课前由提醒引擎调用 track() 打开定位、上课后 release() 关闭，其余时间不使用GPS。
+    walk_minutes() 按步行速度模型（有轨迹时）估算到上课地点的时间。
+    """
+
+    def __init__(self, database, alarm_manager=None, max_age=LOCATION_MAX_AGE, clock=time.time):
+        self.db = database
+        self.alarm_manager = alarm_manager
+        self.max_age = max_age
+        self.clock = clock
+        self.index = GeofenceIndex()
+        self._planner = None
+        self._courses = {}     # 课程id -> (围栏名称, 路网节点)
+        self._position = None  # (纬度, 经度, 时刻, 所在围栏集合)
+        self._tracking = False
+
+    def _get_planner(self):
+        """首次建立围栏时才载入地点和路网"""
+        if self._planner is None:
+            from campus_graph import get_campus_graph
+            from itinerary import ItineraryPlanner
+            from poi_store import POIStore
+            self._planner = ItineraryPlanner(POIStore(self.db), get_campus_graph())
+        return self._planner
+
+    def attach(self):
+        """订阅定位更新（不主动打开GPS）"""
+        if self.alarm_manager is not None:
+            self.alarm_manager.location_pipeline.subscribe(self.update_location)
+
+    def detach(self):
+        if self.alarm_manager is not None:
+            self.alarm_manager.location_pipeline.unsubscribe(self.update_location)
+
+    def track(self):
+        """打开GPS（低功耗定位管线，静止时间歇关闭），供课前判断位置"""
+        if self.alarm_manager is not None and not self._tracking:
+            self._tracking = True
+            self.alarm_manager.start_gps()
+
+    def release(self):
+        """关闭 track() 打开的GPS"""
+        if self.alarm_manager is not None and self._tracking:
+            self._tracking = False
+            self.alarm_manager.stop_gps()
+
+    def rebuild(self, courses):
+        """按课程（parse_course 的结果）重建围栏索引"""
+        planner = self._get_planner()
+        fences = {}
+        mapping = {}
+        for course in courses:
+            poi, node = planner.resolve(course['location'])
+            if poi is None:
+                continue
+            fences.setdefault(poi['name'], fence_for_poi(poi))
+            mapping[course['id']] = (poi['name'], node)
+        self.index = GeofenceIndex(fences.values())
+        self._courses = mapping
+        if self._position is not None:
+            lat, lon, at, _ = self._position
+            self._position = (lat, lon, at, self.index.containing(lat, lon))
+
+    def update_location(self, location):
+        """定位更新回调：记录位置和所在围栏"""
+        lat, lon = location['lat'], location['lon']
+        self._position = (lat, lon, self.clock(), self.index.containing(lat, lon))
+
+    def _current(self):
+        position = self._position
+        if position is None or self.clock() - position[2] > self.max_age:
+            return None
+        return position
+
+    def is_inside(self, course_id):
+        """当前是否已在课程地点的围栏内；没有新近定位或地点无法识别时为 False"""
+        position = self._current()
+        entry = self._courses.get(course_id)
+        return position is not None and entry is not None and entry[0] in position[3]
+
+    def walk_minutes(self, course_id):
+        """从当前位置步行到课程地点的分钟数；无法估算时返回 None"""
+        position = self._current()
+        entry = self._courses.get(course_id)
+        if position is None or entry is None or entry[1] is None:
+            return None
+        speed_model = self.alarm_manager.trace.model if self.alarm_manager is not None else None
+        try:
+            result = self._get_planner().campus.route_from(position[0], position[1], entry[1], speed_model)
+        except Exception as e:
+            print(f"步行时间估算失败: {e}")
+            return None
+        return result['minutes']
+
+
+# 测试代码
+if __name__ == '__main__':
+    import datetime
+    import random
+
+    from database import Database
+    from reminder_engine import CourseTrigger, ReminderEngine
+
+    class _Clock:
+        def __init__(self, now):
+            self.current = now
+
+        def now(self):
+            return self.current
+
+        def wait(self, event, seconds):
+            return False
+
+    fences = CourseGeofences(Database())
+    fences.rebuild([
+        {'id': 1, 'location': '教学楼A301'},
+        {'id': 2, 'location': '图书馆报告厅'},
+        {'id': 3, 'location': '体育馆'},
+    ])
+    print(f"围栏 {len(fences.index)} 个: {[(f['name'], f['radius']) for f in fences.index.fences]}")
+
+    fences.update_location({'lat': 38.28552, 'lon': 109.73452})
+    print("在教学楼A内:", fences.is_inside(1), " 在图书馆内:", fences.is_inside(2))
+    fences.update_location({'lat': 38.2871, 'lon': 109.7335})
+    print(f"从北门到体育馆步行约 {fences.walk_minutes(3):.1f} 分钟")
+
+    # 每次定位都查询一次索引的耗时（200个围栏）
+    random.seed(4)
+    big = GeofenceIndex(fence_for_poi({'name': f'地点{i}', 'kind': '教学楼', 'properties': {},
+                                       'lat': 38.283 + random.random() * 0.005,
+                                       'lon': 109.732 + random.random() * 0.005}) for i in range(200))
+    start = time.perf_counter()
+    for _ in range(1000):
+        big.containing(38.2855, 109.7345)
+    print(f"200个围栏查询: {(time.perf_counter() - start):.4f} ms/次")
+
+    # 提醒引擎：人在校外时提前发出发提醒，到教学楼A后高数课不再提醒
+    today = datetime.datetime(2026, 3, 2, 7, 0)   # 周一
+    db = Database()
+    engine = ReminderEngine(db, lambda r: print(" ", r['title'], r['message'].replace('\n', ' ')),
+                            clock=_Clock(today))
+    trigger = CourseTrigger(db, geofences=fences)
+    engine.add_trigger(trigger)
+    trigger.queue.rebuild([(101, "体育", "", "体育馆", "08:00", 1), (102, "高数", "", "教学楼A301", "08:00", 1)])
+    trigger._dirty = False
+    for minute in range(30, 60, 5):
+        engine.clock.current = today.replace(minute=minute)
+        location = {'lat': 38.2990, 'lon': 109.7340} if minute < 45 else {'lat': 38.28552, 'lon': 109.73452}
+        fences.update_location(location)
+        print(f"07:{minute} 人在{'校外' if minute < 45 else '教学楼A'}")
+        engine.run_once()
@@ -0,0 +1,215 @@
+"""
+每日行程模块
+按当天课程顺序计算教室之间的步行路线和时间，标出课间来不及赶到的换教室
+"""
+
+import datetime
+
+from campus_graph import WALKING_SPEED_MPM
+from recurrence import parse_date, parse_dates
+from reminder_engine import parse_course
+
+# 每次课的时长（分钟），课表只记录上课时间
+CLASS_MINUTES = 90
+
+# 课间富余少于该分钟数时提示“时间紧张”
+TIGHT_MINUTES = 3
+
+
+def next_date(day_of_week, today=None):
+    """星期 day_of_week（1-7）最近的一天（今天或之后）"""
+    today = today or datetime.date.today()
+    return today + datetime.timedelta(days=(day_of_week - today.isoweekday()) % 7)
+
+
+class ItineraryPlanner:
+    """课间行程规划
+
+    课程地点先解析为校园地点再映射到路网节点，地点解析和两节点间的步行距离都会缓存，
+    同一批课程反复规划（如全班一周的课表）时只需查表。
+    提供 speed_model（trace_recorder.WalkingSpeedModel）时按学到的个人和路段速度估算步行时间。
+    """
+
+    def __init__(self, poi_store, campus_graph, speed_mpm=WALKING_SPEED_MPM, class_minutes=CLASS_MINUTES,
+                 speed_model=None):
+        self.poi_store = poi_store
+        self.campus = campus_graph
+        self.speed_mpm = speed_mpm
+        self.class_minutes = class_minutes
+        self.speed_model = speed_model
+        self._places = {}   # 课程地点文本 -> (地点, 路网节点)
+        self._legs = {}     # (节点, 节点) -> 距离米
+        self._paths = {}    # (节点, 节点) -> 节点路径
+
+    # ---------- 解析与缓存 ----------
+    def resolve(self, location):
+        """课程地点 -> (地点, 路网节点)，无法识别时为 (None, None)
+
+        依次尝试完整名称、逐步去掉末尾字符（“教学楼A301” -> “教学楼A”）和搜索匹配。
+        """
+        location = (location or '').strip()
+        if location in self._places:
+            return self._places[location]
+
+        poi = None
+        compact = ''.join(location.split())
+        for end in range(len(compact), 0, -1):
+            poi = self.poi_store.get(compact[:end])
+            if poi:
+                break
+        if poi is None and compact:
+            poi = self.poi_store.resolve(compact)
+
+        result = (poi, self.campus.node_for(poi)) if poi else (None, None)
+        self._places[location] = result
+        return result
+
+    def walking_distance(self, source, target):
+        """两节点间步行距离（米），结果缓存"""
+        if source == target:
+            return 0.0
+        key = (source, target) if source <= target else (target, source)
+        dist = self._legs.get(key)
+        if dist is None:
+            dist = self._legs[key] = self.campus.distance(source, target)
+        return dist
+
+    def walking_minutes(self, source, target):
+        """两节点间步行分钟数，路径缓存"""
+        if self.speed_model is None or source == target:
+            return self.walking_distance(source, target) / self.speed_mpm
+        key = (source, target) if source <= target else (target, source)
+        path = self._paths.get(key)
+        if path is None:
+            path = self._paths[key] = self.campus.shortest_path(*key)
+        return self.campus.walk_minutes(path, speed_model=self.speed_model)
+
+    # ---------- 规划 ----------
+    def plan_courses(self, courses, on_date=None, semester_start=None, global_skip_dates=frozenset()):
+        """规划同一天的课程（courses 表的行），返回行程字典
+
+        给出 on_date 时只保留按重复规则（周次、单双周、停课日期）当天上课的课程；
+        legs 为相邻两节课之间的步行段，feasible 为 False 表示课间来不及赶到；
+        unresolved 为无法识别地点的课程名。
+        """
+        parsed = [c for c in (parse_course(row) for row in courses) if c]
+        if on_date is not None:
+            parsed = [c for c in parsed if c['rule'].occurs_on(on_date, semester_start, global_skip_dates)]
+        parsed.sort(key=lambda c: (c['hour'], c['minute']))
+
+        legs = []
+        unresolved = []
+        for course in parsed:
+            poi, _ = self.resolve(course['location'])
+            if poi is None:
+                unresolved.append(course['name'])
+
+        for prev, course in zip(parsed, parsed[1:]):
+            prev_poi, prev_node = self.resolve(prev['location'])
+            poi, node = self.resolve(course['location'])
+            if prev_node is None or node is None:
+                continue
+            distance = self.walking_distance(prev_node, node)
+            walk = self.walking_minutes(prev_node, node)
+            gap = (course['hour'] * 60 + course['minute']) - (prev['hour'] * 60 + prev['minute'] + self.class_minutes)
+            legs.append({
+                'from': prev['name'],
+                'to': course['name'],
+                'from_place': prev_poi['name'],
+                'to_place': poi['name'],
+                'start': f"{prev['hour']:02d}:{prev['minute']:02d}",
+                'distance_m': distance,
+                'walk_minutes': walk,
+                'gap_minutes': gap,
+                'slack_minutes': gap - walk,
+                'feasible': walk <= gap,
+            })
+
+        return {
+            'courses': [c['name'] for c in parsed],
+            'legs': legs,
+            'total_distance_m': sum(leg['distance_m'] for leg in legs),
+            'conflicts': [leg for leg in legs if not leg['feasible']],
+            'unresolved': unresolved,
+        }
+
+    def plan_day(self, db, day_of_week=None, on_date=None):
+        """规划某天（1-7，默认今天）的行程；给出日期 on_date 时按该日期的重复规则筛选课程"""
+        if on_date is not None:
+            return self.plan_courses(db.get_courses_by_day(on_date.isoweekday()), on_date,
+                                     parse_date(db.get_setting('semester_start')),
+                                     parse_dates(db.get_setting('semester_skip_dates')))
+        day = day_of_week or datetime.date.today().isoweekday()
+        return self.plan_courses(db.get_courses_by_day(day))
+
+    def plan_week(self, db):
+        return {day: self.plan_day(db, day) for day in range(1, 8)}
+
+
+def describe_conflicts(plan):
+    """行程中需要注意的换教室，返回提示文字列表"""
+    notes = []
+    for leg in plan['legs']:
+        if leg['gap_minutes'] < 0:
+            notes.append(f"⚠️ {leg['from']} 与 {leg['to']} 上课时间重叠")
+        elif not leg['feasible']:
+            notes.append(f"⚠️ {leg['from']} → {leg['to']}：{leg['from_place']}到{leg['to_place']}"
+                         f"步行约 {leg['walk_minutes']:.0f} 分钟，课间只有 {leg['gap_minutes']} 分钟")
+        elif leg['slack_minutes'] < TIGHT_MINUTES:
+            notes.append(f"⏱ {leg['from']} → {leg['to']}：步行约 {leg['walk_minutes']:.0f} 分钟，时间较紧")
+    for name in plan['unresolved']:
+        notes.append(f"❓ {name}：无法识别上课地点")
+    return notes
+
+
+# 测试代码
+if __name__ == '__main__':
+    import random
+    import time
+
+    from campus_graph import get_campus_graph
+    from database import Database
+    from poi_store import POIStore
+
+    planner = ItineraryPlanner(POIStore(Database()), get_campus_graph())
+    day = [
+        (1, "高等数学", "", "教学楼A301", "08:00", 1),
+        (2, "大学英语", "", "实验楼205", "09:40", 1),
+        (3, "体育", "", "体育馆", "11:12", 1),
+        (4, "数据结构", "", "图书馆报告厅", "14:00", 1),
+    ]
+    plan = planner.plan_courses(day)
+    for leg in plan['legs']:
+        print(f"{leg['from_place']} -> {leg['to_place']}: {leg['distance_m']:.0f} 米，"
+              f"{leg['walk_minutes']:.1f}/{leg['gap_minutes']} 分钟")
+    print("\n".join(describe_conflicts(plan)))
+
+    # 单双周课程排在同一时间段：按日期的重复规则筛选后不算冲突
+    import sqlite3
+    conn = sqlite3.connect(':memory:')
+    conn.row_factory = sqlite3.Row
+    conn.execute('CREATE TABLE courses (id, course_name, teacher, location, time_slot, day_of_week, weeks)')
+    conn.executemany('INSERT INTO courses VALUES (?, ?, ?, ?, ?, ?, ?)', [
+        (5, "物理实验", "", "实验楼205", "08:00", 2, "1-16周(单)"),
+        (6, "体育", "", "体育馆", "08:00", 2, "1-16周(双)"),
+    ])
+    rows = conn.execute('SELECT * FROM courses').fetchall()
+    semester_start = datetime.date(2026, 3, 2)
+    print("不按日期:", describe_conflicts(planner.plan_courses(rows)))
+    for tuesday in (datetime.date(2026, 3, 3), datetime.date(2026, 3, 10)):
+        plan = planner.plan_courses(rows, tuesday, semester_start)
+        print(f"{tuesday}: {plan['courses']} {describe_conflicts(plan)}")
+
+    # 50名学生一周的课表
+    random.seed(9)
+    rooms = ["教学楼A", "教学楼B", "实验楼", "图书馆", "体育馆", "行政楼"]
+    slots = ["08:00", "10:00", "14:00", "16:00", "19:00"]
+    students = [[(i, f"课程{i}", "", f"{random.choice(rooms)}{random.randint(101, 520)}", slot, d)
+                 for d in range(1, 6) for i, slot in enumerate(random.sample(slots, 4))]
+                for _ in range(50)]
+    start = time.perf_counter()
+    conflicts = 0
+    for schedule in students:
+        for d in range(1, 6):
+            conflicts += len(planner.plan_courses([c for c in schedule if c[5] == d])['conflicts'])
+    print(f"\n50名学生一周行程: {(time.perf_counter() - start) * 1000:.1f} ms，来不及换教室 {conflicts} 次")
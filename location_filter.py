@@ -0,0 +1,212 @@
+"""
+定位平滑模块
+对GPS定位做精度加权的卡尔曼平滑、按速度和时间限流，静止时间歇关闭GPS
+"""
+
+import math
+import threading
+import time
+
+from geo import haversine_m
+
+# 步行场景的过程噪声（米/秒），越大越相信新定位
+PROCESS_NOISE_MPS = 1.5
+
+# 精度无效或缺失时使用的测量误差（米）
+DEFAULT_ACCURACY_M = 30.0
+
+# 移动超过该距离（米）才通知订阅者；定位误差较大时按误差的一半放宽
+MIN_MOVE_M = 8.0
+
+# 按速度限流：静止 / 步行 / 骑行以上时两次处理的最短间隔（秒）
+MIN_INTERVAL_STATIONARY = 30.0
+MIN_INTERVAL_WALKING = 5.0
+MIN_INTERVAL_FAST = 2.0
+
+# 连续多久无明显移动视为静止（秒），静止后GPS关闭多久再重新打开（秒）
+STATIONARY_AFTER = 120.0
+DUTY_OFF_SECONDS = 60.0
+
+# GPS开启期间检查是否静止的间隔（秒）：静止时GPS可能很少回调，不能只在收到定位时判断
+STATIONARY_CHECK_SECONDS = 30.0
+
+# GPS开启时的请求参数：最小时间间隔（毫秒）和最小距离（米）
+GPS_MIN_TIME_MS = 2000
+GPS_MIN_DISTANCE_M = 5
+
+
+class KalmanLocationFilter:
+    """经纬度卡尔曼平滑（匀位置模型）
+
+    方差以平方米计：每次预测按经过时间增加过程噪声，
+    更新时按定位精度加权，精度越差的定位影响越小。
+    """
+
+    def __init__(self, process_noise=PROCESS_NOISE_MPS):
+        self.q = process_noise
+        self.lat = None
+        self.lon = None
+        self.variance = -1.0
+        self.timestamp = None
+
+    def reset(self):
+        self.variance = -1.0
+
+    def update(self, lat, lon, accuracy, timestamp):
+        """输入一次定位，返回平滑后的 (lat, lon, 估计误差米)"""
+        accuracy = accuracy if accuracy and accuracy > 0 else DEFAULT_ACCURACY_M
+        if self.variance < 0:
+            self.lat, self.lon = lat, lon
+            self.variance = accuracy * accuracy
+            self.timestamp = timestamp
+            return self.lat, self.lon, accuracy
+
+        dt = max(0.0, timestamp - self.timestamp)
+        if dt > 0:
+            self.variance += dt * self.q * self.q
+            self.timestamp = timestamp
+
+        gain = self.variance / (self.variance + accuracy * accuracy)
+        self.lat += gain * (lat - self.lat)
+        self.lon += gain * (lon - self.lon)
+        self.variance = (1 - gain) * self.variance
+        return self.lat, self.lon, math.sqrt(self.variance)
+
+
+class LocationPipeline:
+    """自适应定位管道
+
+    GPS回调先经过限流和平滑，只有发生明显移动时才更新位置并通知订阅者；
+    长时间静止时暂停GPS，一段时间后再打开确认是否开始移动。
+    """
+
+    def __init__(self, start_gps=None, stop_gps=None, clock=time.monotonic):
+        self.filter = KalmanLocationFilter()
+        self.start_gps = start_gps
+        self.stop_gps = stop_gps
+        self.clock = clock
+        self.location = None          # 最近一次发布的位置
+        self.speed = 0.0              # 估计速度（米/秒）
+        self.gps_active = False
+        self._subscribers = []
+        self._last_processed = None
+        self._last_moved = None
+        self._last_fix = None         # 上次平滑结果 (lat, lon, 时刻)
+        self._restart_timer = None
+        self._stationary_timer = None
+        self._lock = threading.Lock()
+
+    # ---------- 订阅 ----------
+    def subscribe(self, callback):
+        """订阅位置变化，回调参数为位置字典"""
+        if callback not in self._subscribers:
+            self._subscribers.append(callback)
+
+    def unsubscribe(self, callback):
+        if callback in self._subscribers:
+            self._subscribers.remove(callback)
+
+    # ---------- GPS开关 ----------
+    def activate(self):
+        """打开GPS"""
+        self._cancel_restart()
+        if not self.gps_active and self.start_gps:
+            self.start_gps()
+        self.gps_active = True
+        self._last_moved = self.clock()
+        self._schedule_stationary_check()
+
+    def deactivate(self):
+        """关闭GPS（不再自动重启）"""
+        self._cancel_restart()
+        self._cancel_stationary_check()
+        if self.gps_active and self.stop_gps:
+            self.stop_gps()
+        self.gps_active = False
+
+    def _duty_cycle_off(self):
+        """静止时暂时关闭GPS，DUTY_OFF_SECONDS 后重新打开"""
+        self.deactivate()
+        self.filter.reset()
+        self._restart_timer = threading.Timer(DUTY_OFF_SECONDS, self.activate)
+        self._restart_timer.daemon = True
+        self._restart_timer.start()
+
+    def _schedule_stationary_check(self):
+        self._cancel_stationary_check()
+        self._stationary_timer = threading.Timer(STATIONARY_CHECK_SECONDS, self._check_stationary)
+        self._stationary_timer.daemon = True
+        self._stationary_timer.start()
+
+    def _cancel_stationary_check(self):
+        if self._stationary_timer is not None:
+            self._stationary_timer.cancel()
+            self._stationary_timer = None
+
+    def _check_stationary(self):
+        """定时检查：GPS开启且长时间没有明显移动（包括没有收到定位）时进入间歇关闭"""
+        with self._lock:
+            if not self.gps_active:
+                return
+            stationary = self.clock() - (self._last_moved or self.clock()) > STATIONARY_AFTER
+            if stationary:
+                self._duty_cycle_off()
+        if not stationary:
+            self._schedule_stationary_check()
+
+    def _cancel_restart(self):
+        if self._restart_timer is not None:
+            self._restart_timer.cancel()
+            self._restart_timer = None
+
+    # ---------- 定位处理 ----------
+    def _min_interval(self):
+        if self.speed < 0.5:
+            return MIN_INTERVAL_STATIONARY
+        if self.speed < 2.5:
+            return MIN_INTERVAL_WALKING
+        return MIN_INTERVAL_FAST
+
+    def on_fix(self, lat, lon, accuracy=None, speed=None, altitude=0):
+        """处理一次GPS定位；位置发生明显变化时返回新位置，否则返回 None"""
+        now = self.clock()
+        with self._lock:
+            if speed is not None and speed >= 0:
+                self.speed = speed
+            if (self._last_processed is not None and self.location is not None
+                    and now - self._last_processed < self._min_interval()):
+                return None
+
+            previous = self._last_fix
+            smooth_lat, smooth_lon, error = self.filter.update(lat, lon, accuracy, now)
+            self._last_fix = (smooth_lat, smooth_lon, now)
+
+            # GPS未给出速度时，按平滑后位置估算并做指数平均，避免定位噪声被当成移动
+            if (speed is None or speed < 0) and previous is not None and now > previous[2]:
+                instant = haversine_m(previous[0], previous[1], smooth_lat, smooth_lon) / (now - previous[2])
+                self.speed = 0.7 * self.speed + 0.3 * instant
+            self._last_processed = now
+
+            if self.location is not None:
+                moved = haversine_m(self.location['lat'], self.location['lon'], smooth_lat, smooth_lon)
+                if moved < max(MIN_MOVE_M, error / 2):
+                    if self.gps_active and now - (self._last_moved or now) > STATIONARY_AFTER:
+                        self._duty_cycle_off()
+                    return None
+
+            self._last_moved = now
+            self.location = {
+                'lat': smooth_lat,
+                'lon': smooth_lon,
+                'altitude': altitude or 0,
+                'accuracy': round(error, 1),
+                'speed': round(self.speed, 2),
+            }
+            location = self.location
+
+        for callback in list(self._subscribers):
+            try:
+                callback(location)
+            except Exception as e:
+                print(f"位置回调失败: {e}")
+        return location
@@ -15,7 +15,10 @@ import os
 import sys
 import threading
 import time
-import datetime
+
+# 启动计时从这里开始，尽量早于其他导入
+from startup import LazyModule, profiler
+
 from dateutil import parser as date_parser
 
 # 禁用Kivy多线程警告
@@ -24,32 +27,52 @@ os.environ["KIVY_NO_CONSOLELOG"] = "1"
 os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
 os.environ.setdefault("SDL_AUDIODRIVER", "disk")
 
-from kivy import Config
-
-Config.set("graphics", "multisamples", "0")
-Config.set("graphics", "vsync", "0")
-
-from kivy.app import App
-from kivy.core.window import Window
-from kivy.lang import Builder
-from kivy.uix.screenmanager import ScreenManager, Screen, FadeTransition
-from kivy.properties import ObjectProperty, StringProperty, BooleanProperty
-from kivy.clock import Clock, mainthread
-from kivy.uix.popup import Popup
-from kivy.uix.boxlayout import BoxLayout
-from kivy.uix.label import Label
-from kivy.uix.button import Button
-from kivy.uix.textinput import TextInput
-from kivy.uix.spinner import Spinner
-from kivy.uix.recycleview import RecycleView
-from kivy.uix.behaviors import FocusBehavior
-from kivy.uix.recycleboxlayout import RecycleBoxLayout
-from kivy.uix.scrollview import ScrollView
+with profiler.phase("import.kivy"):
+    from kivy import Config
+
+    Config.set("graphics", "multisamples", "0")
+    Config.set("graphics", "vsync", "0")
+
+    from kivy.app import App
+    from kivy.core.window import Window
+    from kivy.lang import Builder
+    from kivy.uix.screenmanager import ScreenManager, Screen, FadeTransition
+    from kivy.properties import ObjectProperty, StringProperty, BooleanProperty
+    from kivy.clock import Clock, mainthread
+    from kivy.uix.popup import Popup
+    from kivy.uix.boxlayout import BoxLayout
+    from kivy.uix.label import Label
+    from kivy.uix.button import Button
+    from kivy.uix.textinput import TextInput
+    from kivy.uix.spinner import Spinner
+    from kivy.uix.recycleview import RecycleView
+    from kivy.uix.behaviors import FocusBehavior
+    from kivy.uix.recycleboxlayout import RecycleBoxLayout
+    from kivy.uix.scrollview import ScrollView
 
 # 导入自定义模块
-from database import Database
-from alarm_manager import AlarmManager
-from scraper import YulinScraper
+with profiler.phase("import.app_modules"):
+    from database import Database
+    from alarm_manager import AlarmManager
+    from trace_recorder import TRACE_FILE
+    from recurrence import parse_date
+    from deadline_alerts import ContestDeadlineTrigger
+    from notice_watcher import NoticeWatcher
+    from reminder_engine import AlarmSink, CourseTrigger, ReminderEngine
+
+# 爬虫依赖 requests/BeautifulSoup，首次进入信息中心时才导入
+scraper_module = LazyModule("scraper")
+# 路网依赖 networkx，首次规划路线时才导入
+campus_graph_module = LazyModule("campus_graph")
+itinerary_module = LazyModule("itinerary")
+# 地点库和课程围栏用到 NumPy 和空间索引，首次规划路线或建立围栏时才导入
+poi_store_module = LazyModule("poi_store")
+geofence_module = LazyModule("geofence")
+# 离线瓦片包，首次进入地图时才打开
+tile_cache_module = LazyModule("tile_cache")
+
+# 添加课程时的星期选项
+WEEKDAYS = ["周一", "周二", "周三", "周四", "周五", "周六", "周日"]
 
 # 颜色配置 - 榆林学院主题色
 THEME_COLOR = "#A80000"  # 榆林学院红
@@ -70,6 +93,7 @@ class LoginScreen(Screen):
     remember_me = BooleanProperty(False)
     error_msg = StringProperty("")
 
+    @profiler.timed("screen.login")
     def __init__(self, **kwargs):
         super(LoginScreen, self).__init__(**kwargs)
         self.db = Database()
@@ -116,6 +140,7 @@ class MainScreen(Screen):
 
     username = StringProperty("")
 
+    @profiler.timed("screen.main")
     def __init__(self, **kwargs):
         super(MainScreen, self).__init__(**kwargs)
         self.db = Database()
@@ -130,10 +155,16 @@ class ScheduleScreen(Screen):
     """课表管理界面"""
 
     course_list = ObjectProperty(None)
+    transfer_warning = StringProperty("")
 
+    @profiler.timed("screen.schedule")
     def __init__(self, **kwargs):
         super(ScheduleScreen, self).__init__(**kwargs)
         self.db = Database()
+        # 换教室检查在后台线程进行，使用独立的数据库连接，同一时间只运行一次检查
+        self.planner = None
+        self._transfer_db = None
+        self._transfer_lock = threading.Lock()
         self.load_courses()
 
     def load_courses(self):
@@ -150,10 +181,94 @@ class ScheduleScreen(Screen):
             for c in courses
         ]
 
-    def add_course(self, name, teacher, location, time_slot, day):
-        """添加课程"""
-        self.db.add_course(name, teacher, location, time_slot, day)
+    def show_add_course_popup(self):
+        """添加课程对话框：基本信息和可选的重复规则（周次、停课日期、提前提醒）"""
+        content = BoxLayout(orientation="vertical", spacing=8, padding=10)
+        fields = {}
+        for key, hint in (
+            ("name", "课程名称"),
+            ("teacher", "教师"),
+            ("location", "上课地点（如 教学楼A301）"),
+            ("time_slot", "上课时间（如 08:00）"),
+            ("weeks", "上课周次（可选，如 1-16周、1-16周(单)、双周）"),
+            ("skip_dates", "停课日期（可选，如 2026-04-04,2026-05-01）"),
+            ("lead_minutes", "提前提醒分钟数（可选，如 30,10）"),
+        ):
+            fields[key] = TextInput(hint_text=hint, multiline=False, size_hint_y=None, height=40)
+            content.add_widget(fields[key])
+        day_spinner = Spinner(text=WEEKDAYS[0], values=WEEKDAYS, size_hint_y=None, height=40)
+        content.add_widget(day_spinner)
+        error = Label(text="", color=(0.66, 0, 0, 1), size_hint_y=None, height=24)
+        content.add_widget(error)
+        buttons = BoxLayout(size_hint_y=None, height=45, spacing=10)
+        cancel = Button(text="取消")
+        confirm = Button(text="添加", background_color=(0.66, 0, 0, 1), color=(1, 1, 1, 1))
+        buttons.add_widget(cancel)
+        buttons.add_widget(confirm)
+        content.add_widget(buttons)
+        popup = Popup(title="添加课程", content=content, size_hint=(0.9, 0.9))
+
+        def on_confirm(*args):
+            values = {key: field.text.strip() for key, field in fields.items()}
+            if not values["name"]:
+                error.text = "请输入课程名称"
+                return
+            try:
+                hour, minute = (int(part) for part in values["time_slot"].split(":"))
+                if not (0 <= hour < 24 and 0 <= minute < 60):
+                    raise ValueError
+            except ValueError:
+                error.text = "上课时间格式应为 08:00"
+                return
+            rule = {key: values[key] for key in ("weeks", "skip_dates", "lead_minutes") if values[key]}
+            self.add_course(values["name"], values["teacher"], values["location"],
+                            f"{hour:02d}:{minute:02d}", WEEKDAYS.index(day_spinner.text) + 1, **rule)
+            popup.dismiss()
+
+        cancel.bind(on_press=popup.dismiss)
+        confirm.bind(on_press=on_confirm)
+        popup.open()
+
+    def add_course(self, name, teacher, location, time_slot, day, **rule):
+        """添加课程（rule 可包含 weeks、skip_dates、lead_minutes）"""
+        self.db.add_course(name, teacher, location, time_slot, day, **rule)
         self.load_courses()
+        self.check_transfers(day)
+
+    def check_transfers(self, day):
+        """在后台检查该星期最近一次上课日相邻两节课之间是否来得及换教室，结果显示在课表上方"""
+        try:
+            day = int(day)
+        except (TypeError, ValueError):
+            day = None
+        if day is None or not 1 <= day <= 7:
+            print("无法识别星期，跳过换教室检查")
+            return
+        threading.Thread(target=self._check_transfers, args=(day,), daemon=True).start()
+
+    def _check_transfers(self, day):
+        try:
+            with self._transfer_lock:
+                if self._transfer_db is None:
+                    self._transfer_db = Database()
+                campus = campus_graph_module.get_campus_graph()
+                # 步行时间按轨迹学到的步速估算，每次检查前用新轨迹更新模型
+                speed_model = AlarmManager().walking_model(campus)
+                if self.planner is None:
+                    self.planner = itinerary_module.ItineraryPlanner(
+                        poi_store_module.POIStore(self._transfer_db), campus, speed_model=speed_model
+                    )
+                notes = itinerary_module.describe_conflicts(self.planner.plan_day(
+                    self._transfer_db, on_date=itinerary_module.next_date(day)))
+        except Exception as e:
+            print(f"换教室检查失败: {e}")
+            return
+
+        @mainthread
+        def update():
+            self.transfer_warning = "\n".join(notes)
+
+        update()
 
     def delete_course(self, course_name):
         """删除课程"""
@@ -168,20 +283,32 @@ class InfoScreen(Screen):
     news_list = ObjectProperty(None)
     contest_list = ObjectProperty(None)
 
+    @profiler.timed("screen.info")
     def __init__(self, **kwargs):
         super(InfoScreen, self).__init__(**kwargs)
         self.db = Database()
-        self.scraper = YulinScraper()
+        self.scraper = None
+        self._news_requested = False
         self.load_contests()
-        self.refresh_news()
+
+    def on_enter(self, *args):
+        """首次进入时才加载爬虫并获取新闻"""
+        if not self._news_requested:
+            self.refresh_news()
 
     def refresh_news(self):
         """刷新新闻"""
+        self._news_requested = True
         threading.Thread(target=self._fetch_news, daemon=True).start()
 
+    def _get_scraper(self):
+        if self.scraper is None:
+            self.scraper = scraper_module.YulinScraper()
+        return self.scraper
+
     def _fetch_news(self):
         """后台获取新闻"""
-        news = self.scraper.get_latest_news()
+        news = self._get_scraper().get_latest_news()
 
         @mainthread
         def update():
@@ -213,32 +340,90 @@ class MapScreen(Screen):
     current_location = StringProperty("正在获取位置...")
     destination = ObjectProperty(None)
     route_info = StringProperty("请输入目的地开始导航")
+    suggestions = StringProperty("")
 
+    @profiler.timed("screen.map")
     def __init__(self, **kwargs):
         super(MapScreen, self).__init__(**kwargs)
         self.alarm_manager = AlarmManager()
         self.db = Database()
-        self.campus_locations = self._get_campus_locations()
+        self.poi_store = None
+        # 目的地搜索索引（拼音、前缀树）在进入地图后于后台建立，建好前不显示联想
+        self.search_index = None
+        self._search_requested = False
+        self.tile_cache = None
+        self._tiles_opened = False
+        # 预取队列非空时才逐帧解码，队列清空后不再调度
+        self._prefetch_trigger = Clock.create_trigger(self._prefetch_tiles, 0)
         self.current_lat = 38.2850  # 榆林学院默认坐标
         self.current_lon = 109.7340
 
-    def _get_campus_locations(self):
-        """获取校园地点坐标"""
-        return {
-            "东门": {"lat": 38.2860, "lon": 109.7350, "building": "东门"},
-            "南门": {"lat": 38.2840, "lon": 109.7340, "building": "南门"},
-            "西门": {"lat": 38.2855, "lon": 109.7320, "building": "西门"},
-            "北门": {"lat": 38.2870, "lon": 109.7335, "building": "北门"},
-            "教学楼A": {"lat": 38.2855, "lon": 109.7345, "building": "教学楼A"},
-            "教学楼B": {"lat": 38.2858, "lon": 109.7348, "building": "教学楼B"},
-            "图书馆": {"lat": 38.2862, "lon": 109.7342, "building": "图书馆"},
-            "体育馆": {"lat": 38.2845, "lon": 109.7335, "building": "体育馆"},
-            "食堂": {"lat": 38.2852, "lon": 109.7338, "building": "食堂"},
-            "宿舍楼1": {"lat": 38.2848, "lon": 109.7352, "building": "宿舍楼1"},
-            "宿舍楼2": {"lat": 38.2846, "lon": 109.7355, "building": "宿舍楼2"},
-            "行政楼": {"lat": 38.2865, "lon": 109.7338, "building": "行政楼"},
-            "实验楼": {"lat": 38.2850, "lon": 109.7355, "building": "实验楼"},
-        }
+    def on_enter(self, *args):
+        """进入地图时刷新位置（首次进入才启动定位）"""
+        with profiler.phase("location.first_use"):
+            self.update_location()
+        self._prepare_search_index()
+
+    def on_leave(self, *args):
+        self._prefetch_trigger.cancel()
+
+    def _get_tile_cache(self):
+        """离线瓦片缓存，没有瓦片包时为 None"""
+        if not self._tiles_opened:
+            self._tiles_opened = True
+            self.tile_cache = tile_cache_module.open_tile_cache()
+        return self.tile_cache
+
+    def _prefetch_tiles(self, dt):
+        """在一帧的时间预算内解码预取队列中的瓦片，队列未清空时下一帧继续"""
+        if self.tile_cache is None or not self.tile_cache.pending:
+            return
+        self.tile_cache.prefetch_step()
+        if self.tile_cache.pending:
+            self._prefetch_trigger()
+
+    def _get_poi_store(self):
+        """校园地点（数据库 pois 表），首次使用时打开"""
+        if self.poi_store is None:
+            self.poi_store = poi_store_module.POIStore(self.db)
+        return self.poi_store
+
+    def _prepare_search_index(self):
+        """首次进入地图时在后台建立目的地搜索索引"""
+        if self._search_requested:
+            return
+        self._search_requested = True
+        store = self._get_poi_store()
+        threading.Thread(target=self._build_search_index, args=(store,), daemon=True).start()
+
+    def _build_search_index(self, store):
+        try:
+            search = store.search_index()
+        except Exception as e:
+            print(f"目的地搜索索引建立失败: {e}")
+            return
+
+        @mainthread
+        def ready():
+            self.search_index = search
+            # 索引建好前已经输入的内容补上联想
+            if self.destination is not None:
+                self.suggest_destinations(self.destination.text)
+
+        ready()
+
+    def suggest_destinations(self, text):
+        """输入目的地时给出联想（搜索索引建好前不显示）"""
+        if self.search_index is None or not text.strip():
+            self.suggestions = ""
+            return
+        names = [name for name, _ in self.search_index.search(text, limit=5)]
+        self.suggestions = "您要找的是不是: " + "、".join(names) if names else ""
+
+    def _nearest_place(self, lat, lon, kinds=None):
+        """离给定坐标最近的地点，返回 (名称, 距离米)"""
+        found = self._get_poi_store().nearest(lat, lon, kinds)
+        return (found[0][1]["name"], found[0][0]) if found else (None, None)
 
     def update_location(self):
         """更新当前位置"""
@@ -250,9 +435,15 @@ class MapScreen(Screen):
                 self.current_location = (
                     f"纬度: {location['lat']:.4f}, 经度: {location['lon']:.4f}"
                 )
+                name, dist = self._nearest_place(location["lat"], location["lon"])
+                if name:
+                    self.current_location += f"\n位于 {name} 附近（约 {dist:.0f} 米）"
 
             self.current_lat = location["lat"]
             self.current_lon = location["lon"]
+            tiles = self._get_tile_cache()
+            if tiles is not None and tiles.pan_to(self.current_lat, self.current_lon):
+                self._prefetch_trigger()
         else:
             self.current_location = "位置获取失败，使用默认位置（榆林学院）"
 
@@ -263,37 +454,48 @@ class MapScreen(Screen):
             self.route_info = "请输入目的地"
             return
 
-        # 查找目的地
-        dest = self.campus_locations.get(dest_name)
+        # 查找目的地；“最近的食堂”等按类型查找离当前位置最近的地点
+        store = self._get_poi_store()
+        dest = store.get(dest_name)
+        for prefix in ("最近的", "附近的"):
+            if not dest and dest_name.startswith(prefix):
+                name, _ = self._nearest_place(
+                    self.current_lat, self.current_lon, dest_name[len(prefix):]
+                )
+                if name:
+                    dest = store.get(name)
         if not dest:
-            # 尝试模糊匹配
-            for name, loc in self.campus_locations.items():
-                if dest_name in name or name in dest_name:
-                    dest = loc
-                    dest_name = name
-                    break
-
+            # 名称片段、拼音、首字母和错别字匹配
+            dest = store.resolve(dest_name)
         if dest:
-            # 计算距离（简化版，实际应使用真实算法）
-            import math
-
-            dist = (
-                math.sqrt(
-                    (self.current_lat - dest["lat"]) ** 2
-                    + (self.current_lon - dest["lon"]) ** 2
-                )
-                * 111
-            )  # 粗略转换为公里
+            dest_name = dest["name"]
 
-            # 简单路径规划
-            if dist < 0.5:
-                route = "步行约 {:.0f} 米".format(dist * 1000)
+        if dest:
+            # 沿校园路网规划步行路线（A*）
+            campus = campus_graph_module.get_campus_graph()
+            target = campus.node_for(dest)
+            # 预计时间按轨迹学到的个人步速和路段速度估算
+            speed_model = self.alarm_manager.walking_model(campus)
+            result = campus.route_from(
+                self.current_lat, self.current_lon, target, speed_model
+            )
+
+            dist = result["distance_m"]
+            if dist < 500:
+                route = "步行约 {:.0f} 米".format(dist)
             else:
-                route = "步行约 {:.1f} 公里".format(dist)
-
-            self.route_info = f"目的地: {dest_name}\n{route}\n预计时间: {int(dist * 1000 / 80)} 分钟 (步行)"
+                route = "步行约 {:.1f} 公里".format(dist / 1000)
+            steps = "\n".join(
+                f"{i}. {segment['instruction']}"
+                for i, segment in enumerate(result["segments"], 1)
+            )
+
+            self.route_info = (
+                f"目的地: {dest_name}\n{route}\n"
+                f"预计时间: {max(1, round(result['minutes']))} 分钟 (步行)\n{steps}"
+            )
         else:
-            self.route_info = f"未找到地点: {dest_name}\n请从以下地点选择: {', '.join(self.campus_locations.keys())}"
+            self.route_info = f"未找到地点: {dest_name}\n请从以下地点选择: {', '.join(store.names(limit=20))}"
 
 
 # ==================== 个人中心界面 ====================
@@ -302,7 +504,9 @@ class ProfileScreen(Screen):
 
     username = StringProperty("")
     notification_enabled = BooleanProperty(True)
+    semester_start = StringProperty("")
 
+    @profiler.timed("screen.profile")
     def __init__(self, **kwargs):
         super(ProfileScreen, self).__init__(**kwargs)
         self.db = Database()
@@ -316,6 +520,16 @@ class ProfileScreen(Screen):
             self.username = user
         notif = self.db.get_setting("notification_enabled")
         self.notification_enabled = notif != "False"
+        self.semester_start = self.db.get_setting("semester_start") or ""
+
+    def save_semester_start(self, text):
+        """设置开学日期（YYYY-MM-DD），周次和单双周规则随之生效"""
+        text = text.strip()
+        if text and parse_date(text) is None:
+            self.semester_start = self.db.get_setting("semester_start") or ""
+            return
+        self.semester_start = text
+        self.db.set_semester(text, self.db.get_setting("semester_skip_dates") or "")
 
     def on_switch_notification(self, instance, value):
         """开关通知"""
@@ -338,10 +552,28 @@ class YulinCampusApp(App):
 
     title = "榆林学院智慧校园"
 
+    @profiler.timed("app.init")
     def __init__(self, **kwargs):
         super(YulinCampusApp, self).__init__(**kwargs)
         self.db = Database()
         self.alarm_manager = AlarmManager()
+        # 轨迹保存在用户数据目录（应用目录在更新时会被替换）
+        self.alarm_manager.trace_path = os.path.join(self.user_data_dir, TRACE_FILE)
+        # 提醒引擎在后台线程使用独立的数据库连接
+        engine_db = Database()
+        self.reminder_engine = ReminderEngine(
+            engine_db,
+            AlarmSink(self.alarm_manager, engine_db),
+            triggers=[
+                # 按位置调整课程提醒：已在教室免打扰，离得远时提前提醒出发
+                CourseTrigger(
+                    engine_db,
+                    geofence_factory=lambda: geofence_module.CourseGeofences(engine_db, self.alarm_manager),
+                ),
+                ContestDeadlineTrigger(engine_db),
+                NoticeWatcher(engine_db),
+            ],
+        )
 
     def build(self):
         # 引用所有自定义Screen类，确保它们在KV文件加载前被注册
@@ -355,54 +587,33 @@ class YulinCampusApp(App):
             MyScreenManager,
         )
 
-        # 启动后台闹钟检查
-        Clock.schedule_interval(self.check_alarms, 60)  # 每分钟检查一次
-
-        # 加载UI
-        return Builder.load_file("yulin_campus.kv")
-
-    def check_alarms(self, dt):
-        """检查并触发闹钟"""
-        if not self.db.get_setting("notification_enabled"):
-            return
+        # 启动提醒引擎（课程提醒 + 竞赛截止提醒 + 新通知推送）
+        self.reminder_engine.start()
 
-        now = datetime.datetime.now()
-        current_time = now.strftime("%H:%M")
-        current_day = now.weekday() + 1  # 1-7 表示周一到周日
+        # 首帧绘制后输出启动耗时报告
+        Clock.schedule_once(self._on_first_frame, 0)
 
-        # 检查是否有课程需要提醒
-        courses = self.db.get_all_courses()
-        for course in courses:
-            course_name = course[1]
-            course_time = course[4]
-            course_day = course[5]
+        # 加载UI
+        with profiler.phase("build.kv"):
+            return Builder.load_file("yulin_campus.kv")
 
-            # 检查是否是同一天
-            if str(course_day) != str(current_day):
-                continue
+    def _on_first_frame(self, dt):
+        profiler.mark("first_frame")
+        print(profiler.report())
 
-            # 解析课程时间
-            try:
-                course_dt = datetime.datetime.strptime(course_time, "%H:%M")
-                reminder_dt = course_dt - datetime.timedelta(minutes=10)
-                reminder_time = reminder_dt.strftime("%H:%M")
-
-                if current_time == reminder_time:
-                    self.alarm_manager.send_notification(
-                        title="课程提醒",
-                        message=f"【{course_name}】将在10分钟后开始！",
-                        course_name=course_name,
-                    )
-            except:
-                continue
+    def on_stop(self):
+        """应用退出"""
+        self.reminder_engine.stop()
+        self.alarm_manager.save_trace()
 
     def on_pause(self):
-        """应用暂停时保持运行"""
+        """应用暂停时保持运行；先保存轨迹，暂停期间可能被系统结束"""
+        self.alarm_manager.save_trace()
         return True
 
     def on_resume(self):
-        """应用恢复"""
-        pass
+        """应用恢复：补发暂停期间错过的提醒"""
+        self.reminder_engine.wake()
 
 
 # ==================== 程序入口 ====================
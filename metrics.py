@@ -0,0 +1,122 @@
+"""
+性能指标模块
+进程内指标注册表：计数器、耗时统计和最近事件，可导出为JSON
+"""
+
+import json
+import threading
+import time
+from collections import deque
+
+# 每类事件保留的最近记录数
+MAX_EVENTS = 200
+
+
+class TimerStat:
+    """耗时统计（毫秒）"""
+
+    __slots__ = ('count', 'total', 'min', 'max', 'last')
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+        self.last = None
+
+    def add(self, ms):
+        self.count += 1
+        self.total += ms
+        self.last = ms
+        self.min = ms if self.min is None else min(self.min, ms)
+        self.max = ms if self.max is None else max(self.max, ms)
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'avg_ms': round(self.total / self.count, 3) if self.count else 0,
+            'min_ms': round(self.min, 3) if self.min is not None else None,
+            'max_ms': round(self.max, 3) if self.max is not None else None,
+            'last_ms': round(self.last, 3) if self.last is not None else None,
+        }
+
+
+class MetricsRegistry:
+    """指标注册表（线程安全）"""
+
+    def __init__(self, max_events=MAX_EVENTS):
+        self._lock = threading.Lock()
+        self._max_events = max_events
+        self.counters = {}
+        self.timers = {}
+        self.events = {}
+
+    def incr(self, name, value=1):
+        """计数器累加"""
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + value
+
+    def observe(self, name, ms):
+        """记录一次耗时（毫秒）"""
+        with self._lock:
+            stat = self.timers.get(name)
+            if stat is None:
+                stat = self.timers[name] = TimerStat()
+            stat.add(ms)
+
+    def timer(self, name):
+        """耗时统计上下文管理器"""
+        return _Timer(self, name)
+
+    def record(self, name, **fields):
+        """记录一条结构化事件"""
+        fields.setdefault('ts', round(time.time(), 3))
+        with self._lock:
+            events = self.events.get(name)
+            if events is None:
+                events = self.events[name] = deque(maxlen=self._max_events)
+            events.append(fields)
+
+    def snapshot(self):
+        """导出当前所有指标"""
+        with self._lock:
+            return {
+                'counters': dict(self.counters),
+                'timers': {name: stat.to_dict() for name, stat in self.timers.items()},
+                'events': {name: list(events) for name, events in self.events.items()},
+            }
+
+    def dump_json(self, path=None, indent=2):
+        """导出为JSON字符串，指定 path 时同时写入文件"""
+        text = json.dumps(self.snapshot(), ensure_ascii=False, indent=indent)
+        if path:
+            with open(path, 'w', encoding='utf-8') as f:
+                f.write(text)
+        return text
+
+    def reset(self):
+        """清空所有指标"""
+        with self._lock:
+            self.counters.clear()
+            self.timers.clear()
+            self.events.clear()
+
+
+class _Timer:
+    def __init__(self, registry, name):
+        self.registry = registry
+        self.name = name
+        self.ms = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.ms = (time.perf_counter() - self._start) * 1000
+        self.registry.observe(self.name, self.ms)
+        return False
+
+
+# 全局指标注册表
+registry = MetricsRegistry()
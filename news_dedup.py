@@ -0,0 +1,177 @@
+"""
+资讯去重模块
+基于SimHash指纹识别不同站点转载、标题略有改动的重复新闻和通知
+"""
+
+import hashlib
+import re
+from functools import lru_cache
+
+# 指纹位数与分段数：海明距离 <= BANDS-1 的两个指纹至少有一段完全相同
+# 新闻标题较短，年份、学期、批次等只差一两个字的不同通知距离也只有4~6，因此阈值取3，
+# 并且数字不同的标题不合并
+FINGERPRINT_BITS = 64
+BANDS = 8
+MAX_DISTANCE = 3
+
+# 标题中不参与比较的修饰词，如 【转载】、(图)、“转发” 等
+_NOISE_RE = re.compile(r'[【\[（(][^】\]）)]{0,6}[】\]）)]|转发|转载')
+_PUNCT_RE = re.compile(r'[\W_]+', re.UNICODE)
+# 年份、学期、批次等编号：阿拉伯数字和“第X”
+_NUMBER_RE = re.compile(r'\d+|第[零〇一二三四五六七八九十百千两]+')
+
+
+def normalize_title(title):
+    """标题归一化：去掉修饰词、标点和空白"""
+    title = _NOISE_RE.sub('', title)
+    return _PUNCT_RE.sub('', title).lower()
+
+
+def number_tokens(title):
+    """标题中的编号（按出现顺序），编号不同的标题即使文字相近也是不同的条目"""
+    return tuple(_NUMBER_RE.findall(title))
+
+
+@lru_cache(maxsize=8192)
+def _token_hash(token):
+    """单个特征的64位哈希"""
+    return int.from_bytes(hashlib.blake2b(token.encode('utf-8'), digest_size=8).digest(), 'big')
+
+
+def _shingles(text):
+    """字符2-gram特征（中文标题不分词）"""
+    if len(text) < 2:
+        return [text] if text else []
+    return [text[i:i + 2] for i in range(len(text) - 1)]
+
+
+def simhash(text):
+    """计算文本的64位SimHash指纹"""
+    weights = [0] * FINGERPRINT_BITS
+    for token in _shingles(normalize_title(text)):
+        h = _token_hash(token)
+        for bit in range(FINGERPRINT_BITS):
+            weights[bit] += 1 if (h >> bit) & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a, b):
+    """两个指纹的海明距离"""
+    return bin(a ^ b).count('1')
+
+
+class SimHashIndex:
+    """分段倒排索引：按段查候选，避免与全部指纹逐一比较"""
+
+    def __init__(self, bands=BANDS, max_distance=MAX_DISTANCE):
+        self.bands = bands
+        self.max_distance = max_distance
+        self.band_bits = FINGERPRINT_BITS // bands
+        self.band_mask = (1 << self.band_bits) - 1
+        self.tables = [{} for _ in range(bands)]
+        self.fingerprints = {}
+        self.numbers = {}
+
+    def _band_keys(self, fingerprint):
+        return [(fingerprint >> (i * self.band_bits)) & self.band_mask
+                for i in range(self.bands)]
+
+    def add(self, key, fingerprint, numbers=()):
+        """加入指纹，numbers 为标题中的编号（number_tokens）"""
+        self.fingerprints[key] = fingerprint
+        self.numbers[key] = numbers
+        for table, band in zip(self.tables, self._band_keys(fingerprint)):
+            table.setdefault(band, []).append(key)
+
+    def query(self, fingerprint, numbers=()):
+        """查找编号相同且最相近的已有条目，返回 (key, 距离)，没有则返回 (None, None)"""
+        best_key, best_distance = None, None
+        checked = set()
+        for table, band in zip(self.tables, self._band_keys(fingerprint)):
+            for key in table.get(band, ()):
+                if key in checked:
+                    continue
+                checked.add(key)
+                if self.numbers[key] != numbers:
+                    continue
+                distance = hamming_distance(fingerprint, self.fingerprints[key])
+                if distance <= self.max_distance and (best_distance is None or distance < best_distance):
+                    best_key, best_distance = key, distance
+        return best_key, best_distance
+
+    def __len__(self):
+        return len(self.fingerprints)
+
+
+def dedupe_items(items, max_distance=MAX_DISTANCE):
+    """将近似重复的条目聚合为一条
+
+    保留最先出现的条目作为代表，并在其 'sources' 中记录所有来源，
+    'kinds' 中记录所有类别（新闻/通知），'duplicates' 中记录被合并条目的标题和链接。
+    """
+    index = SimHashIndex(max_distance=max_distance)
+    clusters = []
+
+    for item in items:
+        fingerprint = item.get('simhash')
+        if fingerprint is None:
+            fingerprint = simhash(item['title'])
+        numbers = number_tokens(item['title'])
+        key, _ = index.query(fingerprint, numbers)
+
+        if key is None:
+            entry = dict(item)
+            entry['simhash'] = fingerprint
+            entry['sources'] = [item.get('source', '')]
+            entry['kinds'] = [item['kind']] if item.get('kind') else []
+            entry['duplicates'] = []
+            index.add(len(clusters), fingerprint, numbers)
+            clusters.append(entry)
+            continue
+
+        entry = clusters[key]
+        source = item.get('source', '')
+        if source not in entry['sources']:
+            entry['sources'].append(source)
+        if item.get('kind') and item['kind'] not in entry['kinds']:
+            entry['kinds'].append(item['kind'])
+        entry['duplicates'].append({
+            'title': item['title'],
+            'url': item.get('url', ''),
+            'source': source,
+        })
+        # 任一副本是重要通知，则整条视为重要
+        entry['important'] = entry.get('important', False) or item.get('important', False)
+
+    return clusters
+
+
+# 测试代码
+if __name__ == '__main__':
+    titles = [
+        '关于2024年清明节放假的通知',
+        '【转发】关于2024年清明节放假的通知',
+        '关于2024年清明节放假安排的通知',
+        '2024年上半年全国计算机等级考试报名通知',
+        '榆林学院举办2024年春季运动会',
+        '2024-2025学年第一学期期末考试安排',
+        '2024-2025学年第二学期期末考试安排',
+        '关于公布2024年大学生创新创业训练计划立项名单的通知',
+        '关于公布2023年大学生创新创业训练计划立项名单的通知',
+    ]
+    for t in titles:
+        print(f"{simhash(t):016x}  {t}")
+
+    merged = dedupe_items([{'title': t, 'source': f'来源{i}'} for i, t in enumerate(titles)])
+    print(f"\n{len(titles)} 条 -> {len(merged)} 条")
+    for m in merged:
+        print(m['title'], m['sources'])
+
+    # 只有批次编号不同的通知不应合并
+    batches = [{'title': f'关于2024年第{i}批学生活动安排的通知'} for i in range(1, 21)]
+    print(f"\n编号不同的 {len(batches)} 条通知 -> {len(dedupe_items(batches))} 条")
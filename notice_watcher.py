@@ -0,0 +1,185 @@
+"""
+新通知推送模块
+定期在后台抓取通知，按链接和标题与已读记录比对，只对新出现的重要通知发送提醒
+"""
+
+import datetime
+import hashlib
+import threading
+from collections import deque
+
+from news_dedup import SimHashIndex, number_tokens, simhash
+from reminder_engine import ReminderTrigger
+
+# 默认检查间隔（秒）
+CHECK_INTERVAL = 5 * 60
+
+# 启动后首次检查的延迟（秒）：不在启动时导入爬虫、抓取各站点，与首帧绘制争抢资源
+FIRST_CHECK_DELAY = 60
+
+# 一次出现超过该数量的新通知时合并为一条汇总提醒
+BATCH_THRESHOLD = 3
+
+# 汇总提醒中列出的标题数
+SUMMARY_TITLES = 3
+
+# 已读记录保留天数：超过该天数没有再出现在列表中的通知记录会被清理
+KEEP_DAYS = 180
+
+# 已读键前缀；旧版本按SimHash指纹记录的已读数据不再使用
+SEEN_PREFIX = 'u:'
+
+
+def notice_key(url, title):
+    """通知的已读键：链接 + 标题（没有链接的条目地址都是列表页，需要标题区分）"""
+    digest = hashlib.sha1(f'{url}\n{title}'.encode('utf-8')).hexdigest()[:16]
+    return f'{SEEN_PREFIX}{digest}'
+
+
+def _notice_keys(notice):
+    """聚合条目及其各站点副本的已读键"""
+    pairs = [(notice.get('url', ''), notice['title'])]
+    pairs += [(d.get('url', ''), d['title']) for d in notice.get('duplicates', ())]
+    return [(notice_key(url, title), title) for url, title in pairs]
+
+
+class NoticeWatcher(ReminderTrigger):
+    """新通知监视器（提醒引擎触发器）
+
+    抓取在单独的线程中进行，不占用提醒引擎线程；抓取完成后唤醒引擎，
+    由引擎线程比对已读记录（数据库连接只在引擎线程使用）。
+    """
+
+    category = 'notice'
+
+    def __init__(self, database, scraper=None, interval=CHECK_INTERVAL, first_delay=FIRST_CHECK_DELAY):
+        self.db = database
+        self.scraper = scraper
+        self.interval = datetime.timedelta(seconds=interval)
+        self.first_delay = datetime.timedelta(seconds=first_delay)
+        self.engine = None
+        self.last_run = None
+        self._first_check = None
+        self._seen = None
+        self._results = deque()   # 抓取线程交给引擎的结果
+        self._fetching = None     # 正在运行的抓取线程
+
+    def _get_scraper(self):
+        """首次检查时才创建爬虫"""
+        if self.scraper is None:
+            from scraper import YulinScraper
+            self.scraper = YulinScraper()
+        return self.scraper
+
+    def _load_seen(self):
+        """从数据库载入已读键（先清理过期记录），只在首次检查时读取一次"""
+        if self._seen is None:
+            self.db.prune_seen_notices(KEEP_DAYS)
+            self._seen = {key for key in self.db.get_seen_notices() if key.startswith(SEEN_PREFIX)}
+        return self._seen
+
+    def _next_check(self, now):
+        if self.last_run is not None:
+            return self.last_run + self.interval
+        if self._first_check is None:
+            self._first_check = now + self.first_delay
+        return self._first_check
+
+    def next_fire_time(self, now):
+        if self._results:
+            return now
+        return self._next_check(now)
+
+    def collect(self, now):
+        reminders = []
+        while self._results:
+            notices = self._results.popleft()
+            reminders.extend(self.to_reminders([n for n in self.diff(notices) if n.get('important')]))
+
+        if now >= self._next_check(now):
+            if self.last_run is not None and self.last_run.date() != now.date():
+                # 每天重新载入一次，使清理过期记录生效
+                self._seen = None
+            self.last_run = now
+            self.fetch_async()
+        return reminders
+
+    def fetch_async(self):
+        """在后台线程抓取通知，已有抓取任务时不重复发起"""
+        if self._fetching is not None and self._fetching.is_alive():
+            return self._fetching
+        self._fetching = threading.Thread(target=self._fetch, daemon=True)
+        self._fetching.start()
+        return self._fetching
+
+    def _fetch(self):
+        try:
+            notices = self._get_scraper().fetch_all(kind='notice')
+        except Exception as e:
+            print(f"通知抓取失败: {e}")
+            return
+        # 所有站点都抓取失败时没有结果：既不比对也不更新已读基线
+        if notices:
+            self._results.append(notices)
+            if self.engine:
+                self.engine.wake()
+
+    def diff(self, notices):
+        """返回尚未见过的通知，并把本次列表中的通知全部记为已读
+
+        已读按链接和标题判断，标题与往年通知相近的新通知仍会推送；
+        同一批中近似重复的条目只推送一条。
+        """
+        seen = self._load_seen()
+        first_run = not seen
+        batch = SimHashIndex()
+        fresh = []
+        records = []
+
+        for notice in notices:
+            keys = _notice_keys(notice)
+            is_new = not any(key in seen for key, _ in keys)
+            records.extend(keys)
+            seen.update(key for key, _ in keys)
+            if not is_new:
+                continue
+            fingerprint = notice.get('simhash')
+            if fingerprint is None:
+                fingerprint = simhash(notice['title'])
+            numbers = number_tokens(notice['title'])
+            if batch.query(fingerprint, numbers)[0] is not None:
+                continue
+            batch.add(len(fresh), fingerprint, numbers)
+            fresh.append(notice)
+
+        if records:
+            self.db.add_seen_notices(records)
+
+        # 首次运行只建立已读基线，不推送历史通知
+        return [] if first_run else fresh
+
+    def check_now(self):
+        """立即（同步）抓取一次，返回新出现的重要通知"""
+        notices = self._get_scraper().fetch_all(kind='notice')
+        if not notices:
+            return []
+        return [n for n in self.diff(notices) if n.get('important')]
+
+    def to_reminders(self, notices):
+        """转换为提醒：数量较多时合并为一条汇总"""
+        if len(notices) > BATCH_THRESHOLD:
+            lines = [f"· {n['title']}" for n in notices[:SUMMARY_TITLES]]
+            lines.append(f"等共 {len(notices)} 条，请在资讯页查看")
+            return [{
+                'key': None,
+                'category': self.category,
+                'title': "新通知 📢",
+                'message': "\n".join(lines),
+            }]
+
+        return [{
+            'key': f"notice:{_notice_keys(n)[0][0]}",
+            'category': self.category,
+            'title': "新通知 📢",
+            'message': n['title'],
+        } for n in notices]
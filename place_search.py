@@ -0,0 +1,207 @@
+"""
+地点搜索模块
+目的地输入联想：名称/别名前缀树、拼音全拼和首字母、名称片段，以及有限编辑距离的容错匹配
+"""
+
+import time
+
+try:
+    from pypinyin import Style, lazy_pinyin
+
+    PYPINYIN_AVAILABLE = True
+except ImportError:
+    PYPINYIN_AVAILABLE = False
+
+# 每次联想的时间预算（毫秒），约为一帧
+FRAME_BUDGET_MS = 8.0
+
+# 前缀树每个节点缓存的候选条数
+NODE_CAPACITY = 16
+
+# 匹配类型得分（越小越靠前）
+SCORE_EXACT = 0
+SCORE_PREFIX = 1
+SCORE_PINYIN = 2
+SCORE_FRAGMENT = 3
+SCORE_FUZZY = 4
+
+# 未安装 pypinyin 时使用的校园常用字拼音
+_FALLBACK_PINYIN = {
+    '东': 'dong', '南': 'nan', '西': 'xi', '北': 'bei', '门': 'men', '教': 'jiao', '学': 'xue',
+    '楼': 'lou', '图': 'tu', '书': 'shu', '馆': 'guan', '体': 'ti', '育': 'yu', '食': 'shi',
+    '堂': 'tang', '宿': 'su', '舍': 'she', '行': 'xing', '政': 'zheng', '实': 'shi', '验': 'yan',
+    '操': 'cao', '场': 'chang', '医': 'yi', '院': 'yuan', '校': 'xiao', '超': 'chao', '市': 'shi',
+    '卫': 'wei', '生': 'sheng', '间': 'jian', '办': 'ban', '公': 'gong', '室': 'shi', '会': 'hui',
+    '议': 'yi', '中': 'zhong', '心': 'xin', '礼': 'li', '报': 'bao', '告': 'gao', '厅': 'ting',
+    '快': 'kuai', '递': 'di', '浴': 'yu', '打': 'da', '印': 'yin', '店': 'dian', '机': 'ji',
+    '房': 'fang', '信': 'xin', '息': 'xi', '工': 'gong', '程': 'cheng', '理': 'li', '文': 'wen',
+    '化': 'hua', '艺': 'yi', '术': 'shu', '音': 'yin', '乐': 'yue', '美': 'mei', '外': 'wai',
+    '语': 'yu', '数': 'shu', '能': 'neng', '源': 'yuan', '管': 'guan', '经': 'jing', '济': 'ji',
+    '一': 'yi', '二': 'er', '三': 'san', '四': 'si', '五': 'wu', '六': 'liu', '号': 'hao',
+}
+
+
+def to_pinyin(text):
+    """逐字拼音列表，非汉字原样保留（小写）"""
+    if PYPINYIN_AVAILABLE:
+        return [p.lower() for p in lazy_pinyin(text, style=Style.NORMAL)]
+    return [_FALLBACK_PINYIN.get(ch, ch.lower()) for ch in text]
+
+
+def pinyin_keys(text):
+    """全拼和首字母两种检索键，如 图书馆 -> tushuguan、tsg"""
+    syllables = [s for s in to_pinyin(text) if s.strip()]
+    return ''.join(syllables), ''.join(s[0] for s in syllables)
+
+
+def normalize(text):
+    return ''.join(str(text).lower().split())
+
+
+class _TrieNode:
+    __slots__ = ('children', 'entries')
+
+    def __init__(self):
+        self.children = {}
+        self.entries = []   # [(得分, 键长, 条目序号)]，最多 NODE_CAPACITY 条
+
+
+class PlaceSearchIndex:
+    """目的地搜索索引"""
+
+    def __init__(self):
+        self.root = _TrieNode()
+        self.names = []      # 条目序号 -> 名称
+        self.payloads = []   # 条目序号 -> 附加数据
+        self.exact = {}      # 归一化名称/别名 -> 条目序号
+
+    def __len__(self):
+        return len(self.names)
+
+    def add(self, name, payload=None, aliases=()):
+        """添加地点及其别名"""
+        entry = len(self.names)
+        self.names.append(name)
+        self.payloads.append(payload)
+
+        for label in (name, *aliases):
+            key = normalize(label)
+            if not key:
+                continue
+            self.exact.setdefault(key, entry)
+            self._insert(key, entry, SCORE_PREFIX)
+            full, initials = pinyin_keys(key)
+            if full != key:
+                self._insert(full, entry, SCORE_PINYIN)
+                self._insert(initials, entry, SCORE_PINYIN)
+            # 名称片段：输入“楼A”也能找到“教学楼A”
+            for i in range(1, len(key)):
+                self._insert(key[i:], entry, SCORE_FRAGMENT)
+        return entry
+
+    def _insert(self, key, entry, score):
+        node = self.root
+        record = (score, len(key), entry)
+        for ch in key:
+            node = node.children.setdefault(ch, _TrieNode())
+            entries = node.entries
+            if any(e == entry for _, _, e in entries):
+                # 同一条目只保留得分最好的记录
+                for i, existing in enumerate(entries):
+                    if existing[2] == entry and record < existing:
+                        entries[i] = record
+                        entries.sort()
+                continue
+            if len(entries) < NODE_CAPACITY:
+                entries.append(record)
+                entries.sort()
+            elif record < entries[-1]:
+                entries[-1] = record
+                entries.sort()
+
+    def _prefix(self, key):
+        node = self.root
+        for ch in key:
+            node = node.children.get(ch)
+            if node is None:
+                return None
+        return node
+
+    def _fuzzy(self, key, max_edits, deadline):
+        """在前缀树上做有限编辑距离匹配，返回 {条目序号: 编辑距离}
+
+        每到一个节点计算一行编辑距离，整行最小值超过上限时剪掉整棵子树。
+        """
+        found = {}
+        first_row = list(range(len(key) + 1))
+        stack = [(child, ch, first_row) for ch, child in self.root.children.items()]
+        while stack:
+            if time.perf_counter() > deadline:
+                break
+            node, ch, previous = stack.pop()
+            row = [previous[0] + 1]
+            for i in range(1, len(key) + 1):
+                cost = 0 if key[i - 1] == ch else 1
+                row.append(min(row[i - 1] + 1, previous[i] + 1, previous[i - 1] + cost))
+            if row[-1] <= max_edits:
+                for _, _, entry in node.entries:
+                    if found.get(entry, max_edits + 1) > row[-1]:
+                        found[entry] = row[-1]
+            if min(row) <= max_edits:
+                stack.extend((child, c, row) for c, child in node.children.items())
+        return found
+
+    def search(self, query, limit=8, budget_ms=FRAME_BUDGET_MS):
+        """按输入返回联想结果 [(名称, 附加数据)]，按匹配质量排序"""
+        key = normalize(query)
+        if not key:
+            return []
+        deadline = time.perf_counter() + budget_ms / 1000
+        ranked = {}
+
+        def offer(entry, score):
+            if score < ranked.get(entry, (SCORE_FUZZY + 1,))[0]:
+                ranked[entry] = (score, len(self.names[entry]), entry)
+
+        if key in self.exact:
+            offer(self.exact[key], SCORE_EXACT)
+
+        node = self._prefix(key)
+        if node is not None:
+            for score, _, entry in node.entries:
+                offer(entry, score)
+
+        if len(ranked) < limit and len(key) >= 2:
+            # 短输入允许1处错误，较长输入允许2处
+            max_edits = 1 if len(key) <= 4 else 2
+            for entry, edits in self._fuzzy(key, max_edits, deadline).items():
+                offer(entry, SCORE_FUZZY + edits / 10)
+
+        results = sorted(ranked.values())[:limit]
+        return [(self.names[entry], self.payloads[entry]) for _, _, entry in results]
+
+    def resolve(self, query):
+        """把输入解析为一个地点，返回 (名称, 附加数据)；找不到时返回 (None, None)"""
+        results = self.search(query, limit=1)
+        return results[0] if results else (None, None)
+
+
+# 测试代码
+if __name__ == '__main__':
+    import random
+
+    index = PlaceSearchIndex()
+    for name in ["图书馆", "教学楼A", "教学楼B", "食堂", "体育馆", "行政楼", "实验楼", "东门", "南门"]:
+        index.add(name, aliases=("图书馆总馆",) if name == "图书馆" else ())
+
+    random.seed(3)
+    buildings = ["教学楼A", "教学楼B", "实验楼", "行政楼", "图书馆"]
+    for i in range(5000):
+        index.add(f"{random.choice(buildings)}{random.randint(1, 6)}{i % 100:02d}室")
+
+    print(f"拼音库: {'pypinyin' if PYPINYIN_AVAILABLE else '内置常用字'}，条目 {len(index)} 个")
+    for query in ["tsg", "tushu", "楼A", "教学楼", "实验搂", "shitang", "tiyuguan", "东"]:
+        start = time.perf_counter()
+        results = index.search(query, limit=5)
+        ms = (time.perf_counter() - start) * 1000
+        print(f"{query!r:>12} ({ms:.2f} ms): {[name for name, _ in results]}")
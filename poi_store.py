@@ -0,0 +1,269 @@
+"""
+校园地点模块
+地点数据保存在数据库 pois 表中，可从GeoJSON批量导入；
+按分区懒加载到内存，并建立空间索引和搜索索引供地图、导航使用
+"""
+
+import json
+import math
+import threading
+
+from place_search import PlaceSearchIndex
+from spatial_index import LocalProjection, SpatialIndex
+
+# 分区边长（米）：地图只加载当前位置附近的分区
+AREA_SIZE_M = 200.0
+
+# 查找最近地点时向外扩展的最大分区圈数
+MAX_AREA_RINGS = 10
+
+# 内置数据版本：修改 DEFAULT_POIS 后递增，已安装的应用会重新导入
+DEFAULT_VERSION = 1
+
+# 内置地点：名称 -> (类型, 纬度, 经度, 别名)
+DEFAULT_POIS = {
+    "东门": ("校门", 38.2860, 109.7350, ()),
+    "南门": ("校门", 38.2840, 109.7340, ("正门",)),
+    "西门": ("校门", 38.2855, 109.7320, ()),
+    "北门": ("校门", 38.2870, 109.7335, ()),
+    "教学楼A": ("教学楼", 38.2855, 109.7345, ("A楼",)),
+    "教学楼B": ("教学楼", 38.2858, 109.7348, ("B楼",)),
+    "图书馆": ("图书馆", 38.2862, 109.7342, ()),
+    "体育馆": ("体育馆", 38.2845, 109.7335, ()),
+    "食堂": ("食堂", 38.2852, 109.7338, ("餐厅",)),
+    "宿舍楼1": ("宿舍", 38.2848, 109.7352, ()),
+    "宿舍楼2": ("宿舍", 38.2846, 109.7355, ()),
+    "行政楼": ("行政楼", 38.2865, 109.7338, ()),
+    "实验楼": ("实验楼", 38.2850, 109.7355, ()),
+}
+
+_projection = LocalProjection()
+
+
+def _area_cell(lat, lon):
+    x, y = _projection.project(lat, lon)
+    return int(math.floor(x / AREA_SIZE_M)), int(math.floor(y / AREA_SIZE_M))
+
+
+def _area_key(ax, ay):
+    return f'{ax}:{ay}'
+
+
+def area_of(lat, lon):
+    """坐标所在分区的编号"""
+    return _area_key(*_area_cell(lat, lon))
+
+
+def make_record(name, kind, lat, lon, building=None, aliases=(), properties=None):
+    """构造导入数据库的地点记录"""
+    return (
+        name,
+        kind,
+        building or name,
+        float(lat),
+        float(lon),
+        area_of(lat, lon),
+        ','.join(aliases),
+        json.dumps(properties or {}, ensure_ascii=False),
+    )
+
+
+def default_records():
+    return [make_record(name, kind, lat, lon, aliases=aliases)
+            for name, (kind, lat, lon, aliases) in DEFAULT_POIS.items()]
+
+
+def load_geojson(path):
+    """读取GeoJSON中的点要素，返回地点记录列表
+
+    要素属性 name 必填，kind、building、aliases（列表或逗号分隔）可选，
+    其余属性原样保存在 properties 中。
+    """
+    with open(path, 'r', encoding='utf-8') as f:
+        data = json.load(f)
+
+    records = []
+    for feature in data.get('features', []):
+        geometry = feature.get('geometry') or {}
+        props = dict(feature.get('properties') or {})
+        name = props.pop('name', None)
+        if geometry.get('type') != 'Point' or not name:
+            continue
+        lon, lat = geometry['coordinates'][:2]
+        aliases = props.pop('aliases', ())
+        if isinstance(aliases, str):
+            aliases = [a for a in aliases.split(',') if a]
+        records.append(make_record(name, props.pop('kind', '地点'), lat, lon,
+                                   props.pop('building', None), aliases, props))
+    return records
+
+
+def _row_to_poi(row):
+    return {
+        'id': row['id'],
+        'name': row['name'],
+        'kind': row['kind'],
+        'building': row['building'],
+        'lat': row['lat'],
+        'lon': row['lon'],
+        'area': row['area'],
+        'aliases': [a for a in (row['aliases'] or '').split(',') if a],
+        'properties': json.loads(row['properties'] or '{}'),
+    }
+
+
+class POIStore:
+    """校园地点缓存
+
+    地点按分区从数据库懒加载，已加载的地点进入空间索引；
+    搜索索引只读取名称和别名，首次搜索时构建。
+    """
+
+    def __init__(self, db):
+        self.db = db
+        self._lock = threading.RLock()
+        self.ensure_seeded()
+        self._reset()
+
+    def _reset(self):
+        self.version = self.db.get_poi_version()
+        self._areas = set(self.db.get_poi_areas())
+        self._loaded_areas = set()
+        self._by_name = {}
+        self._index = SpatialIndex(_projection)
+        self._search = None
+
+    def ensure_seeded(self):
+        """首次运行或内置数据更新时写入内置地点"""
+        if self.db.get_poi_version() < DEFAULT_VERSION:
+            self.db.import_pois(default_records(), DEFAULT_VERSION)
+
+    # ---------- 导入 ----------
+    def import_records(self, records, version=None):
+        """批量导入地点记录，版本号默认在当前版本上加一，导入后清空缓存"""
+        with self._lock:
+            version = self.version + 1 if version is None else version
+            self.db.import_pois(records, version)
+            self._reset()
+        return len(records)
+
+    def import_geojson(self, path, version=None):
+        return self.import_records(load_geojson(path), version)
+
+    # ---------- 加载 ----------
+    def _load_areas(self, areas):
+        with self._lock:
+            missing = [a for a in areas if a in self._areas and a not in self._loaded_areas]
+            if not missing:
+                return
+            for row in self.db.get_pois_by_area(missing):
+                self._remember(_row_to_poi(row))
+            self._loaded_areas.update(missing)
+
+    def _remember(self, poi):
+        if poi['name'] not in self._by_name:
+            self._by_name[poi['name']] = poi
+            self._index.add(poi, poi['kind'])
+
+    def _load_ring(self, ax, ay, r):
+        if r == 0:
+            cells = [(ax, ay)]
+        else:
+            cells = [(ax + dx, ay + dy) for dx in range(-r, r + 1) for dy in (-r, r)]
+            cells += [(ax + dx, ay + dy) for dx in (-r, r) for dy in range(-r + 1, r)]
+        self._load_areas(_area_key(*cell) for cell in cells)
+
+    def load_around(self, lat, lon, radius):
+        """加载覆盖 (lat, lon) 周围 radius 米的分区"""
+        ax, ay = _area_cell(lat, lon)
+        rings = int(math.ceil(radius / AREA_SIZE_M))
+        for r in range(rings + 1):
+            self._load_ring(ax, ay, r)
+
+    # ---------- 查询 ----------
+    def get(self, name):
+        """按名称获取地点，未加载时连同所在分区一起加载"""
+        with self._lock:
+            poi = self._by_name.get(name)
+            if poi is None:
+                row = self.db.get_poi(name)
+                if row is None:
+                    return None
+                self._load_areas([row['area']])
+                poi = self._by_name.get(name) or _row_to_poi(row)
+            return poi
+
+    def nearby(self, lat, lon, radius, kinds=None):
+        """半径内的地点，返回 [(距离米, 地点)]"""
+        self.load_around(lat, lon, radius)
+        return self._index.within(lat, lon, radius, kinds)
+
+    def nearest(self, lat, lon, kinds=None, k=1):
+        """最近的 k 个地点，按分区逐圈加载直到结果不会再变化"""
+        ax, ay = _area_cell(lat, lon)
+        found = []
+        for r in range(MAX_AREA_RINGS + 1):
+            self._load_ring(ax, ay, r)
+            found = self._index.k_nearest(lat, lon, k, kinds)
+            # 第 r 圈以外的分区距离至少 r 个分区边长
+            if len(found) >= k and found[-1][0] <= r * AREA_SIZE_M * 0.99:
+                break
+        return found
+
+    def search_index(self):
+        """目的地搜索索引（名称、别名、类型），附加数据为地点名称
+
+        只在读取地点名称时持有锁，建立拼音和前缀索引较慢，期间其他查询不必等待。
+        """
+        with self._lock:
+            if self._search is not None:
+                return self._search
+            version = self.version
+            rows = self.db.get_poi_names()
+        search = PlaceSearchIndex()
+        for row in rows:
+            aliases = [a for a in (row['aliases'] or '').split(',') if a]
+            if row['kind']:
+                aliases.append(row['kind'])
+            search.add(row['name'], row['name'], aliases=aliases)
+        with self._lock:
+            # 建立期间地点数据被重新导入时，本次结果只返回给调用方，不再缓存
+            if self._search is None and self.version == version:
+                self._search = search
+        return search
+
+    def resolve(self, query):
+        """把输入解析为地点，找不到时返回 None"""
+        name, _ = self.search_index().resolve(query)
+        return self.get(name) if name else None
+
+    def names(self, limit=None):
+        names = self.search_index().names
+        return names[:limit] if limit else list(names)
+
+
+# 测试代码
+if __name__ == '__main__':
+    import random
+    import time
+
+    from database import Database
+
+    store = POIStore(Database())
+    print(f"地点数据版本 {store.version}，分区 {len(store._areas)} 个")
+    print("最近的食堂:", [(round(d), p['name']) for d, p in store.nearest(38.2850, 109.7340, '食堂')])
+    print("200米内:", [p['name'] for _, p in store.nearby(38.2855, 109.7345, 200)])
+    print("tsg ->", store.resolve('tsg')['name'])
+
+    # 模拟导入全校教室
+    random.seed(5)
+    rooms = [make_record(f"{b}{floor}{n:02d}室", '教室', lat + random.uniform(-2e-4, 2e-4),
+                         lon + random.uniform(-2e-4, 2e-4), building=b)
+             for b, (_, lat, lon, _) in DEFAULT_POIS.items() if b.startswith(('教学楼', '实验楼'))
+             for floor in range(1, 7) for n in range(1, 41)]
+    start = time.perf_counter()
+    store.import_records(default_records() + rooms)
+    print(f"导入 {len(rooms)} 间教室: {(time.perf_counter() - start) * 1000:.1f} ms，版本 {store.version}")
+    start = time.perf_counter()
+    print("最近的教室:", store.nearest(38.2856, 109.7346, '教室')[0][1]['name'],
+          f"({(time.perf_counter() - start) * 1000:.2f} ms，已加载分区 {len(store._loaded_areas)})")
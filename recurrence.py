@@ -0,0 +1,127 @@
+"""
+课程重复规则模块
+解析“1-16周”、单双周、停课日期和多个提前提醒时间，判断某次课是否上课
+"""
+
+import datetime
+import re
+
+# 单双周
+PARITY_ALL = 0
+PARITY_ODD = 1
+PARITY_EVEN = 2
+
+_RANGE_RE = re.compile(r'(\d+)\s*(?:[-~～至到]\s*(\d+))?')
+
+
+def parse_weeks(text):
+    """解析周次描述，返回 (周次集合, 单双周)
+
+    支持 "1-16周"、"1-8,10-16周"、"1-16周(单)"、"单周"、"双周" 等写法；
+    未填写周次时周次集合为 None，表示每周都上。
+    """
+    if not text:
+        return None, PARITY_ALL
+    text = str(text).strip()
+
+    parity = PARITY_ALL
+    if '单' in text:
+        parity = PARITY_ODD
+    elif '双' in text:
+        parity = PARITY_EVEN
+
+    weeks = set()
+    for match in _RANGE_RE.finditer(text):
+        first = int(match.group(1))
+        last = int(match.group(2) or first)
+        if first > last:
+            first, last = last, first
+        weeks.update(range(first, last + 1))
+    return (frozenset(weeks) if weeks else None), parity
+
+
+def parse_dates(text):
+    """解析以逗号分隔的日期（YYYY-MM-DD），忽略无效项"""
+    dates = set()
+    for part in re.split(r'[,，;；\s]+', str(text or '')):
+        if not part:
+            continue
+        try:
+            dates.add(datetime.date.fromisoformat(part))
+        except ValueError:
+            print(f"日期解析错误: {part}")
+    return frozenset(dates)
+
+
+def parse_lead_times(text, default):
+    """解析提前提醒分钟数，如 "30,10"；未填写时使用默认值"""
+    leads = set()
+    for part in re.split(r'[,，;；\s]+', str(text or '')):
+        if part.isdigit():
+            leads.add(int(part))
+    return tuple(sorted(leads or {default}, reverse=True))
+
+
+def parse_date(text):
+    """解析单个日期，无效时返回 None"""
+    try:
+        return datetime.date.fromisoformat(str(text).strip())
+    except (TypeError, ValueError):
+        return None
+
+
+def week_number(day, semester_start):
+    """day 是开学后的第几周（开学所在周为第1周）"""
+    monday = semester_start - datetime.timedelta(days=semester_start.weekday())
+    return (day - monday).days // 7 + 1
+
+
+class CourseRule:
+    """单门课程的重复规则"""
+
+    __slots__ = ('weeks', 'parity', 'skip_dates', 'lead_times')
+
+    def __init__(self, weeks=None, parity=PARITY_ALL, skip_dates=frozenset(), lead_times=(10,)):
+        self.weeks = weeks
+        self.parity = parity
+        self.skip_dates = skip_dates
+        self.lead_times = lead_times
+
+    @classmethod
+    def from_text(cls, weeks_text=None, skip_dates_text=None, lead_text=None, default_lead=10):
+        """由数据库中的文本字段构造"""
+        weeks, parity = parse_weeks(weeks_text)
+        return cls(weeks, parity, parse_dates(skip_dates_text),
+                   parse_lead_times(lead_text, default_lead))
+
+    def occurs_on(self, day, semester_start=None, global_skip_dates=frozenset()):
+        """day 这一天是否上课（星期已由调用方匹配）
+
+        未设置开学日期时无法计算周次，周次和单双周规则不生效。
+        """
+        if day in self.skip_dates or day in global_skip_dates:
+            return False
+        if semester_start is None:
+            return True
+        week = week_number(day, semester_start)
+        if week < 1:
+            return False
+        if self.weeks is not None and week not in self.weeks:
+            return False
+        if self.parity == PARITY_ODD and week % 2 == 0:
+            return False
+        if self.parity == PARITY_EVEN and week % 2 == 1:
+            return False
+        return True
+
+
+# 测试代码
+if __name__ == '__main__':
+    for text in ['1-16周', '1-8,10-16周', '1-16周(单)', '双周', '3周', '']:
+        print(f"{text!r}: {parse_weeks(text)}")
+
+    start = datetime.date(2024, 2, 26)
+    rule = CourseRule.from_text('1-16周(单)', '2024-04-04', '30,10')
+    for offset in range(0, 8 * 7, 7):
+        day = start + datetime.timedelta(days=offset)
+        print(day, f"第{week_number(day, start)}周", rule.occurs_on(day, start))
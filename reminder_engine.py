@@ -0,0 +1,657 @@
+"""
+提醒引擎模块
+统一调度课程、通知等各类提醒：休眠到下一次提醒再唤醒，不再每分钟轮询
+"""
+
+import bisect
+import datetime
+import threading
+from collections import OrderedDict, deque
+
+from database import add_course_listener, remove_course_listener
+from recurrence import CourseRule, parse_date, parse_dates
+
+# 默认提前提醒分钟数
+LEAD_MINUTES = 10
+
+# 错过提醒后最多补发多久之前的提醒
+MAX_CATCH_UP = datetime.timedelta(hours=1)
+
+# 有课程围栏时，课前多早开始检查是否需要提前出发（分钟）及检查间隔
+EARLY_CHECK_MINUTES = 40
+EARLY_CHECK_STEP = 5
+
+# 出发提醒预留的余量（分钟）
+DEPART_BUFFER_MINUTES = 2
+
+# 一周的分钟数，周一 00:00 为第0分钟
+MINUTES_PER_DAY = 24 * 60
+MINUTES_PER_WEEK = 7 * MINUTES_PER_DAY
+
+
+def minute_of_week(dt):
+    """时刻在一周中的分钟序号"""
+    return dt.weekday() * MINUTES_PER_DAY + dt.hour * 60 + dt.minute
+
+
+def week_monday(dt):
+    """dt 所在周的周一 00:00"""
+    return (dt - datetime.timedelta(days=dt.weekday())).replace(
+        hour=0, minute=0, second=0, microsecond=0)
+
+
+def _row_value(row, column):
+    """按列名取值，旧版数据库或普通元组没有该列时返回 None"""
+    try:
+        return row[column]
+    except (IndexError, KeyError, TypeError):
+        return None
+
+
+def parse_course(course, default_lead=LEAD_MINUTES):
+    """解析课程记录，时间格式错误时返回 None
+
+    course 为 courses 表的一行：(id, 课程名, 教师, 地点, 时间, 星期, ...)，
+    重复规则字段（weeks、skip_dates、lead_minutes）按列名读取。
+    """
+    try:
+        hour, minute = (int(part) for part in str(course[4]).strip().split(':'))
+        day = int(course[5])
+    except (TypeError, ValueError):
+        print(f"时间解析错误: {course[1]} {course[4]}")
+        return None
+    if not (0 <= hour < 24 and 0 <= minute < 60 and 1 <= day <= 7):
+        print(f"时间解析错误: {course[1]} {course[4]}")
+        return None
+    return {
+        'id': course[0],
+        'name': course[1],
+        'location': course[3] or "未知地点",
+        'day': day,        # 1-7 表示周一到周日
+        'hour': hour,
+        'minute': minute,
+        'rule': CourseRule.from_text(_row_value(course, 'weeks'),
+                                     _row_value(course, 'skip_dates'),
+                                     _row_value(course, 'lead_minutes'),
+                                     default_lead),
+    }
+
+
+class WeeklyReminderIndex:
+    """一周提醒索引
+
+    10080个分钟槽位，每个槽位保存该分钟到期的提醒；另有已占用槽位的有序列表，
+    用二分查找定位下一次提醒。增删单门课程只改动它所在的槽位。
+    """
+
+    def __init__(self):
+        self.slots = [None] * MINUTES_PER_WEEK
+        self._occupied = []   # 有序的非空槽位
+        self._by_course = {}  # 课程id -> 槽位列表
+
+    def add(self, slot, entry):
+        """在槽位中加入一条提醒，entry 需含课程 'id'"""
+        if self.slots[slot] is None:
+            self.slots[slot] = []
+            bisect.insort(self._occupied, slot)
+        self.slots[slot].append(entry)
+        self._by_course.setdefault(entry['id'], []).append(slot)
+
+    def remove(self, course_id):
+        """移除一门课程的全部提醒"""
+        for slot in self._by_course.pop(course_id, ()):
+            if self.slots[slot] is None:
+                continue
+            remaining = [c for c in self.slots[slot] if c['id'] != course_id]
+            if remaining:
+                self.slots[slot] = remaining
+            else:
+                self.slots[slot] = None
+                del self._occupied[bisect.bisect_left(self._occupied, slot)]
+
+    def due_at(self, slot):
+        """某分钟槽位到期的提醒"""
+        return self.slots[slot] or []
+
+    def next_slot(self, slot):
+        """slot 之后（不含）的下一个非空槽位，没有时返回 None"""
+        i = bisect.bisect_right(self._occupied, slot)
+        return self._occupied[i] if i < len(self._occupied) else None
+
+    def slots_between(self, start, end):
+        """(start, end] 区间内的非空槽位"""
+        lo = bisect.bisect_right(self._occupied, start)
+        hi = bisect.bisect_right(self._occupied, end)
+        return self._occupied[lo:hi]
+
+    def __len__(self):
+        return len(self._by_course)
+
+
+class ReminderQueue:
+    """提醒调度队列
+
+    按周展开课程的重复规则（周次、单双周、停课日期、多个提前量），
+    每周生成一份提醒索引并缓存，时钟检查时只做索引查找，不再逐条计算规则。
+    每次检查触发 (上次检查, 现在] 时间窗内到期的全部提醒，
+    时钟延迟或休眠跨过提醒分钟也不会漏掉。
+    """
+
+    # 缓存的周索引数量
+    CACHED_WEEKS = 3
+
+    def __init__(self, lead_minutes=LEAD_MINUTES, max_catch_up=MAX_CATCH_UP):
+        self.lead_minutes = lead_minutes
+        self.max_catch_up = max_catch_up
+        self.last_check = None  # 上次检查时刻，可由调用方从持久化记录恢复
+        self.probe_leads = ()   # 额外的检查时刻（课前分钟数），到期条目带 probe 标记
+        self.semester_start = None
+        self.global_skip_dates = frozenset()
+        self.courses = {}
+        self._weeks = OrderedDict()  # 周一日期 -> WeeklyReminderIndex
+
+    def set_semester(self, semester_start=None, global_skip_dates=frozenset()):
+        """设置开学日期和全校停课日期，已缓存的周索引失效"""
+        self.semester_start = semester_start
+        self.global_skip_dates = global_skip_dates
+        self._weeks.clear()
+
+    def rebuild(self, courses):
+        """根据课表重建"""
+        self.courses = {}
+        for row in courses:
+            course = parse_course(row, self.lead_minutes)
+            if course:
+                self.courses[course['id']] = course
+        self._weeks.clear()
+
+    def apply_change(self, action, payload):
+        """增量更新：('add', 课程行列表) 或 ('delete', 课程id列表)，只改动已缓存的周索引"""
+        if action == 'add':
+            for row in payload:
+                course = parse_course(row, self.lead_minutes)
+                if course:
+                    self.courses[course['id']] = course
+                    for monday, index in self._weeks.items():
+                        self._add_course(index, monday, course)
+        elif action == 'delete':
+            for course_id in payload:
+                self.courses.pop(course_id, None)
+                for index in self._weeks.values():
+                    index.remove(course_id)
+
+    def _add_course(self, index, monday, course):
+        """把课程在 monday 这一周内触发的提醒加入索引
+
+        提前量可能使下周一早课的提醒落在本周日，因此同时检查本周和下周的课。
+        """
+        rule = course['rule']
+        week_end = monday + datetime.timedelta(days=7)
+        for weeks_ahead in (0, 1):
+            class_day = monday + datetime.timedelta(days=7 * weeks_ahead + course['day'] - 1)
+            if not rule.occurs_on(class_day.date(), self.semester_start, self.global_skip_dates):
+                continue
+            start = class_day.replace(hour=course['hour'], minute=course['minute'])
+            leads = [(lead, False) for lead in rule.lead_times]
+            leads += [(lead, True) for lead in self.probe_leads if lead > rule.lead_times[0]]
+            for lead, probe in leads:
+                fire = start - datetime.timedelta(minutes=lead)
+                if monday <= fire < week_end:
+                    slot = int((fire - monday).total_seconds() // 60)
+                    index.add(slot, dict(course, lead=lead, probe=probe))
+
+    def _index_for(self, monday):
+        """取某一周的提醒索引，未缓存时按规则展开一次"""
+        index = self._weeks.get(monday)
+        if index is not None:
+            self._weeks.move_to_end(monday)
+            return index
+        index = WeeklyReminderIndex()
+        for course in self.courses.values():
+            self._add_course(index, monday, course)
+        self._weeks[monday] = index
+        while len(self._weeks) > self.CACHED_WEEKS:
+            self._weeks.popitem(last=False)
+        return index
+
+    def _window_start(self, now):
+        """时间窗起点（按分钟取整，不含）：首次检查时当前分钟仍可触发"""
+        start = self.last_check or now - datetime.timedelta(minutes=1)
+        start = max(start, now - self.max_catch_up)
+        return start.replace(second=0, microsecond=0)
+
+    def next_fire_time(self, now=None):
+        """下一次提醒时刻（只看本周和下周），没有提醒时返回 None"""
+        now = now or datetime.datetime.now()
+        base = self._window_start(now)
+        monday = week_monday(base + datetime.timedelta(minutes=1))
+        after = int((base - monday).total_seconds() // 60)
+        for _ in range(2):
+            slot = self._index_for(monday).next_slot(after)
+            if slot is not None:
+                return monday + datetime.timedelta(minutes=slot)
+            monday += datetime.timedelta(days=7)
+            after = -1
+        return None
+
+    def seconds_until_next(self, now=None):
+        """距下一次提醒的秒数，没有提醒时返回 None"""
+        now = now or datetime.datetime.now()
+        fire = self.next_fire_time(now)
+        if fire is None:
+            return None
+        return max(0.0, (fire - now).total_seconds())
+
+    def pop_due(self, now=None):
+        """取出上次检查之后到 now 为止到期的提醒
+
+        返回 (触发时刻, 提醒) 列表，按触发时刻排序，提醒含课程信息和提前量 'lead'；
+        超过 max_catch_up 的积压会被丢弃。
+        """
+        now = now or datetime.datetime.now()
+        cursor = self._window_start(now)
+        end = now.replace(second=0, microsecond=0)
+        self.last_check = now
+
+        due = []
+        while cursor < end:
+            # 时间窗跨周时按周分段查找
+            monday = week_monday(cursor + datetime.timedelta(minutes=1))
+            segment_end = min(end, monday + datetime.timedelta(days=7, minutes=-1))
+            index = self._index_for(monday)
+            lo = int((cursor - monday).total_seconds() // 60)
+            hi = int((segment_end - monday).total_seconds() // 60)
+            for slot in index.slots_between(lo, hi):
+                fire_at = monday + datetime.timedelta(minutes=slot)
+                due.extend((fire_at, entry) for entry in index.due_at(slot))
+            cursor = segment_end
+        return due
+
+    def __len__(self):
+        return len(self.courses)
+
+
+class ReminderLog:
+    """已触发提醒的持久化记录
+
+    每条提醒按键登记一次，避免重启、补发或多处检查造成重复通知；
+    同时保存各触发器的上次检查时刻，重启或恢复后从该时刻补发。
+    """
+
+    KEEP_DAYS = 30
+
+    def __init__(self, database):
+        self.db = database
+        self.db.prune_reminder_log(self.KEEP_DAYS)
+
+    def load_last_check(self, setting_key):
+        """读取上次检查时刻"""
+        value = self.db.get_setting(setting_key)
+        if not value:
+            return None
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return None
+
+    def save_last_check(self, setting_key, dt):
+        """保存上次检查时刻"""
+        self.db.save_setting(setting_key, dt.isoformat(timespec='seconds'))
+
+    def claim(self, reminders):
+        """登记提醒，只返回此前未触发过的；没有 key 的提醒直接放行，同一批中重复的 key 只保留第一条"""
+        keys = list(dict.fromkeys(r['key'] for r in reminders if r.get('key')))
+        claimed = self.db.claim_reminders(keys) if keys else set()
+        result = []
+        for r in reminders:
+            if r.get('key'):
+                if r['key'] not in claimed:
+                    continue
+                claimed.discard(r['key'])
+            result.append(r)
+        return result
+
+
+def format_course_message(fire_at, course, now=None):
+    """课程提醒文案；补发时按实际剩余时间描述"""
+    now = now or datetime.datetime.now()
+    lead_minutes = course.get('lead', LEAD_MINUTES)
+    start = fire_at + datetime.timedelta(minutes=lead_minutes)
+    minutes_left = -int(-(start - now).total_seconds() // 60)  # 向上取整
+    if minutes_left >= lead_minutes:
+        return f"【{course['name']}】将在{lead_minutes}分钟后开始！"
+    if minutes_left > 0:
+        return f"【{course['name']}】将在{minutes_left}分钟后开始！"
+    return f"【{course['name']}】已经开始，请尽快前往！"
+
+
+# ==================== 时钟与通知出口 ====================
+class SystemClock:
+    """系统时钟（可替换为测试或模拟用时钟）"""
+
+    def now(self):
+        return datetime.datetime.now()
+
+    def wait(self, event, seconds):
+        """等待 seconds 秒或直到 event 被触发"""
+        return event.wait(seconds)
+
+
+class AlarmSink:
+    """通知出口：统一检查通知开关后交给 AlarmManager 的发送队列"""
+
+    def __init__(self, alarm_manager, database):
+        self.alarm = alarm_manager
+        self.db = database
+
+    def __call__(self, reminder):
+        if self.db.get_setting('notification_enabled') == 'False':
+            return
+        self.alarm.send_notification(
+            title=reminder['title'],
+            message=reminder['message'],
+            course_name=reminder.get('course_name'),
+            category=reminder.get('category', 'general')
+        )
+
+
+# ==================== 触发器 ====================
+class ReminderTrigger:
+    """提醒触发器基类
+
+    next_fire_time(now) 返回下一次需要检查的时刻（None 表示暂无），
+    collect(now) 返回到期的提醒列表，每条为
+    {'key', 'category', 'title', 'message'} 字典，key 用于防重。
+    """
+
+    category = ''
+
+    def attach(self, engine):
+        """加入引擎时调用"""
+        self.engine = engine
+
+    def detach(self):
+        """移出引擎时调用"""
+        self.engine = None
+
+    def next_fire_time(self, now):
+        return None
+
+    def collect(self, now):
+        return []
+
+
+class CourseTrigger(ReminderTrigger):
+    """课程提醒触发器：课前提醒，支持错过补发
+
+    提供 geofences（geofence.CourseGeofences）时按位置调整：已在上课地点的围栏内则不再提醒；
+    课前 EARLY_CHECK_MINUTES 分钟起定期检查，步行时间超过剩余时间时提前发出出发提醒。
+    也可以只给 geofence_factory，由引擎线程首次需要时再创建围栏（应用启动时不导入围栏模块）。
+    围栏在第一次课前检查时才建立，并从该时刻起到上课开始打开定位（静止时定位管线自动间歇关闭GPS）。
+    """
+
+    category = 'course'
+    LAST_CHECK_KEY = 'reminder_last_check'
+
+    def __init__(self, database, lead_minutes=LEAD_MINUTES, geofences=None, geofence_factory=None):
+        self.db = database
+        self.lead_minutes = lead_minutes
+        self.queue = ReminderQueue(lead_minutes)
+        self.geofences = geofences
+        self._geofence_factory = geofence_factory
+        if geofences is not None or geofence_factory is not None:
+            self.queue.probe_leads = tuple(range(EARLY_CHECK_MINUTES, 0, -EARLY_CHECK_STEP))
+        self.engine = None
+        self._dirty = True
+        self._changes = deque()
+        self._fences_dirty = True
+        self._tracking_until = None   # 为即将开始的课程打开定位，到该时刻（上课时间）关闭
+
+    def attach(self, engine):
+        super().attach(engine)
+        self.queue.last_check = engine.log.load_last_check(self.LAST_CHECK_KEY)
+        self._dirty = True
+        add_course_listener(self.on_course_change)
+        if self.geofences is not None:
+            self.geofences.attach()
+
+    def detach(self):
+        remove_course_listener(self.on_course_change)
+        if self.geofences is not None:
+            self._stop_tracking()
+            self.geofences.detach()
+        super().detach()
+
+    def _get_geofences(self):
+        """课程围栏，按 geofence_factory 首次使用时创建；创建失败时返回 None"""
+        if self.geofences is None and self._geofence_factory is not None:
+            factory, self._geofence_factory = self._geofence_factory, None
+            try:
+                self.geofences = factory()
+            except Exception as e:
+                print(f"课程围栏创建失败: {e}")
+                return None
+            if self.engine is not None:
+                self.geofences.attach()
+        return self.geofences
+
+    def on_course_change(self, action=None, payload=None):
+        """课表变化：记录变更并唤醒引擎，由引擎线程更新索引"""
+        if action in (None, 'reload'):
+            self._dirty = True
+        else:
+            self._changes.append((action, payload))
+        if self.engine:
+            self.engine.wake()
+
+    def _sync(self):
+        changed = self._dirty or bool(self._changes)
+        if self._dirty:
+            self._dirty = False
+            self._changes.clear()
+            self.queue.set_semester(parse_date(self.db.get_setting('semester_start')),
+                                    parse_dates(self.db.get_setting('semester_skip_dates')))
+            self.queue.rebuild(self.db.get_all_courses())
+        while self._changes:
+            self.queue.apply_change(*self._changes.popleft())
+        if changed:
+            # 围栏要载入地点和路网，留到下一次课前检查时再重建
+            self._fences_dirty = True
+
+    def _prepare_geofences(self, start):
+        """课前检查：按需建立围栏，并打开定位直到上课时间 start"""
+        geofences = self._get_geofences()
+        if geofences is None:
+            return None
+        if self._fences_dirty:
+            self._fences_dirty = False
+            try:
+                geofences.rebuild(self.queue.courses.values())
+            except Exception as e:
+                print(f"课程围栏建立失败: {e}")
+        if self._tracking_until is None:
+            geofences.track()
+        self._tracking_until = max(self._tracking_until or start, start)
+        return geofences
+
+    def _stop_tracking(self):
+        if self._tracking_until is not None:
+            self._tracking_until = None
+            self.geofences.release()
+
+    def next_fire_time(self, now):
+        self._sync()
+        next_time = self.queue.next_fire_time(now)
+        if self._tracking_until is not None and (next_time is None or self._tracking_until < next_time):
+            return self._tracking_until
+        return next_time
+
+    def collect(self, now):
+        self._sync()
+        if self._tracking_until is not None and now >= self._tracking_until:
+            self._stop_tracking()
+        due = self.queue.pop_due(now)
+        self.engine.log.save_last_check(self.LAST_CHECK_KEY, now)
+
+        # 补发积压的检查时，每次课只保留最近一次课前检查；同一批已有正常提醒的课不再发出发提醒
+        probes = {}
+        reminded = set()
+        for fire_at, course in due:
+            occurrence = (course['id'], fire_at + datetime.timedelta(minutes=course['lead']))
+            if course.get('probe'):
+                probes[occurrence] = (fire_at, course)
+            else:
+                reminded.add(occurrence)
+
+        reminders = []
+        for fire_at, course in due:
+            if course.get('probe'):
+                start = fire_at + datetime.timedelta(minutes=course['lead'])
+                if probes[(course['id'], start)][0] != fire_at or (course['id'], start) in reminded:
+                    continue
+                reminder = self._departure_reminder(fire_at, course, now)
+                if reminder:
+                    reminders.append(reminder)
+                continue
+            if self.geofences is not None and self.geofences.is_inside(course['id']):
+                print(f"已在上课地点，不再提醒: {course['name']}")
+                continue
+            reminders.append({
+                'key': f"course:{course['id']}:{fire_at.strftime('%Y-%m-%dT%H:%M')}",
+                'category': self.category,
+                'title': "课程提醒 ⏰",
+                'message': f"{format_course_message(fire_at, course, now)}\n地点: {course['location']}",
+                'course_name': course['name'],
+            })
+        return reminders
+
+    def _departure_reminder(self, fire_at, course, now):
+        """出发提醒：等到下一次检查再走就来不及时发出，每次课只发一次"""
+        start = fire_at + datetime.timedelta(minutes=course['lead'])
+        if start <= now:
+            return None
+        geofences = self._prepare_geofences(start)
+        if geofences is None or geofences.is_inside(course['id']):
+            return None
+        walk = geofences.walk_minutes(course['id'])
+        if walk is None:
+            return None
+        minutes_left = (start - now).total_seconds() / 60
+        # 到下一次检查（或正常提醒）时再出发仍来得及，则暂不打扰
+        if walk + DEPART_BUFFER_MINUTES < minutes_left - EARLY_CHECK_STEP:
+            return None
+        return {
+            'key': f"course:{course['id']}:{start.strftime('%Y-%m-%dT%H:%M')}:depart",
+            'category': self.category,
+            'title': "出发提醒 🚶",
+            'message': (f"【{course['name']}】将在{max(0, round(minutes_left))}分钟后开始，"
+                        f"从当前位置步行约{max(1, round(walk))}分钟，请现在出发！\n地点: {course['location']}"),
+            'course_name': course['name'],
+        }
+
+
+# ==================== 提醒引擎 ====================
+class ReminderEngine:
+    """统一提醒引擎
+
+    一个线程驱动所有触发器：休眠到最早的下一次触发时刻，醒来后收集到期提醒，
+    经持久化记录去重后交给唯一的通知出口。Kivy应用和后台服务模式共用。
+    """
+
+    # 单次最长休眠时间（秒）：设备休眠时计时器可能暂停，定期醒来补发
+    MAX_WAIT = 5 * 60
+
+    def __init__(self, database, sink, triggers=(), clock=None):
+        self.db = database
+        self.sink = sink
+        self.clock = clock or SystemClock()
+        self.log = ReminderLog(database)
+        self.triggers = []
+        self.running = False
+        self.thread = None
+        self._wakeup = threading.Event()
+        for trigger in triggers:
+            self.add_trigger(trigger)
+
+    def add_trigger(self, trigger):
+        """注册触发器"""
+        trigger.attach(self)
+        self.triggers.append(trigger)
+        self.wake()
+        return trigger
+
+    def remove_trigger(self, trigger):
+        """注销触发器"""
+        if trigger in self.triggers:
+            self.triggers.remove(trigger)
+            trigger.detach()
+
+    def wake(self):
+        """唤醒引擎立即检查（课表变化、应用恢复等）"""
+        self._wakeup.set()
+
+    def start(self):
+        """在后台线程启动引擎"""
+        if not self.running:
+            self.running = True
+            self.thread = threading.Thread(target=self.run_forever, daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        """停止引擎"""
+        self.running = False
+        self._wakeup.set()
+
+    def run_forever(self):
+        """引擎主循环（后台服务模式可直接在前台调用）"""
+        self.running = True
+        while self.running:
+            self._wakeup.clear()
+            self.run_once()
+            delay = self.seconds_until_next()
+            self.clock.wait(self._wakeup, self.MAX_WAIT if delay is None else min(delay, self.MAX_WAIT))
+
+    def run_once(self):
+        """检查一次所有触发器，返回本次发出的提醒"""
+        now = self.clock.now()
+        reminders = []
+        for trigger in self.triggers:
+            try:
+                reminders.extend(trigger.collect(now))
+            except Exception as e:
+                print(f"提醒检查失败 ({trigger.category}): {e}")
+
+        reminders = self.log.claim(reminders)
+        for reminder in reminders:
+            try:
+                self.sink(reminder)
+            except Exception as e:
+                print(f"提醒发送失败: {e}")
+        return reminders
+
+    def seconds_until_next(self):
+        """距最早一次触发的秒数，没有待触发提醒时返回 None"""
+        now = self.clock.now()
+        times = [t for t in (trigger.next_fire_time(now) for trigger in self.triggers) if t]
+        if not times:
+            return None
+        return max(0.0, (min(times) - now).total_seconds())
+
+
+# 后台服务模式：不启动界面，只运行提醒引擎
+if __name__ == '__main__':
+    from alarm_manager import AlarmManager
+    from database import Database
+    from deadline_alerts import ContestDeadlineTrigger
+    from notice_watcher import NoticeWatcher
+
+    db = Database()
+    engine = ReminderEngine(db, AlarmSink(AlarmManager(), db),
+                            triggers=[CourseTrigger(db), ContestDeadlineTrigger(db),
+                                      NoticeWatcher(db, first_delay=0)])
+    print("提醒服务已启动，按 Ctrl+C 退出")
+    try:
+        engine.run_forever()
+    except KeyboardInterrupt:
+        engine.stop()
+        print("\n提醒服务已停止")
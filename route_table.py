@@ -0,0 +1,167 @@
+"""
+路线表模块
+为校园路网预先计算全源最短路（距离矩阵 + 前驱矩阵），按路网版本缓存到磁盘，
+运行时以内存映射方式读取，路线查询只需查表
+"""
+
+import glob
+import hashlib
+import json
+import mmap
+import os
+import struct
+
+import networkx as nx
+
+# 缓存目录与文件名
+ROUTE_CACHE_DIR = 'route_cache'
+TABLE_PATTERN = 'route_table_*.bin'
+
+# 文件格式：魔数、格式版本、节点数、节点表长度，之后依次为
+# 节点表（JSON）、float32 距离矩阵、int32 前驱矩阵（-1 表示无），矩阵按4字节对齐
+MAGIC = b'YLRT'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sHII')
+
+
+def graph_version(graph):
+    """路网版本：节点坐标和路段数据的摘要，数据变化后版本随之变化"""
+    digest = hashlib.sha1(f'v{FORMAT_VERSION}'.encode())
+    for node in sorted(graph.nodes):
+        data = graph.nodes[node]
+        digest.update(f"n|{node}|{data['lat']:.7f}|{data['lon']:.7f}\n".encode('utf-8'))
+    for u, v in sorted(tuple(sorted(edge)) for edge in graph.edges):
+        data = graph.edges[u, v]
+        digest.update(f"e|{u}|{v}|{data['length']:.3f}\n".encode('utf-8'))
+    return digest.hexdigest()[:16]
+
+
+class RouteTable:
+    """内存映射的全源最短路表"""
+
+    def __init__(self, path):
+        self.file_path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, n, names_len = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"路线表格式不匹配: {path}")
+        offset = _HEADER.size
+        self.nodes = json.loads(self._map[offset:offset + names_len].decode('utf-8'))
+        self.index = {node: i for i, node in enumerate(self.nodes)}
+        self.size = n
+
+        offset = _aligned(offset + names_len)
+        self._view = memoryview(self._map)
+        self._dist = self._view[offset:offset + 4 * n * n].cast('f')
+        offset += 4 * n * n
+        self._pred = self._view[offset:offset + 4 * n * n].cast('i')
+
+    @classmethod
+    def build(cls, graph, path):
+        """计算全源最短路并写入 path（先写临时文件再替换，避免读到半个文件）"""
+        nodes = sorted(graph.nodes)
+        index = {node: i for i, node in enumerate(nodes)}
+        n = len(nodes)
+        dist = [float('inf')] * (n * n)
+        pred = [-1] * (n * n)
+
+        for i, source in enumerate(nodes):
+            predecessors, distances = nx.dijkstra_predecessor_and_distance(graph, source, weight='length')
+            row = i * n
+            for node, d in distances.items():
+                j = index[node]
+                dist[row + j] = d
+                if predecessors[node]:
+                    pred[row + j] = index[predecessors[node][0]]
+
+        names = json.dumps(nodes, ensure_ascii=False).encode('utf-8')
+        header = _HEADER.pack(MAGIC, FORMAT_VERSION, n, len(names))
+        padding = b'\0' * (_aligned(len(header) + len(names)) - len(header) - len(names))
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(header)
+            f.write(names)
+            f.write(padding)
+            f.write(struct.pack(f'<{n * n}f', *dist))
+            f.write(struct.pack(f'<{n * n}i', *pred))
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    @classmethod
+    def load_or_build(cls, graph, cache_dir=ROUTE_CACHE_DIR):
+        """读取当前路网版本的缓存表，不存在时重新计算，并删除旧版本的表"""
+        os.makedirs(cache_dir, exist_ok=True)
+        path = os.path.join(cache_dir, TABLE_PATTERN.replace('*', graph_version(graph)))
+        table = None
+        if os.path.exists(path):
+            try:
+                table = cls(path)
+            except (ValueError, OSError, struct.error) as e:
+                print(f"路线表损坏，重新计算: {e}")
+        if table is None:
+            table = cls.build(graph, path)
+
+        for stale in glob.glob(os.path.join(cache_dir, TABLE_PATTERN)):
+            if os.path.abspath(stale) != os.path.abspath(path):
+                try:
+                    os.remove(stale)
+                except OSError:
+                    pass
+        return table
+
+    def __contains__(self, node):
+        return node in self.index
+
+    def distance(self, source, target):
+        """两节点间最短步行距离（米），不连通时为 inf"""
+        return self._dist[self.index[source] * self.size + self.index[target]]
+
+    def path(self, source, target):
+        """沿前驱矩阵回溯最短路径，不连通时返回 None"""
+        i, j = self.index[source], self.index[target]
+        if i == j:
+            return [source]
+        row = i * self.size
+        path = [target]
+        while j != i:
+            j = self._pred[row + j]
+            if j < 0:
+                return None
+            path.append(self.nodes[j])
+        path.reverse()
+        return path
+
+    def close(self):
+        for name in ('_dist', '_pred', '_view'):
+            view = getattr(self, name, None)
+            if view is not None:
+                view.release()
+        self._map.close()
+        self._file.close()
+
+
+def _aligned(offset, alignment=4):
+    return (offset + alignment - 1) // alignment * alignment
+
+
+# 测试代码
+if __name__ == '__main__':
+    import time
+
+    from campus_graph import CampusGraph
+
+    campus = CampusGraph()
+    start = time.perf_counter()
+    table = RouteTable.load_or_build(campus.graph)
+    print(f"路线表 {table.file_path}：{table.size} 个节点，载入 {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    start = time.perf_counter()
+    for _ in range(1000):
+        table.path("南门", "图书馆")
+    print(f"查表 1000 次: {(time.perf_counter() - start) * 1000:.2f} ms")
+    print(table.path("南门", "图书馆"), f"{table.distance('南门', '图书馆'):.0f} 米")
+    table.close()
@@ -4,13 +4,288 @@
 """
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.util import connection as urllib3_connection
 from bs4 import BeautifulSoup
 import datetime
 import re
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin
+
+from metrics import registry as metrics
+from news_dedup import dedupe_items, simhash
 
 # 榆林学院官网
 YULIN_NEWS_URL = "http://www.yulinu.edu.cn/"
 YULIN_JWC_URL = "http://jwc.yulinu.edu.cn/"  # 教务处
+YULIN_LIB_URL = "http://lib.yulinu.edu.cn/"  # 图书馆
+YULIN_XSC_URL = "http://xsc.yulinu.edu.cn/"  # 学生处
+YULIN_TW_URL = "http://tw.yulinu.edu.cn/"  # 校团委
+
+# 重要通知关键词
+IMPORTANT_KEYWORDS = ['考试', '成绩', '放假', '通知', '报名', '竞赛', '获奖']
+
+# 日期格式：2024-03-15 / 2024/03/15 / 2024.03.15 / 2024年3月15日 / [03-15]
+DATE_PATTERNS = [
+    re.compile(r'(\d{4})[-/.年](\d{1,2})[-/.月](\d{1,2})'),
+    re.compile(r'(?<!\d)(\d{1,2})[-/.月](\d{1,2})(?!\d)'),
+]
+
+# 并发抓取的最大线程数
+MAX_WORKERS = 8
+
+# 新闻和通知共用一次抓取结果的有效期（秒），信息中心先后刷新两类时不重复抓取
+FETCH_REUSE_SECONDS = 60
+
+# 流式下载：单页字节上限与分块大小
+MAX_PAGE_BYTES = 512 * 1024
+CHUNK_SIZE = 16 * 1024
+
+
+# ==================== 站点适配器 ====================
+class SiteAdapter:
+    """站点适配器基类
+
+    每个信息源声明列表页地址、条目选择器、日期提取和翻页规则，
+    由 YulinScraper 统一并发抓取并合并为标准化结果。
+    """
+
+    name = ''                  # 适配器唯一名称
+    source = ''                # 显示用来源名称
+    kind = 'news'              # 'news' 新闻 / 'notice' 通知
+    list_url = ''              # 列表页首页地址
+    item_selector = 'a'        # CSS选择器
+    page_url_template = None   # 翻页地址模板，如 'list{page}.htm'
+    max_pages = 1
+    max_items = 20
+    min_title_len = 5
+    list_end_markers = ()      # 列表区域结束标记（bytes），收到后即停止下载
+
+    def page_urls(self):
+        """翻页规则：返回需要抓取的列表页地址"""
+        urls = [self.list_url]
+        if self.page_url_template:
+            for page in range(2, self.max_pages + 1):
+                urls.append(urljoin(self.list_url, self.page_url_template.format(page=page)))
+        return urls
+
+    def find_items(self, soup):
+        """查找列表条目"""
+        return soup.select(self.item_selector)
+
+    def extract_date(self, item):
+        """从条目（或其父节点）文本中提取日期，找不到时返回今天"""
+        today = datetime.date.today()
+        for node in (item, item.parent):
+            if node is None:
+                continue
+            text = node.get_text(' ', strip=True)
+            match = DATE_PATTERNS[0].search(text)
+            if match:
+                year, month, day = (int(g) for g in match.groups())
+            else:
+                match = DATE_PATTERNS[1].search(text)
+                if not match:
+                    continue
+                year = today.year
+                month, day = (int(g) for g in match.groups())
+            try:
+                date = datetime.date(year, month, day)
+            except ValueError:
+                continue
+            # 只有月日时，晚于今天的日期属于去年
+            if date > today and not DATE_PATTERNS[0].search(text):
+                date = date.replace(year=year - 1)
+            return date.strftime('%Y-%m-%d')
+        return today.strftime('%Y-%m-%d')
+
+    def extract_link(self, item):
+        """获取条目标题和链接"""
+        link = item if item.name == 'a' else item.find('a', href=True)
+        title = (link.get('title') or link.get_text(strip=True)) if link else item.get_text(strip=True)
+        href = link.get('href', '') if link else ''
+        return title.strip(), href
+
+    def is_important(self, title):
+        """判断是否为重要信息"""
+        return any(kw in title for kw in IMPORTANT_KEYWORDS)
+
+    def parse(self, html, page_url):
+        """解析列表页，返回标准化条目"""
+        soup = BeautifulSoup(html, 'html.parser')
+        results = []
+        for item in self.find_items(soup):
+            title, href = self.extract_link(item)
+            if not title or len(title) < self.min_title_len or title.startswith('http'):
+                continue
+            results.append({
+                'title': title,
+                'url': urljoin(page_url, href) if href else page_url,
+                'date': self.extract_date(item),
+                'source': self.source,
+                'important': self.is_important(title),
+                'kind': self.kind,
+                'adapter': self.name,
+                'simhash': simhash(title),
+            })
+            if len(results) >= self.max_items:
+                break
+        return results
+
+
+class HomepageAdapter(SiteAdapter):
+    """学校官网首页"""
+
+    name = 'homepage'
+    source = '榆林学院官网'
+    kind = 'news'
+    list_url = YULIN_NEWS_URL
+    min_title_len = 6   # 首页导航链接多为5个字以内
+
+    # 尝试多种可能的选择器
+    selectors = ['a.news-title', 'a.title', 'li.news-item', 'div.news']
+
+    def find_items(self, soup):
+        for selector in self.selectors:
+            items = soup.select(selector)
+            if items:
+                return items
+        # 如果没找到，尝试查找所有链接
+        return [a for a in soup.find_all('a', href=True) if a.get_text(strip=True)]
+
+
+class JwcAdapter(SiteAdapter):
+    """教务处通知"""
+
+    name = 'jwc'
+    source = '教务处'
+    kind = 'notice'
+    list_url = YULIN_JWC_URL
+    max_items = 15
+    min_title_len = 4
+
+    def find_items(self, soup):
+        return soup.find_all(['a', 'li', 'div'], class_=re.compile(r'notice|news|list', re.I))
+
+
+class ListPageAdapter(SiteAdapter):
+    """通用列表页适配器（学院、部门网站常用的 list.htm 翻页结构）"""
+
+    item_selector = 'ul li a[href]'
+    page_url_template = 'list{page}.htm'
+    max_pages = 2
+    list_end_markers = (b'wp_paging', b'class="pagination"', b'id="footer"')
+
+    def __init__(self, name, source, list_url, kind='news', **options):
+        self.name = name
+        self.source = source
+        self.list_url = list_url
+        self.kind = kind
+        for key, value in options.items():
+            setattr(self, key, value)
+
+
+# 适配器注册表
+_ADAPTERS = {}
+
+
+def register_adapter(adapter):
+    """注册站点适配器（同名覆盖）"""
+    _ADAPTERS[adapter.name] = adapter
+    return adapter
+
+
+def unregister_adapter(name):
+    """注销站点适配器"""
+    _ADAPTERS.pop(name, None)
+
+
+def get_adapters(kind=None):
+    """获取已注册的适配器"""
+    return [a for a in _ADAPTERS.values() if kind is None or a.kind == kind]
+
+
+def register_college_adapter(name, source, list_url):
+    """注册学院新闻页"""
+    return register_adapter(ListPageAdapter(name, source, list_url, kind='news'))
+
+
+register_adapter(HomepageAdapter())
+register_adapter(JwcAdapter())
+register_adapter(ListPageAdapter('library', '图书馆', YULIN_LIB_URL, kind='notice'))
+register_adapter(ListPageAdapter('xsc', '学生处', YULIN_XSC_URL, kind='notice'))
+register_adapter(ListPageAdapter('tw', '校团委', YULIN_TW_URL, kind='news'))
+
+
+# ==================== 连接计时 ====================
+# 记录当前线程最近一次新建连接的DNS解析和TCP连接耗时；复用的长连接不会更新
+_conn_timing = threading.local()
+
+
+class _TimedSocketModule:
+    """urllib3 建立连接时所用 socket 模块的代理：getaddrinfo 记录解析耗时，其余属性原样转发
+
+    只替换 urllib3.util.connection 中的引用，不影响其他模块；解析仍由urllib3完成，
+    保留其在多个 A/AAAA 记录之间依次重试的行为，也不会为计时多解析一次。
+    """
+
+    def __getattr__(self, name):
+        return getattr(socket, name)
+
+    @staticmethod
+    def getaddrinfo(*args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return socket.getaddrinfo(*args, **kwargs)
+        finally:
+            _conn_timing.dns_ms = (time.perf_counter() - start) * 1000
+
+
+urllib3_connection.socket = _TimedSocketModule()
+
+
+class _TimedConnectionMixin:
+    """新建连接时分别统计DNS解析和TCP连接耗时（连接耗时为建立连接的总耗时减去解析耗时）"""
+
+    def _new_conn(self):
+        _conn_timing.dns_ms = 0.0
+        start = time.perf_counter()
+        try:
+            return super()._new_conn()
+        finally:
+            _conn_timing.connect_ms = (time.perf_counter() - start) * 1000 - _conn_timing.dns_ms
+
+
+class _TimedHTTPConnection(_TimedConnectionMixin, HTTPConnection):
+    pass
+
+
+class _TimedHTTPSConnection(_TimedConnectionMixin, HTTPSConnection):
+    pass
+
+
+class _TimedHTTPConnectionPool(HTTPConnectionPool):
+    ConnectionCls = _TimedHTTPConnection
+
+
+class _TimedHTTPSConnectionPool(HTTPSConnectionPool):
+    ConnectionCls = _TimedHTTPSConnection
+
+
+class TimedHTTPAdapter(HTTPAdapter):
+    """使用计时连接的requests传输适配器"""
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = {
+            'http': _TimedHTTPConnectionPool,
+            'https': _TimedHTTPSConnectionPool,
+        }
 
 
 class YulinScraper:
@@ -23,94 +298,186 @@ class YulinScraper:
             'Accept': 'text/html,application/xhtml+xml,application/xml;q=0.9,image/webp,*/*;q=0.8',
             'Accept-Language': 'zh-CN,zh;q=0.9,en;q=0.8',
         })
+        timed_adapter = TimedHTTPAdapter()
+        self.session.mount('http://', timed_adapter)
+        self.session.mount('https://', timed_adapter)
         self.timeout = 10
+        self.max_page_bytes = MAX_PAGE_BYTES
+        self.last_timings = {}  # 每个适配器最近一次抓取的耗时和结果数
+        self._page_cache = {}   # url -> {'etag', 'last_modified', 'items'}
+        self._last_fetch = None  # (抓取时刻, 全部站点去重后的结果)
+        self._fetch_lock = threading.Lock()
 
-    def get_latest_news(self):
-        """获取最新新闻"""
-        news_list = []
+    def download(self, url, end_markers=(), headers=None, stats=None):
+        """流式下载页面
+
+        超过 max_page_bytes 或收到列表结束标记后立即断开，
+        避免把整页内联图片和脚本读进内存。返回 (响应, 内容, 是否被截断)，
+        状态码非200时内容为 None。stats 字典会填入各阶段耗时和字节数。
+        """
+        stats = {} if stats is None else stats
+        _conn_timing.dns_ms = _conn_timing.connect_ms = 0.0
+
+        start = time.perf_counter()
+        response = self.session.get(url, timeout=self.timeout, stream=True, headers=headers)
+        headers_at = time.perf_counter()
+        stats['status'] = response.status_code
+        stats['dns_ms'] = round(_conn_timing.dns_ms, 3)
+        stats['connect_ms'] = round(_conn_timing.connect_ms, 3)
+        stats['ttfb_ms'] = round((headers_at - start) * 1000, 3)
 
+        buffer = bytearray()
+        truncated = False
         try:
-            # 尝试访问榆林学院官网
-            response = self.session.get(YULIN_NEWS_URL, timeout=self.timeout)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # 尝试多种可能的选择器
-                selectors = [
-                    ('a', {'class': 'news-title'}),
-                    ('a', {'class': 'title'}),
-                    ('li', {'class': 'news-item'}),
-                    ('div', {'class': 'news'}),
-                ]
-
-                news_items = []
-                for tag, attrs in selectors:
-                    news_items = soup.find_all(tag, attrs)
-                    if news_items:
-                        break
-
-                # 如果没找到，尝试查找所有链接
-                if not news_items:
-                    news_items = soup.find_all('a', href=True)
-                    news_items = [a for a in news_items if a.get_text(strip=True)]
-
-                for item in news_items[:20]:
-                    title = item.get_text(strip=True)
-                    href = item.get('href', '')
-
-                    # 过滤有效新闻标题
-                    if title and len(title) > 5 and not title.startswith('http'):
-                        # 处理相对URL
-                        if href and not href.startswith('http'):
-                            if href.startswith('/'):
-                                href = YULIN_NEWS_URL + href[1:]
-                            else:
-                                href = YULIN_NEWS_URL + href
-
-                        news_list.append({
-                            'title': title,
-                            'url': href,
-                            'date': datetime.datetime.now().strftime('%Y-%m-%d'),
-                            'source': '榆林学院官网'
-                        })
-        except Exception as e:
-            print(f"获取新闻失败: {e}")
-            # 返回示例数据
-            news_list = self._get_sample_news()
+            if response.status_code != 200:
+                return response, None, False
 
-        return news_list if news_list else self._get_sample_news()
+            overlap = max((len(m) for m in end_markers), default=0)
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                if not chunk:
+                    continue
+                # 只在新到达的数据（加上与上一块的重叠部分）中查找结束标记
+                search_from = max(0, len(buffer) - overlap)
+                buffer.extend(chunk[:self.max_page_bytes - len(buffer)])
+                if len(buffer) >= self.max_page_bytes:
+                    truncated = True
+                    break
+                if any(buffer.find(m, search_from) != -1 for m in end_markers):
+                    truncated = True
+                    break
+            return response, bytes(buffer), truncated
+        finally:
+            response.close()
+            stats['download_ms'] = round((time.perf_counter() - headers_at) * 1000, 3)
+            stats['bytes'] = len(buffer)
+            stats['truncated'] = truncated
 
-    def get_important_notices(self):
-        """获取重要通知（教务处）"""
-        notices = []
+    def fetch_page(self, adapter, url):
+        """抓取并解析单个列表页，页面未变化（304）时复用上次的解析结果
+
+        返回条目列表，页面不可用时返回 None。
+        """
+        stats = {'adapter': adapter.name, 'url': url, 'cache_hit': False, 'parse_ms': 0.0}
+        cached = self._page_cache.get(url)
+        headers = {}
+        if cached:
+            if cached['etag']:
+                headers['If-None-Match'] = cached['etag']
+            if cached['last_modified']:
+                headers['If-Modified-Since'] = cached['last_modified']
+
+        response, content, _ = self.download(url, adapter.list_end_markers, headers, stats)
+        if response.status_code == 304 and cached:
+            stats['cache_hit'] = True
+            items = cached['items']
+        elif content is None:
+            items = None
+        else:
+            parse_start = time.perf_counter()
+            items = adapter.parse(content, url)
+            stats['parse_ms'] = round((time.perf_counter() - parse_start) * 1000, 3)
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+            if etag or last_modified:
+                self._page_cache[url] = {'etag': etag, 'last_modified': last_modified, 'items': items}
+
+        stats['items'] = len(items) if items else 0
+        self._record_fetch(stats)
+        return items
 
+    def _record_fetch(self, stats):
+        """把单次抓取的指标写入全局注册表"""
+        metrics.incr('scraper.requests')
+        metrics.incr('scraper.bytes', stats['bytes'])
+        metrics.incr('scraper.items', stats['items'])
+        if stats['cache_hit']:
+            metrics.incr('scraper.cache_hits')
+        if stats['truncated']:
+            metrics.incr('scraper.truncated')
+        # 复用连接时没有DNS/连接阶段，不计入统计
+        if stats['connect_ms']:
+            metrics.observe('scraper.dns_ms', stats['dns_ms'])
+            metrics.observe('scraper.connect_ms', stats['connect_ms'])
+        for key in ('ttfb_ms', 'download_ms', 'parse_ms'):
+            metrics.observe(f'scraper.{key}', stats[key])
+        metrics.record('scraper.fetch', **stats)
+
+    def fetch_adapter(self, adapter):
+        """抓取单个适配器的所有列表页"""
+        items = []
+        for url in adapter.page_urls():
+            page_items = self.fetch_page(adapter, url)
+            if page_items is None:
+                break
+            items.extend(page_items)
+        return items
+
+    def _run_adapter(self, adapter):
+        """在线程中运行适配器并计时"""
+        start = time.perf_counter()
+        error = None
         try:
-            response = self.session.get(YULIN_JWC_URL, timeout=self.timeout)
-            if response.status_code == 200:
-                soup = BeautifulSoup(response.content, 'html.parser')
-
-                # 查找通知列表
-                notice_items = soup.find_all(['a', 'li', 'div'],
-                    class_=re.compile(r'notice|news|list', re.I))
-
-                for item in notice_items[:15]:
-                    title = item.get_text(strip=True)
-                    href = item.get('href', '')
-
-                    if title and len(title) > 3:
-                        # 检查是否是重要通知
-                        keywords = ['考试', '成绩', '放假', '通知', '报名', '竞赛', '获奖']
-                        is_important = any(kw in title for kw in keywords)
-
-                        notices.append({
-                            'title': title,
-                            'url': href if href.startswith('http') else YULIN_JWC_URL + href,
-                            'important': is_important,
-                            'date': datetime.datetime.now().strftime('%Y-%m-%d')
-                        })
+            items = self.fetch_adapter(adapter)
         except Exception as e:
-            print(f"获取通知失败: {e}")
+            print(f"抓取 {adapter.source} 失败: {e}")
+            metrics.incr('scraper.errors')
+            items, error = [], str(e)
+        seconds = time.perf_counter() - start
+        metrics.observe(f'scraper.adapter.{adapter.name}_ms', seconds * 1000)
+        return adapter.name, items, {
+            'seconds': round(seconds, 3),
+            'items': len(items),
+            'error': error,
+        }
+
+    def fetch_all(self, kind=None, dedupe=True):
+        """抓取所有已注册的适配器，返回按日期倒序的标准化列表（kind 只保留该类条目）
+
+        dedupe 为 True 时，不论新闻还是通知，各站点转载的近似重复条目都聚合为一条，
+        其 'sources' 字段列出全部来源、'kinds' 列出全部类别；
+        官网首页转发的教务处通知因此在新闻和通知两个列表中都只出现一次。
+        """
+        if not dedupe:
+            return self._fetch_adapters(get_adapters(kind))
+        with self._fetch_lock:
+            now = time.monotonic()
+            if self._last_fetch is None or now - self._last_fetch[0] > FETCH_REUSE_SECONDS:
+                self._last_fetch = (now, dedupe_items(self._fetch_adapters(get_adapters())))
+            clusters = self._last_fetch[1]
+        return [c for c in clusters if kind is None or kind in c['kinds']]
+
+    def _fetch_adapters(self, adapters):
+        """并发抓取一组适配器，按地址合并后按日期倒序排列"""
+        if not adapters:
+            return []
+
+        merged = []
+        seen_urls = set()
+        # 没有链接的条目地址都是列表页本身，按 (地址, 标题) 区分
+        list_pages = {url for adapter in adapters for url in adapter.page_urls()}
+        workers = min(MAX_WORKERS, len(adapters))
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for name, items, timing in pool.map(self._run_adapter, adapters):
+                self.last_timings[name] = timing
+                for item in items:
+                    key = (item['url'], item['title']) if item['url'] in list_pages else item['url']
+                    if key in seen_urls:
+                        continue
+                    seen_urls.add(key)
+                    merged.append(item)
 
+        # 稳定排序：同一天内保持各站点原有顺序
+        merged.sort(key=lambda n: n['date'], reverse=True)
+        return merged
+
+    def get_latest_news(self):
+        """获取最新新闻"""
+        news_list = self.fetch_all(kind='news')
+        return news_list if news_list else self._get_sample_news()
+
+    def get_important_notices(self):
+        """获取重要通知（教务处、学生处、图书馆等）"""
+        notices = self.fetch_all(kind='notice')
         return notices if notices else self._get_sample_notices()
 
     def search_news(self, keyword):
@@ -238,3 +605,15 @@ if __name__ == '__main__':
         flag = "★" if n['important'] else " "
         print(f"{flag} {i}. {n['title']}")
         print(f"   日期: {n['date']}")
+
+    print("\n" + "=" * 50)
+    print("各站点抓取耗时：")
+    print("=" * 50)
+    for name, timing in scraper.last_timings.items():
+        status = "失败" if timing['error'] else f"{timing['items']} 条"
+        print(f"{name}: {timing['seconds']}s | {status}")
+
+    print("\n" + "=" * 50)
+    print("抓取指标：")
+    print("=" * 50)
+    print(metrics.dump_json())
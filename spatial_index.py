@@ -0,0 +1,226 @@
+"""
+空间索引模块
+把经纬度投影为以校园为中心的平面坐标（米），按均匀网格分桶，
+支持最近邻、k近邻和半径查询，用于把定位吸附到最近的建筑、出入口或路网节点
+"""
+
+import math
+
+from geo import EARTH_RADIUS_M, distances_from
+
+# 网格边长（米）：校园尺度下每格只有少量地点
+CELL_SIZE_M = 50.0
+
+# 网格按投影距离剪枝、结果按球面距离排序，两者在校园范围内相差远小于1%
+_PRUNE_SLACK = 0.99
+
+# 默认投影原点（榆林学院）
+ORIGIN = (38.2850, 109.7340)
+
+
+class LocalProjection:
+    """等距圆柱投影：小范围内把经纬度换算为以原点为中心的平面米坐标"""
+
+    def __init__(self, lat0=ORIGIN[0], lon0=ORIGIN[1]):
+        self.lat0 = lat0
+        self.lon0 = lon0
+        self._ky = math.radians(1) * EARTH_RADIUS_M
+        self._kx = self._ky * math.cos(math.radians(lat0))
+
+    def project(self, lat, lon):
+        return (lon - self.lon0) * self._kx, (lat - self.lat0) * self._ky
+
+    def unproject(self, x, y):
+        return self.lat0 + y / self._ky, self.lon0 + x / self._kx
+
+
+class GridIndex:
+    """均匀网格索引（单一类别）
+
+    每个格子按列保存坐标，查询时一次性计算一圈格子内所有候选点的球面距离。
+    """
+
+    def __init__(self, projection, cell_size=CELL_SIZE_M):
+        self.projection = projection
+        self.cell_size = cell_size
+        self.cells = {}    # (cx, cy) -> ([纬度], [经度], [条目])
+        self.count = 0
+        self._bounds = None  # (最小cx, 最小cy, 最大cx, 最大cy)
+
+    def __len__(self):
+        return self.count
+
+    def _cell(self, lat, lon):
+        x, y = self.projection.project(lat, lon)
+        return int(math.floor(x / self.cell_size)), int(math.floor(y / self.cell_size))
+
+    def add(self, lat, lon, item):
+        cell = self._cell(lat, lon)
+        lats, lons, items = self.cells.setdefault(cell, ([], [], []))
+        lats.append(lat)
+        lons.append(lon)
+        items.append(item)
+        self.count += 1
+        if self._bounds is None:
+            self._bounds = (cell[0], cell[1], cell[0], cell[1])
+        else:
+            x0, y0, x1, y1 = self._bounds
+            self._bounds = (min(x0, cell[0]), min(y0, cell[1]), max(x1, cell[0]), max(y1, cell[1]))
+
+    def _ring(self, cx, cy, r):
+        """与中心格切比雪夫距离恰为 r 的一圈格子"""
+        if r == 0:
+            yield cx, cy
+            return
+        for dx in range(-r, r + 1):
+            yield cx + dx, cy - r
+            yield cx + dx, cy + r
+        for dy in range(-r + 1, r):
+            yield cx - r, cy + dy
+            yield cx + r, cy + dy
+
+    def _max_ring(self, cx, cy):
+        if self._bounds is None:
+            return -1
+        x0, y0, x1, y1 = self._bounds
+        return max(cx - x0, x1 - cx, cy - y0, y1 - cy)
+
+    def _measure(self, lat, lon, cells):
+        """计算若干格子内全部候选点的距离，返回 [(距离米, 条目)]"""
+        lats, lons, items = [], [], []
+        for cell in cells:
+            bucket = self.cells.get(cell)
+            if bucket:
+                lats.extend(bucket[0])
+                lons.extend(bucket[1])
+                items.extend(bucket[2])
+        if not items:
+            return []
+        return list(zip((float(d) for d in distances_from(lat, lon, lats, lons)), items))
+
+    def k_nearest(self, lat, lon, k=1, max_distance=None):
+        """k近邻：按圈向外扩展，圈外最近可能距离超过第k个结果时停止
+
+        返回 [(距离米, 条目)]，按距离升序。
+        """
+        cx, cy = self._cell(lat, lon)
+        found = []
+        for r in range(self._max_ring(cx, cy) + 1):
+            # 第 r 圈内的点到查询点的距离至少为 (r-1) 个格宽
+            bound = (r - 1) * self.cell_size * _PRUNE_SLACK
+            if len(found) >= k and bound > found[k - 1][0]:
+                break
+            if max_distance is not None and bound > max_distance:
+                break
+            ring = self._measure(lat, lon, self._ring(cx, cy, r))
+            if max_distance is not None:
+                ring = [pair for pair in ring if pair[0] <= max_distance]
+            if ring:
+                found.extend(ring)
+                found.sort(key=lambda pair: pair[0])
+                del found[k:]
+        return found
+
+    def within(self, lat, lon, radius):
+        """半径查询，返回 [(距离米, 条目)]，按距离升序"""
+        x, y = self.projection.project(lat, lon)
+        reach = radius / _PRUNE_SLACK
+        x0, y0 = int(math.floor((x - reach) / self.cell_size)), int(math.floor((y - reach) / self.cell_size))
+        x1, y1 = int(math.floor((x + reach) / self.cell_size)), int(math.floor((y + reach) / self.cell_size))
+        cells = ((gx, gy) for gx in range(x0, x1 + 1) for gy in range(y0, y1 + 1))
+        found = [pair for pair in self._measure(lat, lon, cells) if pair[0] <= radius]
+        found.sort(key=lambda pair: pair[0])
+        return found
+
+
+class SpatialIndex:
+    """按类别分网格的地点索引
+
+    条目为包含 lat、lon 的字典，kind 字段决定所在网格；
+    查询时可以指定一个或多个类别，不指定则查询全部。
+    """
+
+    def __init__(self, projection=None, cell_size=CELL_SIZE_M):
+        self.projection = projection or LocalProjection()
+        self.cell_size = cell_size
+        self.grids = {}
+
+    def __len__(self):
+        return sum(len(grid) for grid in self.grids.values())
+
+    def add(self, item, kind=None):
+        kind = kind or item.get('kind', 'poi')
+        grid = self.grids.get(kind)
+        if grid is None:
+            grid = self.grids[kind] = GridIndex(self.projection, self.cell_size)
+        grid.add(item['lat'], item['lon'], item)
+
+    def extend(self, items, kind=None):
+        for item in items:
+            self.add(item, kind)
+
+    def _grids(self, kinds):
+        if kinds is None:
+            return list(self.grids.values())
+        if isinstance(kinds, str):
+            kinds = (kinds,)
+        return [self.grids[kind] for kind in kinds if kind in self.grids]
+
+    def nearest(self, lat, lon, kinds=None, max_distance=None):
+        """最近的地点，返回 (距离米, 条目)；没有时返回 (None, None)"""
+        result = self.k_nearest(lat, lon, 1, kinds, max_distance)
+        return result[0] if result else (None, None)
+
+    def k_nearest(self, lat, lon, k=5, kinds=None, max_distance=None):
+        results = []
+        for grid in self._grids(kinds):
+            results.extend(grid.k_nearest(lat, lon, k, max_distance))
+        results.sort(key=lambda pair: pair[0])
+        return results[:k]
+
+    def within(self, lat, lon, radius, kinds=None):
+        results = []
+        for grid in self._grids(kinds):
+            results.extend(grid.within(lat, lon, radius))
+        results.sort(key=lambda pair: pair[0])
+        return results
+
+    def snap(self, lat, lon, kinds=None, max_distance=None):
+        """把定位吸附到各类别最近的地点，返回 {类别: (距离米, 条目)}"""
+        kinds = list(self.grids) if kinds is None else kinds
+        snapped = {}
+        for kind in kinds:
+            dist, item = self.nearest(lat, lon, kind, max_distance)
+            if item is not None:
+                snapped[kind] = (dist, item)
+        return snapped
+
+
+# 测试代码
+if __name__ == '__main__':
+    import random
+    import time
+
+    random.seed(1)
+    index = SpatialIndex()
+    kinds = ['食堂', '卫生间', '教室', '打印店']
+    for i in range(5000):
+        index.add({
+            'name': f'地点{i}',
+            'kind': random.choice(kinds),
+            'lat': 38.2820 + random.random() * 0.006,
+            'lon': 109.7300 + random.random() * 0.008,
+        })
+
+    queries = [(38.2820 + random.random() * 0.006, 109.7300 + random.random() * 0.008) for _ in range(1000)]
+    start = time.perf_counter()
+    for lat, lon in queries:
+        index.nearest(lat, lon, '卫生间')
+    print(f"最近卫生间: {(time.perf_counter() - start) * 1000 / len(queries):.4f} ms/次")
+
+    start = time.perf_counter()
+    for lat, lon in queries:
+        index.within(lat, lon, 100)
+    print(f"100米半径查询: {(time.perf_counter() - start) * 1000 / len(queries):.4f} ms/次")
+
+    print(index.snap(38.2850, 109.7340))
@@ -0,0 +1,120 @@
+"""
+启动性能分析模块
+记录模块导入、界面构造等启动阶段的耗时和首帧时间，并提供按需导入
+"""
+
+import functools
+import importlib
+import threading
+import time
+
+from metrics import registry as metrics
+
+
+class StartupProfiler:
+    """启动阶段计时器
+
+    所有时间以进程导入本模块的时刻为起点（毫秒），
+    各阶段耗时同时写入指标注册表（startup.<阶段名>）。
+    """
+
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.started = clock()
+        self.phases = []   # (阶段名, 开始偏移, 耗时)
+        self.marks = {}    # 里程碑 -> 偏移
+        self._lock = threading.Lock()
+
+    def elapsed_ms(self):
+        return (self.clock() - self.started) * 1000
+
+    def phase(self, name):
+        """阶段计时上下文管理器"""
+        return _Phase(self, name)
+
+    def add(self, name, start, ms):
+        with self._lock:
+            self.phases.append((name, (start - self.started) * 1000, ms))
+        metrics.observe(f'startup.{name}', ms)
+
+    def timed(self, name):
+        """函数计时装饰器，用于界面的 __init__ 等构造过程"""
+        def decorator(func):
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                with self.phase(name):
+                    return func(*args, **kwargs)
+            return wrapper
+        return decorator
+
+    def mark(self, name):
+        """记录里程碑（如首帧），同名里程碑只记录第一次"""
+        with self._lock:
+            if name in self.marks:
+                return self.marks[name]
+            at = self.marks[name] = self.elapsed_ms()
+        metrics.record('startup', mark=name, at_ms=round(at, 1))
+        return at
+
+    def report(self, top=None):
+        """生成启动耗时报告，按耗时从高到低排列"""
+        with self._lock:
+            phases = sorted(self.phases, key=lambda p: p[2], reverse=True)
+            marks = sorted(self.marks.items(), key=lambda m: m[1])
+        if top:
+            phases = phases[:top]
+
+        lines = ["=== 启动耗时 ==="]
+        for name, at in marks:
+            lines.append(f"{name:<28}{at:>10.1f} ms")
+        lines.append("--- 各阶段 ---")
+        for name, start, ms in phases:
+            lines.append(f"{name:<28}{ms:>10.1f} ms  (@{start:.1f})")
+        return "\n".join(lines)
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self._start = self.profiler.clock()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.add(self.name, self._start, (self.profiler.clock() - self._start) * 1000)
+        return False
+
+
+class LazyModule:
+    """按需导入的模块代理
+
+    首次访问属性时才导入，导入耗时记为 import.<模块名> 阶段。
+    """
+
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+        self._lock = threading.Lock()
+
+    @property
+    def loaded(self):
+        return self._module is not None
+
+    def load(self):
+        if self._module is None:
+            with self._lock:
+                if self._module is None:
+                    with profiler.phase(f'import.{self._name}'):
+                        self._module = importlib.import_module(self._name)
+        return self._module
+
+    def __getattr__(self, attr):
+        if attr.startswith('_'):
+            raise AttributeError(attr)
+        return getattr(self.load(), attr)
+
+
+# 全局启动计时器
+profiler = StartupProfiler()
@@ -0,0 +1,300 @@
+"""
+离线地图瓦片模块
+预先渲染的校园瓦片打包为单个文件（索引 + 数据），运行时以内存映射方式读取；
+解码后的纹理放在按字节预算淘汰的LRU缓存中，平移地图时分帧预取相邻瓦片
+"""
+
+import io
+import math
+import mmap
+import os
+import struct
+import time
+from collections import OrderedDict, deque
+
+try:
+    from kivy.core.image import Image as CoreImage
+
+    KIVY_AVAILABLE = True
+except ImportError:
+    KIVY_AVAILABLE = False
+
+# 瓦片包文件
+TILE_PACK = 'campus_tiles.pack'
+
+# 校园地图使用的缩放级别
+DEFAULT_ZOOM = 17
+
+# 纹理缓存的字节预算（按解码后的 RGBA 像素计），约 64 张 256x256 瓦片
+TEXTURE_BUDGET = 16 * 1024 * 1024
+
+# 预取半径（瓦片数）：中心周围几圈，比默认 3x3 视口多一圈
+PREFETCH_RADIUS = 2
+
+# 每帧用于预取解码的时间（毫秒）
+PREFETCH_BUDGET_MS = 4.0
+
+# 文件格式：魔数、格式版本、瓦片数，之后为按 (z, x, y) 排序的索引项
+# （缩放级别、x、y、数据偏移、数据长度）和各瓦片的原始图片数据
+MAGIC = b'YLTP'
+FORMAT_VERSION = 1
+_HEADER = struct.Struct('<4sHI')
+_ENTRY = struct.Struct('<BIIQI')
+
+
+def tile_for(lat, lon, zoom=DEFAULT_ZOOM):
+    """经纬度所在的瓦片编号 (x, y)（Web墨卡托，与常见在线地图一致）"""
+    n = 2 ** zoom
+    x = int((lon + 180.0) / 360.0 * n)
+    lat_rad = math.radians(lat)
+    y = int((1.0 - math.asinh(math.tan(lat_rad)) / math.pi) / 2.0 * n)
+    return min(max(x, 0), n - 1), min(max(y, 0), n - 1)
+
+
+def tile_origin(x, y, zoom=DEFAULT_ZOOM):
+    """瓦片左上角的经纬度"""
+    n = 2 ** zoom
+    lon = x / n * 360.0 - 180.0
+    lat = math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * y / n))))
+    return lat, lon
+
+
+class TilePack:
+    """内存映射的瓦片包"""
+
+    def __init__(self, path=TILE_PACK):
+        self.file_path = path
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, count = _HEADER.unpack_from(self._map, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            self.close()
+            raise ValueError(f"瓦片包格式不匹配: {path}")
+        end = _HEADER.size + _ENTRY.size * count
+        self.index = {(z, x, y): (offset, length)
+                      for z, x, y, offset, length in _ENTRY.iter_unpack(self._map[_HEADER.size:end])}
+
+    @classmethod
+    def build(cls, tiles, path=TILE_PACK):
+        """把 {(z, x, y): 图片数据} 写入 path（先写临时文件再替换）"""
+        keys = sorted(tiles)
+        offset = _HEADER.size + _ENTRY.size * len(keys)
+        entries = []
+        for key in keys:
+            entries.append(_ENTRY.pack(*key, offset, len(tiles[key])))
+            offset += len(tiles[key])
+
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, len(keys)))
+            f.writelines(entries)
+            for key in keys:
+                f.write(tiles[key])
+        os.replace(tmp_path, path)
+        return cls(path)
+
+    @classmethod
+    def build_from_dir(cls, tile_dir, path=TILE_PACK, ext='.png'):
+        """打包按 z/x/y.png 存放的瓦片目录（常见切图工具的输出格式）"""
+        tiles = {}
+        for root, _, files in os.walk(tile_dir):
+            parts = os.path.relpath(root, tile_dir).split(os.sep)
+            if len(parts) != 2 or not all(p.isdigit() for p in parts):
+                continue
+            z, x = int(parts[0]), int(parts[1])
+            for name in files:
+                stem, suffix = os.path.splitext(name)
+                if suffix == ext and stem.isdigit():
+                    with open(os.path.join(root, name), 'rb') as f:
+                        tiles[(z, x, int(stem))] = f.read()
+        return cls.build(tiles, path)
+
+    def __len__(self):
+        return len(self.index)
+
+    def __contains__(self, key):
+        return key in self.index
+
+    def read(self, z, x, y):
+        """瓦片的原始图片数据，包中没有时返回 None"""
+        entry = self.index.get((z, x, y))
+        if entry is None:
+            return None
+        offset, length = entry
+        return self._map[offset:offset + length]
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+
+def decode_texture(data):
+    """把图片数据解码为 Kivy 纹理，返回 (纹理, 占用字节)；未安装 Kivy 时原样返回数据"""
+    if KIVY_AVAILABLE:
+        texture = CoreImage(io.BytesIO(data), ext='png').texture
+        width, height = texture.size
+        return texture, width * height * 4
+    return data, len(data)
+
+
+class TextureLRU:
+    """按字节预算淘汰的纹理缓存：超出预算时丢弃最久未使用的瓦片"""
+
+    def __init__(self, budget=TEXTURE_BUDGET):
+        self.budget = budget
+        self.used = 0
+        self.hits = 0
+        self.misses = 0
+        self._items = OrderedDict()   # 键 -> (纹理, 字节数)
+
+    def __len__(self):
+        return len(self._items)
+
+    def __contains__(self, key):
+        return key in self._items
+
+    def get(self, key):
+        item = self._items.get(key)
+        if item is None:
+            self.misses += 1
+            return None
+        self._items.move_to_end(key)
+        self.hits += 1
+        return item[0]
+
+    def put(self, key, value, size):
+        if key in self._items:
+            self.used -= self._items.pop(key)[1]
+        self._items[key] = (value, size)
+        self.used += size
+        while self.used > self.budget and len(self._items) > 1:
+            _, (_, evicted) = self._items.popitem(last=False)
+            self.used -= evicted
+
+
+class TileCache:
+    """离线瓦片缓存
+
+    get() 同步读取并解码视口内的瓦片；pan_to() 按移动方向把前方的相邻瓦片排入预取队列，
+    由界面每帧调用 prefetch_step() 在时间预算内解码（纹理只能在主线程创建）。
+    """
+
+    def __init__(self, pack, budget=TEXTURE_BUDGET, decode=decode_texture, prefetch_radius=PREFETCH_RADIUS):
+        self.pack = pack
+        self.textures = TextureLRU(budget)
+        self.decode = decode
+        self.prefetch_radius = prefetch_radius
+        self._pending = deque()
+        self._center = None
+
+    def get(self, z, x, y):
+        """瓦片纹理，包中没有该瓦片时返回 None"""
+        key = (z, x, y)
+        texture = self.textures.get(key)
+        if texture is None:
+            texture = self._load(key)
+        return texture
+
+    def _load(self, key):
+        data = self.pack.read(*key)
+        if data is None:
+            return None
+        texture, size = self.decode(data)
+        self.textures.put(key, texture, size)
+        return texture
+
+    def viewport(self, lat, lon, zoom=DEFAULT_ZOOM, cols=3, rows=3):
+        """以 (lat, lon) 为中心 cols x rows 的瓦片，返回 {(x, y): 纹理}"""
+        cx, cy = tile_for(lat, lon, zoom)
+        tiles = {}
+        for dy in range(-(rows // 2), rows - rows // 2):
+            for dx in range(-(cols // 2), cols - cols // 2):
+                texture = self.get(zoom, cx + dx, cy + dy)
+                if texture is not None:
+                    tiles[(cx + dx, cy + dy)] = texture
+        return tiles
+
+    def pan_to(self, lat, lon, zoom=DEFAULT_ZOOM):
+        """地图中心移动到 (lat, lon)：重新安排预取队列，移动方向前方的瓦片优先"""
+        cx, cy = tile_for(lat, lon, zoom)
+        previous = self._center
+        self._center = (zoom, cx, cy)
+        if previous == self._center:
+            return 0
+
+        if previous is not None and previous[0] == zoom:
+            heading = (cx - previous[1], cy - previous[2])
+        else:
+            heading = (0, 0)
+
+        r = self.prefetch_radius
+        candidates = [(zoom, cx + dx, cy + dy) for dx in range(-r, r + 1) for dy in range(-r, r + 1)]
+        # 先按与移动方向的一致程度、再按离中心的距离排序
+        candidates.sort(key=lambda k: (-((k[1] - cx) * heading[0] + (k[2] - cy) * heading[1]),
+                                       max(abs(k[1] - cx), abs(k[2] - cy))))
+        self._pending = deque(key for key in candidates if key in self.pack and key not in self.textures)
+        return len(self._pending)
+
+    def prefetch_step(self, budget_ms=PREFETCH_BUDGET_MS):
+        """在时间预算内解码预取队列中的瓦片，返回本次解码的数量"""
+        deadline = time.perf_counter() + budget_ms / 1000
+        done = 0
+        while self._pending and time.perf_counter() < deadline:
+            key = self._pending.popleft()
+            if key not in self.textures:
+                self._load(key)
+                done += 1
+        return done
+
+    @property
+    def pending(self):
+        return len(self._pending)
+
+    def close(self):
+        self._pending.clear()
+        self.pack.close()
+
+
+def open_tile_cache(path=TILE_PACK, budget=TEXTURE_BUDGET):
+    """打开瓦片包，文件不存在或损坏时返回 None（地图退回文字模式）"""
+    if not os.path.exists(path):
+        return None
+    try:
+        return TileCache(TilePack(path), budget)
+    except (ValueError, OSError, struct.error) as e:
+        print(f"瓦片包无法读取: {e}")
+        return None
+
+
+# 测试代码
+if __name__ == '__main__':
+    import random
+    import tempfile
+
+    # 模拟覆盖校园的 17 级瓦片，每张约 20 KB
+    random.seed(2)
+    x0, y0 = tile_for(38.2870, 109.7320)
+    x1, y1 = tile_for(38.2840, 109.7360)
+    tiles = {(DEFAULT_ZOOM, x, y): random.randbytes(20_000)
+             for x in range(x0 - 4, x1 + 5) for y in range(y0 - 4, y1 + 5)}
+
+    path = os.path.join(tempfile.mkdtemp(), TILE_PACK)
+    start = time.perf_counter()
+    pack = TilePack.build(tiles, path)
+    print(f"打包 {len(pack)} 张瓦片: {(time.perf_counter() - start) * 1000:.1f} ms，"
+          f"{os.path.getsize(path) / 1024:.0f} KB")
+
+    # 纹理预算只够 12 张瓦片，模拟一边平移一边绘制
+    cache = TileCache(TilePack(path), budget=12 * 20_000)
+    lat, lon = 38.2850, 109.7340
+    start = time.perf_counter()
+    for step in range(40):
+        lon += 0.0004
+        cache.pan_to(lat, lon)
+        cache.prefetch_step()
+        cache.viewport(lat, lon, cols=2, rows=2)
+    lru = cache.textures
+    print(f"平移40次: {(time.perf_counter() - start) * 1000:.1f} ms，命中率 "
+          f"{lru.hits / max(1, lru.hits + lru.misses):.0%}，缓存 {len(lru)} 张 / {lru.used / 1024:.0f} KB")
+    cache.close()
@@ -0,0 +1,273 @@
+"""
+轨迹记录模块
+定位点保存在定长环形缓冲区（按列的 array 数组，内存占用固定），
+并从轨迹中学习个人步行速度和各路段的通行速度，用于估算到达时间
+"""
+
+import json
+import os
+import threading
+import time
+from array import array
+
+from geo import haversine_m
+
+# 环形缓冲区容量（定位点数），每点4个双精度数，约 320 KB
+TRACE_CAPACITY = 10000
+
+# 轨迹文件
+TRACE_FILE = 'trace_buffer.bin'
+
+# 视为步行的速度范围（米/秒）
+WALKING_MIN_MPS = 0.5
+WALKING_MAX_MPS = 2.5
+
+# 默认步行速度（米/秒），即 80 米/分钟
+DEFAULT_SPEED_MPS = 80 / 60
+
+# 相邻两点间隔在该范围内（秒）才用于估算速度
+MIN_SAMPLE_SECONDS = 2
+MAX_SAMPLE_SECONDS = 120
+
+# 定位点离路口小于该距离（米）时视为经过该路口；
+# 只吸附路口，建筑出入口常紧挨道路，吸附后会把沿路经过误当成进出建筑
+SNAP_RADIUS_M = 20
+
+# 两次经过的节点之间最多相隔几条路段仍计入路段速度
+MAX_SEGMENT_EDGES = 4
+
+# 个人速度和路段速度的平滑系数
+USER_ALPHA = 0.05
+SEGMENT_ALPHA = 0.3
+
+# 路段样本数达到该值后完全采用路段速度，之前与个人速度按比例混合
+SEGMENT_TRUST_SAMPLES = 3
+
+_COLUMNS = ('ts', 'lat', 'lon', 'accuracy')
+
+
+class TraceBuffer:
+    """定长环形缓冲区：写满后覆盖最旧的定位点"""
+
+    def __init__(self, capacity=TRACE_CAPACITY):
+        self.capacity = capacity
+        self.columns = {name: array('d', bytes(8 * capacity)) for name in _COLUMNS}
+        self.head = 0      # 下一个写入位置
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.count
+
+    def append(self, ts, lat, lon, accuracy=0.0):
+        with self._lock:
+            i = self.head
+            self.columns['ts'][i] = ts
+            self.columns['lat'][i] = lat
+            self.columns['lon'][i] = lon
+            self.columns['accuracy'][i] = accuracy or 0.0
+            self.head = (i + 1) % self.capacity
+            self.count = min(self.count + 1, self.capacity)
+
+    def _order(self):
+        start = (self.head - self.count) % self.capacity
+        return [(start + k) % self.capacity for k in range(self.count)]
+
+    def points(self, since=None):
+        """按时间顺序返回 [(ts, lat, lon, accuracy)]，可只取 since 之后的点"""
+        with self._lock:
+            ts, lat, lon, acc = (self.columns[name] for name in _COLUMNS)
+            return [(ts[i], lat[i], lon[i], acc[i]) for i in self._order()
+                    if since is None or ts[i] > since]
+
+    def save(self, path=TRACE_FILE):
+        """按时间顺序写入文件（头部为点数）"""
+        points = self.points()
+        data = {name: array('d', (p[k] for p in points)) for k, name in enumerate(_COLUMNS)}
+        tmp_path = f'{path}.tmp'
+        with open(tmp_path, 'wb') as f:
+            array('q', [len(points)]).tofile(f)
+            for name in _COLUMNS:
+                data[name].tofile(f)
+        os.replace(tmp_path, path)
+
+    def load(self, path=TRACE_FILE):
+        """从文件恢复，超出容量时只保留最新的点"""
+        if not os.path.exists(path):
+            return 0
+        with open(path, 'rb') as f:
+            header = array('q')
+            header.fromfile(f, 1)
+            n = header[0]
+            data = {}
+            for name in _COLUMNS:
+                data[name] = array('d')
+                data[name].fromfile(f, n)
+        for k in range(max(0, n - self.capacity), n):
+            self.append(*(data[name][k] for name in _COLUMNS))
+        return n
+
+
+class WalkingSpeedModel:
+    """步行速度模型
+
+    个人速度：相邻定位点之间处于步行范围的速度的指数平均；
+    路段速度：轨迹先后经过两个路网节点时，按路网距离除以用时得到，按路段分别平均。
+    """
+
+    def __init__(self):
+        self.user_speed = DEFAULT_SPEED_MPS
+        self.user_samples = 0
+        self.segments = {}       # "节点a|节点b"（按名称排序） -> [速度, 样本数]
+        self.trained_until = 0.0
+
+    @staticmethod
+    def _key(u, v):
+        return f'{u}|{v}' if u <= v else f'{v}|{u}'
+
+    def _update_segment(self, u, v, speed):
+        entry = self.segments.get(self._key(u, v))
+        if entry is None:
+            self.segments[self._key(u, v)] = [speed, 1]
+        else:
+            entry[0] += SEGMENT_ALPHA * (speed - entry[0])
+            entry[1] += 1
+
+    def train(self, points, campus=None):
+        """用新的轨迹点训练；campus 为校园路网，省略时只更新个人速度"""
+        points = [p for p in points if p[0] > self.trained_until]
+        if not points:
+            return 0
+
+        previous = None
+        last_visit = None   # (节点, 进入该节点范围的时刻)
+        for ts, lat, lon, _ in points:
+            if previous is not None:
+                dt = ts - previous[0]
+                if dt > MAX_SAMPLE_SECONDS:
+                    # 轨迹中断，视为新的一段行程
+                    last_visit = None
+                elif dt >= MIN_SAMPLE_SECONDS:
+                    speed = haversine_m(previous[1], previous[2], lat, lon) / dt
+                    if WALKING_MIN_MPS <= speed <= WALKING_MAX_MPS:
+                        self.user_speed += USER_ALPHA * (speed - self.user_speed)
+                        self.user_samples += 1
+            previous = (ts, lat, lon)
+
+            if campus is None:
+                continue
+            node, dist = campus.nearest_node(lat, lon, 'junction')
+            if node is None or dist > SNAP_RADIUS_M:
+                continue
+            if last_visit is None:
+                last_visit = (node, ts)
+            elif node != last_visit[0]:
+                self._learn_path(campus, last_visit[0], node, ts - last_visit[1])
+                last_visit = (node, ts)
+
+        self.trained_until = points[-1][0]
+        return len(points)
+
+    def _learn_path(self, campus, source, target, seconds):
+        if seconds <= 0:
+            return
+        try:
+            path = campus.shortest_path(source, target)
+        except Exception:
+            return
+        if len(path) - 1 > MAX_SEGMENT_EDGES:
+            return
+        speed = campus.path_length(path) / seconds
+        if WALKING_MIN_MPS <= speed <= WALKING_MAX_MPS:
+            for u, v in zip(path, path[1:]):
+                self._update_segment(u, v, speed)
+
+    def segment_speed(self, u, v):
+        """路段速度（米/秒）：样本不足时与个人速度混合"""
+        entry = self.segments.get(self._key(u, v))
+        if entry is None:
+            return self.user_speed
+        weight = min(entry[1], SEGMENT_TRUST_SAMPLES) / SEGMENT_TRUST_SAMPLES
+        return weight * entry[0] + (1 - weight) * self.user_speed
+
+    def estimate_seconds(self, campus, path, extra_m=0.0):
+        """沿路径步行所需秒数，extra_m 为路网以外的步行距离"""
+        seconds = extra_m / self.user_speed
+        for u, v in zip(path, path[1:]):
+            seconds += campus.graph.edges[u, v]['length'] / self.segment_speed(u, v)
+        return seconds
+
+    def to_json(self):
+        return json.dumps({
+            'user_speed': self.user_speed,
+            'user_samples': self.user_samples,
+            'segments': self.segments,
+            'trained_until': self.trained_until,
+        }, ensure_ascii=False)
+
+    @classmethod
+    def from_json(cls, text):
+        model = cls()
+        if text:
+            try:
+                data = json.loads(text)
+                model.user_speed = data.get('user_speed', DEFAULT_SPEED_MPS)
+                model.user_samples = data.get('user_samples', 0)
+                model.segments = data.get('segments', {})
+                model.trained_until = data.get('trained_until', 0.0)
+            except (ValueError, TypeError) as e:
+                print(f"步行速度模型解析失败: {e}")
+        return model
+
+
+class TraceRecorder:
+    """轨迹记录器：记录定位点，按需训练步行速度模型"""
+
+    def __init__(self, capacity=TRACE_CAPACITY, clock=time.time):
+        self.buffer = TraceBuffer(capacity)
+        self.model = WalkingSpeedModel()
+        self.clock = clock
+
+    def record(self, location):
+        """记录一个定位（位置字典，需含 lat、lon）"""
+        self.buffer.append(self.clock(), location['lat'], location['lon'], location.get('accuracy') or 0.0)
+
+    def train(self, campus=None):
+        """用上次训练之后的新定位点更新模型，返回处理的点数"""
+        return self.model.train(self.buffer.points(since=self.model.trained_until), campus)
+
+
+# 测试代码
+if __name__ == '__main__':
+    import random
+    import sys
+
+    from campus_graph import CampusGraph
+
+    recorder = TraceRecorder(capacity=1000)
+    campus = CampusGraph()
+
+    # 模拟多次以 1.1 米/秒 从南门走到图书馆
+    t = 1_000_000.0
+    for _ in range(5):
+        path = campus.shortest_path("南门", "图书馆")
+        for u, v in zip(path, path[1:]):
+            (lat1, lon1), (lat2, lon2) = campus.position(u), campus.position(v)
+            steps = max(1, int(campus.graph.edges[u, v]['length'] / 1.1 / 3))
+            for k in range(steps):
+                f = k / steps
+                recorder.clock = lambda: t
+                recorder.record({'lat': lat1 + (lat2 - lat1) * f + random.gauss(0, 2e-6),
+                                 'lon': lon1 + (lon2 - lon1) * f + random.gauss(0, 2e-6), 'accuracy': 5})
+                t += 3
+        t += 3600
+
+    print(f"缓冲区 {len(recorder.buffer)} 点，列数组占用 "
+          f"{sum(sys.getsizeof(c) for c in recorder.buffer.columns.values()) / 1024:.0f} KB")
+    start = time.perf_counter()
+    recorder.train(campus)
+    print(f"训练 {(time.perf_counter() - start) * 1000:.1f} ms，个人速度 {recorder.model.user_speed:.2f} 米/秒，"
+          f"路段 {len(recorder.model.segments)} 条")
+    path = campus.shortest_path("南门", "图书馆")
+    print(f"南门 -> 图书馆 预计 {recorder.model.estimate_seconds(campus, path) / 60:.1f} 分钟"
+          f"（按 80 米/分钟为 {campus.path_length(path) / 80:.1f} 分钟）")